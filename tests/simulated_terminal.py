@@ -0,0 +1,171 @@
+"""Deterministic in-memory stand-in for the MetaTrader5 module, driven by engine.clock, for simulations in tests."""
+import collections
+import random
+
+Tick = collections.namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"])
+SymbolInfo = collections.namedtuple("SymbolInfo", ["name", "visible", "point", "digits", "bid", "ask", "volume_step", "volume_min", "volume_max", "trade_stops_level", "filling_mode", "trade_contract_size"])
+Position = collections.namedtuple("Position", ["ticket", "time", "time_msc", "type", "magic", "identifier", "volume", "price_open", "sl", "tp", "price_current", "swap", "profit", "symbol", "comment"])
+Order = collections.namedtuple("Order", ["ticket", "time_setup", "time_done", "type", "state", "magic", "position_id", "volume_current", "price_open", "sl", "tp", "symbol", "comment"])
+Deal = collections.namedtuple("Deal", ["ticket", "order", "time", "time_msc", "type", "entry", "magic", "position_id", "volume", "price", "commission", "swap", "profit", "fee", "symbol", "comment"])
+OrderSendResult = collections.namedtuple("OrderSendResult", ["retcode", "deal", "order", "volume", "price", "bid", "ask", "comment", "request_id"])
+TerminalInfo = collections.namedtuple("TerminalInfo", ["name", "build", "connected"])
+AccountInfo = collections.namedtuple("AccountInfo", ["login", "name", "balance", "currency", "margin_free", "equity", "margin", "leverage"])
+
+
+class SimulatedTerminal:
+    """
+    Prices take one seeded random step of `step_points` per virtual second; pending stops fill when touched.
+    Every reply depends only on the seed and the clock, so a recorded run can be replayed exactly.
+    """
+    TRADE_ACTION_DEAL = 1; TRADE_ACTION_PENDING = 5; TRADE_ACTION_SLTP = 6; TRADE_ACTION_MODIFY = 7; TRADE_ACTION_REMOVE = 8
+    ORDER_TYPE_BUY = 0; ORDER_TYPE_SELL = 1; ORDER_TYPE_BUY_STOP = 4; ORDER_TYPE_SELL_STOP = 5
+    POSITION_TYPE_BUY = 0; POSITION_TYPE_SELL = 1
+    ORDER_FILLING_FOK = 0; ORDER_FILLING_IOC = 1; ORDER_FILLING_RETURN = 2; ORDER_TIME_GTC = 0
+    ORDER_STATE_STARTED = 0; ORDER_STATE_PLACED = 1; ORDER_STATE_CANCELED = 2; ORDER_STATE_PARTIAL = 3
+    ORDER_STATE_FILLED = 4; ORDER_STATE_REJECTED = 5; ORDER_STATE_EXPIRED = 6
+    TRADE_RETCODE_REQUOTE = 10004; TRADE_RETCODE_REJECT = 10006; TRADE_RETCODE_CANCEL = 10007; TRADE_RETCODE_PLACED = 10008
+    TRADE_RETCODE_DONE = 10009; TRADE_RETCODE_DONE_PARTIAL = 10010; TRADE_RETCODE_ERROR = 10011; TRADE_RETCODE_TIMEOUT = 10012
+    TRADE_RETCODE_INVALID = 10013; TRADE_RETCODE_INVALID_VOLUME = 10014; TRADE_RETCODE_INVALID_PRICE = 10015
+    TRADE_RETCODE_INVALID_STOPS = 10016; TRADE_RETCODE_MARKET_CLOSED = 10018; TRADE_RETCODE_NO_MONEY = 10019
+    TRADE_RETCODE_PRICE_CHANGED = 10020; TRADE_RETCODE_PRICE_OFF = 10021; TRADE_RETCODE_TOO_MANY_REQUESTS = 10024
+    TRADE_RETCODE_NO_CHANGES = 10025; TRADE_RETCODE_LOCKED = 10028; TRADE_RETCODE_FROZEN = 10029
+    TRADE_RETCODE_CONNECTION = 10031; TRADE_RETCODE_INVALID_ORDER = 10035; TRADE_RETCODE_POSITION_CLOSED = 10036
+    DEAL_TYPE_BUY = 0; DEAL_TYPE_SELL = 1; DEAL_ENTRY_IN = 0; DEAL_ENTRY_OUT = 1
+    TIMEFRAME_M1 = 1
+
+    def __init__(self, clock, symbols, seed=1, step_points=30, spread_points=10):
+        """symbols: {name: (point, digits, start_price)}."""
+        self._clock = clock
+        self._symbols = dict(symbols)
+        self._prices = {name: start_price for name, (point, digits, start_price) in self._symbols.items()}
+        self._rng = random.Random(seed)
+        self._step_points = step_points
+        self._spread_points = spread_points
+        self._stepped_until = int(clock.time())
+        self._next_ticket = 1000
+        self.positions = {}
+        self.orders = {}
+        self.history_orders = {}
+        self.deals = []
+
+    # --- Simulation ---
+    def _new_ticket(self):
+        self._next_ticket += 1
+        return self._next_ticket
+
+    def _advance(self):
+        now_second = int(self._clock.time())
+        while self._stepped_until < now_second:
+            self._stepped_until += 1
+            for name, (point, digits, start_price) in self._symbols.items():
+                self._prices[name] += self._rng.choice((-1, 1)) * point * self._step_points
+                self._fill_touched_orders(name)
+
+    def _tick(self, name):
+        point, digits, start_price = self._symbols[name]
+        bid = round(self._prices[name], digits)
+        ask = round(bid + point * self._spread_points, digits)
+        now = self._clock.time()
+        return Tick(int(now), bid, ask, 0.0, 0, int(now * 1000), 0, 0.0)
+
+    def _fill_touched_orders(self, name):
+        tick = self._tick(name)
+        for ticket, order in list(self.orders.items()):
+            if order.symbol != name: continue
+            is_buy_stop = order.type == self.ORDER_TYPE_BUY_STOP
+            if (is_buy_stop and tick.ask >= order.price_open) or (not is_buy_stop and tick.bid <= order.price_open):
+                del self.orders[ticket]
+                position_ticket = self._new_ticket()
+                position_type = self.POSITION_TYPE_BUY if is_buy_stop else self.POSITION_TYPE_SELL
+                self.positions[position_ticket] = Position(position_ticket, tick.time, tick.time_msc, position_type, order.magic, position_ticket, order.volume_current, order.price_open, order.sl, order.tp, order.price_open, 0.0, 0.0, name, order.comment)
+                self.history_orders[ticket] = order._replace(state=self.ORDER_STATE_FILLED, position_id=position_ticket, time_done=tick.time)
+                self.deals.append(Deal(self._new_ticket(), ticket, tick.time, tick.time_msc, position_type, self.DEAL_ENTRY_IN, order.magic, position_ticket, order.volume_current, order.price_open, 0.0, 0.0, 0.0, 0.0, name, order.comment))
+        for ticket, position in list(self.positions.items()):
+            if position.symbol != name: continue
+            exit_price = tick.bid if position.type == self.POSITION_TYPE_BUY else tick.ask
+            direction = 1 if position.type == self.POSITION_TYPE_BUY else -1
+            position = self.positions[ticket] = position._replace(price_current=exit_price, profit=round(direction * (exit_price - position.price_open) * position.volume * 100000, 2))
+            if (position.sl and (exit_price <= position.sl if position.type == self.POSITION_TYPE_BUY else exit_price >= position.sl)) or \
+               (position.tp and (exit_price >= position.tp if position.type == self.POSITION_TYPE_BUY else exit_price <= position.tp)):
+                self._close_position(position, exit_price, tick, "sl/tp")
+    # --- End Simulation ---
+
+    def _close_position(self, position, exit_price, tick, comment):
+        del self.positions[position.ticket]
+        direction = 1 if position.type == self.POSITION_TYPE_BUY else -1
+        profit = direction * (exit_price - position.price_open) * position.volume * 100000
+        deal_type = self.DEAL_TYPE_SELL if position.type == self.POSITION_TYPE_BUY else self.DEAL_TYPE_BUY
+        self.deals.append(Deal(self._new_ticket(), self._new_ticket(), tick.time, tick.time_msc, deal_type, self.DEAL_ENTRY_OUT, position.magic, position.ticket, position.volume, exit_price, 0.0, 0.0, profit, 0.0, position.symbol, comment))
+
+    def initialize(self, *args, **kwargs): return True
+    def shutdown(self): return True
+    def last_error(self): return (1, "Success")
+    def terminal_info(self): return TerminalInfo("SimulatedTerminal", 1, True)
+    def account_info(self): return AccountInfo(1, "Simulated", 10000.0, "USD", 9000.0, 10000.0, 0.0, 100)
+    def symbol_select(self, name, enable): return name in self._symbols
+    def order_calc_margin(self, action, name, volume, price): return volume * 1000.0
+
+    def symbol_info(self, name):
+        if name not in self._symbols: return None
+        self._advance()
+        point, digits, start_price = self._symbols[name]
+        tick = self._tick(name)
+        return SymbolInfo(name, True, point, digits, tick.bid, tick.ask, 0.01, 0.01, 100.0, 0, self.ORDER_FILLING_IOC, 100000)
+
+    def symbol_info_tick(self, name):
+        if name not in self._symbols: return None
+        self._advance()
+        return self._tick(name)
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        self._advance()
+        return tuple(p for p in self.positions.values() if (symbol is None or p.symbol == symbol) and (ticket is None or p.ticket == ticket))
+
+    def positions_total(self):
+        self._advance()
+        return len(self.positions)
+
+    def orders_get(self, symbol=None, ticket=None, group=None):
+        self._advance()
+        return tuple(o for o in self.orders.values() if (symbol is None or o.symbol == symbol) and (ticket is None or o.ticket == ticket))
+
+    def history_orders_get(self, *args, ticket=None, position=None, group=None):
+        self._advance()
+        return tuple(o for o in self.history_orders.values() if (ticket is None or o.ticket == ticket) and (position is None or o.position_id == position))
+
+    def history_deals_get(self, *args, ticket=None, order=None, position=None, group=None):
+        self._advance()
+        deals = [d for d in self.deals if (ticket is None or d.ticket == ticket) and (order is None or d.order == order) and (position is None or d.position_id == position)]
+        if len(args) >= 2:
+            date_from, date_to = (value if isinstance(value, (int, float)) else value.timestamp() for value in args[:2])
+            deals = [d for d in deals if date_from <= d.time <= date_to]
+        return tuple(deals)
+
+    def order_send(self, request):
+        self._advance()
+        action, name = request["action"], request.get("symbol")
+        tick = self._tick(name) if name in self._symbols else None
+        if action == self.TRADE_ACTION_DEAL and "position" in request:
+            position = self.positions.get(request["position"])
+            if position is None: return OrderSendResult(self.TRADE_RETCODE_POSITION_CLOSED, 0, 0, 0.0, 0.0, 0.0, 0.0, "Position closed", 0)
+            exit_price = tick.bid if position.type == self.POSITION_TYPE_BUY else tick.ask
+            self._close_position(position, exit_price, tick, request.get("comment", ""))
+            return OrderSendResult(self.TRADE_RETCODE_DONE, self.deals[-1].ticket, self.deals[-1].order, position.volume, exit_price, tick.bid, tick.ask, "Request executed", 0)
+        if action == self.TRADE_ACTION_DEAL:
+            is_buy = request["type"] == self.ORDER_TYPE_BUY
+            price = tick.ask if is_buy else tick.bid
+            order_ticket = self._new_ticket()
+            self.positions[order_ticket] = Position(order_ticket, tick.time, tick.time_msc, request["type"], request["magic"], order_ticket, request["volume"], price, request.get("sl", 0.0), request.get("tp", 0.0), price, 0.0, 0.0, name, request.get("comment", ""))
+            self.history_orders[order_ticket] = Order(order_ticket, tick.time, tick.time, request["type"], self.ORDER_STATE_FILLED, request["magic"], order_ticket, request["volume"], price, request.get("sl", 0.0), request.get("tp", 0.0), name, request.get("comment", ""))
+            self.deals.append(Deal(self._new_ticket(), order_ticket, tick.time, tick.time_msc, request["type"], self.DEAL_ENTRY_IN, request["magic"], order_ticket, request["volume"], price, 0.0, 0.0, 0.0, 0.0, name, request.get("comment", "")))
+            return OrderSendResult(self.TRADE_RETCODE_DONE, self.deals[-1].ticket, order_ticket, request["volume"], price, tick.bid, tick.ask, "Request executed", 0)
+        if action == self.TRADE_ACTION_PENDING:
+            order_ticket = self._new_ticket()
+            self.orders[order_ticket] = Order(order_ticket, tick.time, 0, request["type"], self.ORDER_STATE_PLACED, request["magic"], 0, request["volume"], request["price"], request.get("sl", 0.0), request.get("tp", 0.0), name, request.get("comment", ""))
+            return OrderSendResult(self.TRADE_RETCODE_DONE, 0, order_ticket, request["volume"], request["price"], tick.bid, tick.ask, "Request executed", 0)
+        if action == self.TRADE_ACTION_REMOVE:
+            order = self.orders.pop(request["order"], None)
+            if order is None: return OrderSendResult(self.TRADE_RETCODE_INVALID_ORDER, 0, 0, 0.0, 0.0, 0.0, 0.0, "Invalid order", 0)
+            self.history_orders[order.ticket] = order._replace(state=self.ORDER_STATE_CANCELED)
+            return OrderSendResult(self.TRADE_RETCODE_DONE, 0, order.ticket, 0.0, 0.0, 0.0, 0.0, "Request executed", 0)
+        return OrderSendResult(self.TRADE_RETCODE_INVALID, 0, 0, 0.0, 0.0, 0.0, 0.0, "Invalid request", 0)
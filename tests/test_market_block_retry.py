@@ -0,0 +1,78 @@
+import collections
+import types
+import unittest
+from unittest import mock
+
+from trap_cycle_bot import engine
+from trap_cycle_bot.clock import RealClock, VirtualClock
+from trap_cycle_bot.rules import build_symbol_profile
+
+Tick = collections.namedtuple("Tick", ["bid", "ask", "time_msc"])
+
+SYMBOL = "EURUSDc"
+START_TS = 1_800_000_000.0
+
+
+class MarketBlockedAutoRestartTest(unittest.TestCase):
+    """An auto-restart refused by MAX_SPREAD_PIPS is parked and retried, not dropped."""
+
+    def setUp(self):
+        self.tick = Tick(1.10000, 1.10050, 1) # 5 pips wide
+        terminal = types.SimpleNamespace(symbol_info_tick=lambda symbol: self.tick, account_info=lambda: None)
+        config = dict(engine.SYMBOL_CONFIGS[SYMBOL], MAX_SPREAD_PIPS=2.0)
+        profile = build_symbol_profile(SYMBOL, types.MappingProxyType(config), 0.00001, 5)
+        self.place_market_order = mock.Mock(return_value=None)
+        patches = [
+            mock.patch.object(engine, "EVENT_JOURNAL_ENABLED", False),
+            mock.patch.object(engine, "broker", engine.RecordingBroker(terminal)),
+            mock.patch.object(engine, "market_stats", {}),
+            mock.patch.object(engine, "parked_auto_restart_symbols", {}),
+            mock.patch.object(engine, "_next_broker_offset_refresh_ts", float("inf")),
+            mock.patch.object(engine, "_next_scheduler_wakeup_ts", float("inf")),
+            mock.patch.object(engine, "get_symbol_profile", lambda symbol_name: profile),
+            mock.patch.object(engine, "normalize_lot", lambda symbol_name, lot: 0.01),
+            mock.patch.object(engine, "is_trading_hours_for_symbol", lambda symbol_name: True),
+            mock.patch.object(engine, "get_symbol_session_state", lambda symbol_name: engine.SessionState(True, float("inf"))),
+            mock.patch.object(engine, "place_market_order", self.place_market_order),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        engine.set_clock(VirtualClock(START_TS))
+        self.addCleanup(engine.set_clock, RealClock())
+        with engine.global_state_lock:
+            engine._initialize_symbol_state(SYMBOL)
+            engine.LAST_L0_WAS_BUY[SYMBOL] = True
+            engine.user_initial_preference_is_buy[SYMBOL] = True
+
+    def set_tick(self, bid, ask):
+        self.tick = Tick(bid, ask, self.tick.time_msc + 1)
+
+    def test_blocked_restart_is_parked_and_retried(self):
+        engine._auto_restart_cycle(SYMBOL, True, True)
+        self.place_market_order.assert_not_called()
+        self.assertIn(SYMBOL, engine.parked_auto_restart_symbols)
+        self.assertIsNone(engine.next_free_ladder_key(SYMBOL))
+
+        engine.run_session_scheduler() # Not due yet
+        self.place_market_order.assert_not_called()
+
+        engine.clock.advance(engine.MARKET_BLOCK_RETRY_SECONDS)
+        engine.run_session_scheduler() # Still too wide: parked again
+        self.place_market_order.assert_not_called()
+        self.assertIn(SYMBOL, engine.parked_auto_restart_symbols)
+
+        self.set_tick(1.10000, 1.10010) # 1 pip
+        engine.clock.advance(engine.MARKET_BLOCK_RETRY_SECONDS)
+        engine.run_session_scheduler()
+        self.place_market_order.assert_called_once()
+        self.assertNotIn(SYMBOL, engine.parked_auto_restart_symbols)
+
+    def test_manual_start_is_refused_without_parking(self):
+        engine.start_L0_market_cycle(SYMBOL, True)
+        self.place_market_order.assert_not_called()
+        self.assertNotIn(SYMBOL, engine.parked_auto_restart_symbols)
+
+
+if __name__ == "__main__":
+    unittest.main()
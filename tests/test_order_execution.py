@@ -0,0 +1,93 @@
+import collections
+import types
+import unittest
+from unittest import mock
+
+from trap_cycle_bot import engine
+from trap_cycle_bot.clock import RealClock, VirtualClock
+from trap_cycle_bot.rules import ladder_magic_number
+
+Result = collections.namedtuple("Result", ["retcode", "order", "deal", "comment"])
+Position = collections.namedtuple("Position", ["ticket", "symbol", "type", "volume", "magic", "comment"])
+
+SYMBOL = "EURUSDc"
+START_TS = 1_800_000_000.0
+RES_S_OK = (1, "Success")
+RES_E_INTERNAL_FAIL_TIMEOUT = (-10005, "IPC timeout")
+
+
+class VerifyThenResendTest(unittest.TestCase):
+    """A lost order_send reply is looked up on the broker before resending; a failed lookup is never read as success."""
+
+    def setUp(self):
+        self.terminal = types.SimpleNamespace(
+            TRADE_RETCODE_DONE=10009, TRADE_RETCODE_DONE_PARTIAL=10010, TRADE_RETCODE_TIMEOUT=10012,
+            TRADE_RETCODE_CONNECTION=10031, TRADE_RETCODE_ERROR=10011, TRADE_RETCODE_REQUOTE=10004,
+            TRADE_RETCODE_PRICE_CHANGED=10020, TRADE_RETCODE_PRICE_OFF=10021, TRADE_RETCODE_INVALID_PRICE=10015,
+            TRADE_RETCODE_INVALID_STOPS=10016, TRADE_RETCODE_TOO_MANY_REQUESTS=10024, TRADE_RETCODE_LOCKED=10028,
+            TRADE_RETCODE_FROZEN=10029, TRADE_ACTION_DEAL=1, TRADE_ACTION_REMOVE=8, ORDER_TYPE_BUY=0, ORDER_TYPE_SELL=1,
+            POSITION_TYPE_BUY=0, POSITION_TYPE_SELL=1, ORDER_TIME_GTC=0,
+            order_send=mock.Mock(), positions_get=mock.Mock(), orders_get=mock.Mock(return_value=()),
+            last_error=mock.Mock(return_value=RES_S_OK), symbol_info_tick=mock.Mock(return_value=None),
+        )
+        patches = [
+            mock.patch.object(engine, "EVENT_JOURNAL_ENABLED", False),
+            mock.patch.object(engine, "broker", engine.RecordingBroker(self.terminal)),
+            mock.patch.object(engine, "_order_retcode_policies", None),
+            mock.patch.object(engine, "get_symbol_details", lambda symbol_name: types.SimpleNamespace(filling_mode=0)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        engine.set_clock(VirtualClock(START_TS))
+        self.addCleanup(engine.set_clock, RealClock())
+
+    def test_close_is_not_reported_done_when_lookup_fails(self):
+        position = Position(501, SYMBOL, 0, 0.01, 1000001, "")
+        self.terminal.order_send.return_value = Result(10031, 0, 0, "No connection")
+        self.terminal.positions_get.side_effect = lambda **kwargs: None if self.terminal.order_send.called else (position,)
+        self.terminal.last_error.return_value = RES_E_INTERNAL_FAIL_TIMEOUT
+        self.assertFalse(engine.close_single_position(SYMBOL, 501))
+        self.assertEqual(self.terminal.order_send.call_count, 1) # Not resent while the outcome is unknown
+
+    def test_cancel_is_not_reported_done_when_lookup_fails(self):
+        self.terminal.order_send.return_value = None
+        self.terminal.orders_get.return_value = None
+        self.terminal.last_error.return_value = RES_E_INTERNAL_FAIL_TIMEOUT
+        self.assertFalse(engine.cancel_order(SYMBOL, 777))
+
+    def test_late_arriving_order_is_found_instead_of_resent(self):
+        filled = Position(601, SYMBOL, 0, 0.01, 1000001, "TC L0 M1000001 abc123")
+        lookups = [(), (), (), (filled,)]
+        self.terminal.order_send.return_value = None # Reply lost
+        self.terminal.positions_get.side_effect = lambda **kwargs: lookups.pop(0) if len(lookups) > 1 else lookups[0]
+        result = engine.execute_order_request(
+            SYMBOL, {"action": 1, "comment": filled.comment}, "OPEN", (10009,),
+            find_existing_result=lambda: engine._find_open_by_idempotency_key(SYMBOL, "abc123", include_pending_orders=False)
+        )
+        self.assertEqual(result.order, 601)
+        self.assertEqual(self.terminal.order_send.call_count, 1)
+
+    def test_order_confirmed_absent_is_resent(self):
+        self.terminal.order_send.side_effect = [None, Result(10009, 602, 0, "Done")]
+        self.terminal.positions_get.return_value = ()
+        result = engine.execute_order_request(
+            SYMBOL, {"action": 1}, "OPEN", (10009,),
+            find_existing_result=lambda: engine._find_open_by_idempotency_key(SYMBOL, "abc123", include_pending_orders=False)
+        )
+        self.assertEqual(result.order, 602)
+        self.assertEqual(self.terminal.positions_get.call_count, engine.ORDER_VERIFY_POLLS)
+
+    def test_seven_digit_ladder_magic_survives_the_comment_limit(self):
+        magic = ladder_magic_number(67893, 1) # 1067893
+        for readable in (f"{engine.ORDER_COMMENT_PREFIX} L12 PBS M{magic}", f"TrapCycle L12 PBS M{magic}"):
+            comment = engine.with_idempotency_key(readable, "abc123")
+            self.assertLessEqual(len(comment), engine.ORDER_COMMENT_MAX_LENGTH)
+            self.assertTrue(comment.endswith(f" M{magic} abc123"), comment)
+        broker_comment = comment[:engine.ORDER_COMMENT_MAX_LENGTH] # What MT5 stores
+        self.terminal.positions_get.return_value = (Position(701, SYMBOL, 0, 0.01, magic, broker_comment),)
+        self.assertEqual(engine._find_open_by_idempotency_key(SYMBOL, "abc123", include_pending_orders=False).order, 701)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import collections
+import types
+import unittest
+from unittest import mock
+
+from trap_cycle_bot import engine
+from trap_cycle_bot.clock import RealClock, VirtualClock
+
+Tick = collections.namedtuple("Tick", ["bid", "ask", "time_msc"])
+
+START_TS = 1_800_000_000.0
+POINT = 0.00001
+
+
+class LevelDistanceRefreshTest(unittest.TestCase):
+    """Fresh quotes are read per broker symbol, and only as often as its nearest ladder's tier needs."""
+
+    def setUp(self):
+        self.tick = Tick(1.10000, 1.10010, 1)
+        self.symbol_info_tick = mock.Mock(side_effect=lambda symbol: self.tick)
+        terminal = types.SimpleNamespace(symbol_info_tick=self.symbol_info_tick)
+        patches = [
+            mock.patch.object(engine, "broker", engine.RecordingBroker(terminal)),
+            mock.patch.object(engine, "market_stats", {}),
+            mock.patch.object(engine, "ladder_level_targets", {}),
+            mock.patch.object(engine, "ladder_level_distance", {}),
+            mock.patch.object(engine, "ladder_level_measured_at", {}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        engine.set_clock(VirtualClock(START_TS))
+        self.addCleanup(engine.set_clock, RealClock())
+
+    def measure_from_snapshot(self, symbol_name, trigger_price):
+        engine.ladder_level_targets[symbol_name] = (POINT, ((trigger_price, "ask", True),))
+        engine.ladder_level_distance[symbol_name] = engine.level_distance_points(engine.ladder_level_targets[symbol_name], self.tick)
+        engine.ladder_level_measured_at[symbol_name] = engine.clock.time()
+
+    def refresh_for(self, seconds, active_symbols):
+        for _ in range(round(seconds / engine.SCHEDULER_TICK_SECONDS)):
+            engine.clock.advance(engine.SCHEDULER_TICK_SECONDS)
+            engine.refresh_level_distances(active_symbols, engine.clock.time())
+
+    def test_distant_ladder_is_requoted_every_few_seconds(self):
+        self.measure_from_snapshot("EURUSDc", 1.10510) # 500 points away
+        self.refresh_for(6.0, ["EURUSDc"])
+        self.assertEqual(self.symbol_info_tick.call_count, 2)
+
+    def test_near_ladder_is_requoted_every_tick(self):
+        self.measure_from_snapshot("EURUSDc", 1.10040) # 30 points away
+        self.refresh_for(1.0, ["EURUSDc"])
+        self.assertEqual(self.symbol_info_tick.call_count, 4)
+
+    def test_ladders_on_one_symbol_share_a_read(self):
+        self.measure_from_snapshot("EURUSDc", 1.10510)
+        self.measure_from_snapshot("EURUSDc#1", 1.10040)
+        self.tick = Tick(1.10000, 1.10020, 2)
+        self.refresh_for(engine.SCHEDULER_TICK_SECONDS, ["EURUSDc", "EURUSDc#1"])
+        self.symbol_info_tick.assert_called_once_with("EURUSDc")
+        self.assertAlmostEqual(engine.ladder_level_distance["EURUSDc"], 490.0)
+        self.assertAlmostEqual(engine.ladder_level_distance["EURUSDc#1"], 20.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
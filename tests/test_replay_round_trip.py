@@ -0,0 +1,64 @@
+import datetime
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from trap_cycle_bot import engine
+from trap_cycle_bot.clock import RealClock, VirtualClock
+
+from simulated_terminal import SimulatedTerminal
+
+REPO_SYMBOL_CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "symbol_config.json")
+SIMULATED_SYMBOLS = {"EURUSDc": (0.00001, 5, 1.1000), "XAUUSDm": (0.001, 3, 2000.0), "BTCUSDc": (0.01, 2, 60000.0)}
+START_TS = datetime.datetime(2026, 1, 6, 8, 0).timestamp() # A Tuesday, inside the configured trading hours
+RUN_SECONDS = 2 * 3600
+
+
+class ReplayRoundTripTest(unittest.TestCase):
+    """A journal recorded by the real cycle_management_worker replays to the same events."""
+
+    def setUp(self):
+        output_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_folder, ignore_errors=True)
+        engine.set_output_folder(output_folder)
+        self.addCleanup(engine.set_output_folder, engine.CYCLE_DATA_LOG_FOLDER)
+        engine.set_clock(VirtualClock(START_TS))
+        self.addCleanup(engine.set_clock, RealClock())
+        patches = [
+            mock.patch.object(engine, "EVENT_JOURNAL_ENABLED", True),
+            mock.patch.object(engine, "SYMBOL_CONFIG_FILE", REPO_SYMBOL_CONFIG_FILE),
+            mock.patch.object(engine, "broker", engine.RecordingBroker(SimulatedTerminal(engine.clock, SIMULATED_SYMBOLS))),
+            mock.patch.object(engine, "market_stats", {}),
+            mock.patch.object(engine, "parked_auto_restart_symbols", {}),
+            mock.patch.object(engine, "_next_broker_offset_refresh_ts", 0.0),
+            mock.patch.object(engine, "_next_scheduler_wakeup_ts", float("inf")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(engine.close_event_journal)
+
+    def test_recorded_worker_run_replays_identically(self):
+        self.assertTrue(engine.initialize_mt5_connection())
+        engine.initialize_all_symbol_states()
+        self.assertTrue(engine.load_and_apply_bot_config())
+        for symbol_name in ("EURUSDc", "XAUUSDm"):
+            with engine.global_state_lock:
+                engine.user_initial_preference_is_buy[symbol_name] = True
+            engine.journal_command("set_preference", symbol_name, is_buy=True)
+            engine.journal_command("start_l0", symbol_name, is_buy=False)
+            engine.start_L0_market_cycle(symbol_name, is_buy_L0=False)
+        engine.cycle_management_worker(run_until_ts=START_TS + RUN_SECONDS)
+        engine.close_event_journal()
+
+        journal_files = glob.glob(os.path.join(engine.EVENT_JOURNAL_FOLDER, "events_*"))
+        self.assertEqual(len(journal_files), 1)
+        with mock.patch("builtins.print"):
+            self.assertTrue(engine.replay_event_journal(journal_files[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import datetime
+import unittest
+
+from trap_cycle_bot import engine
+
+
+def utc_ts(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+class SessionAcrossDstChangeTest(unittest.TestCase):
+    """Session times stay on the symbol's wall clock when its timezone changes offset (Europe/London, 2026)."""
+
+    def setUp(self):
+        self.calendar_settings = engine.compile_calendar_settings({"timezone": "Europe/London", "weekend_days": ["Sat", "Sun"], "holidays": []})
+        self.calendar = engine.compile_symbol_calendar("GBPUSD", {"SESSIONS": [{"days": ["Mon", "Tue", "Wed", "Thu", "Fri"], "open": "08:00", "close": "16:30"}]}, self.calendar_settings, 0, 24)
+
+    def test_weekend_into_summer_time_opens_an_hour_earlier_in_utc(self):
+        # Clocks go forward on Sun 29 March: Friday's session is GMT, Monday's is BST.
+        self.assertEqual(engine.compute_session_state(self.calendar, utc_ts(2026, 3, 27, 12, 0)), engine.SessionState(True, utc_ts(2026, 3, 27, 16, 30)))
+        self.assertEqual(engine.compute_session_state(self.calendar, utc_ts(2026, 3, 28, 12, 0)), engine.SessionState(False, utc_ts(2026, 3, 30, 7, 0)))
+        self.assertEqual(engine.compute_session_state(self.calendar, utc_ts(2026, 3, 30, 7, 0)), engine.SessionState(True, utc_ts(2026, 3, 30, 15, 30)))
+
+    def test_weekend_out_of_summer_time_opens_an_hour_later_in_utc(self):
+        # Clocks go back on Sun 25 October.
+        self.assertEqual(engine.compute_session_state(self.calendar, utc_ts(2026, 10, 23, 12, 0)), engine.SessionState(True, utc_ts(2026, 10, 23, 15, 30)))
+        self.assertEqual(engine.compute_session_state(self.calendar, utc_ts(2026, 10, 24, 12, 0)), engine.SessionState(False, utc_ts(2026, 10, 26, 8, 0)))
+        self.assertFalse(engine.compute_session_state(self.calendar, utc_ts(2026, 10, 26, 7, 30)).is_open)
+
+    def test_overnight_session_spanning_the_change_keeps_its_wall_clock_close(self):
+        calendar = engine.compile_symbol_calendar("XAUUSD", {"SESSIONS": [{"days": ["Sat"], "open": "22:00", "close": "03:00"}]},
+                                                  engine.compile_calendar_settings({"timezone": "Europe/London", "weekend_days": [], "holidays": []}), 0, 24)
+        # 22:00 GMT Saturday to 03:00 BST Sunday is four hours, not five.
+        self.assertEqual(engine.compute_session_state(calendar, utc_ts(2026, 3, 28, 22, 0)), engine.SessionState(True, utc_ts(2026, 3, 29, 2, 0)))
+        self.assertFalse(engine.compute_session_state(calendar, utc_ts(2026, 3, 29, 2, 0)).is_open)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import collections
+import threading
+import types
+import unittest
+from unittest import mock
+
+from trap_cycle_bot import engine
+from trap_cycle_bot.clock import RealClock, VirtualClock
+
+Position = collections.namedtuple("Position", ["ticket", "symbol", "magic"])
+Order = collections.namedtuple("Order", ["ticket", "symbol", "magic", "state"])
+
+SYMBOL = "EURUSDc"
+START_TS = 1_800_000_000.0
+ORDER_STATE_PLACED, ORDER_STATE_CANCELED, ORDER_STATE_FILLED = 1, 2, 4
+
+
+class WatchdogTerminalTrackingTest(unittest.TestCase):
+    """The watchdog learns that the worker is inside a terminal call from the broker proxy, not from its source."""
+
+    def setUp(self):
+        self.seen_in_flight = []
+        def terminal_info():
+            self.seen_in_flight.append(engine.broker_calls_in_flight.get(threading.get_ident()))
+            return None
+        terminal = types.SimpleNamespace(terminal_info=terminal_info)
+        patches = [
+            mock.patch.object(engine, "EVENT_JOURNAL_ENABLED", False),
+            mock.patch.object(engine, "broker", engine.RecordingBroker(terminal)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        engine.set_clock(VirtualClock(START_TS))
+        self.addCleanup(engine.set_clock, RealClock())
+
+    def test_journaled_and_raw_calls_are_tracked_for_their_duration(self):
+        engine.broker.terminal_info()
+        engine.broker.raw.terminal_info()
+        self.assertEqual(self.seen_in_flight, [("terminal_info", START_TS), ("terminal_info", START_TS)])
+        self.assertNotIn(threading.get_ident(), engine.broker_calls_in_flight)
+
+
+class ResyncAfterReconnectTest(unittest.TestCase):
+    """After a reconnect the worker drops positions and pending orders that ended while the terminal was unreachable."""
+
+    def setUp(self):
+        self.magic = engine.SYMBOL_CONFIGS[SYMBOL]["MAGIC_NUMBER"]
+        self.terminal = types.SimpleNamespace(
+            ORDER_STATE_PLACED=ORDER_STATE_PLACED, ORDER_STATE_CANCELED=ORDER_STATE_CANCELED, ORDER_STATE_REJECTED=5,
+            ORDER_STATE_EXPIRED=6, ORDER_STATE_FILLED=ORDER_STATE_FILLED,
+            positions_get=mock.Mock(return_value=(Position(502, SYMBOL, self.magic), Position(900, SYMBOL, self.magic + 1))),
+            orders_get=mock.Mock(return_value=()), history_orders_get=mock.Mock(),
+            last_error=mock.Mock(return_value=(1, "Success")),
+        )
+        patches = [
+            mock.patch.object(engine, "EVENT_JOURNAL_ENABLED", False),
+            mock.patch.object(engine, "broker", engine.RecordingBroker(self.terminal)),
+            mock.patch.object(engine, "get_cycle_profile", lambda symbol_name: None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        with engine.global_state_lock:
+            engine._initialize_symbol_state(SYMBOL)
+            engine.is_cycle_active[SYMBOL] = True
+            engine.cycle_open_position_tickets[SYMBOL] = [501, 502]
+            engine.active_pending_order_ticket[SYMBOL] = 601
+            engine.active_pending_order_is_buy_stop[SYMBOL] = True
+        self.addCleanup(self.reset_symbol_state)
+
+    def reset_symbol_state(self):
+        with engine.global_state_lock:
+            engine._initialize_symbol_state(SYMBOL)
+
+    def test_closed_positions_and_cancelled_pending_are_dropped(self):
+        self.terminal.history_orders_get.return_value = (Order(601, SYMBOL, self.magic, ORDER_STATE_CANCELED),)
+        engine.resync_cycle_state_with_broker()
+        self.assertEqual(engine.cycle_open_position_tickets[SYMBOL], [502])
+        self.assertEqual(engine.active_pending_order_ticket[SYMBOL], 0)
+
+    def test_filled_pending_is_left_for_the_next_pass(self):
+        self.terminal.history_orders_get.return_value = (Order(601, SYMBOL, self.magic, ORDER_STATE_FILLED),)
+        engine.resync_cycle_state_with_broker()
+        self.assertEqual(engine.cycle_open_position_tickets[SYMBOL], [502])
+        self.assertEqual(engine.active_pending_order_ticket[SYMBOL], 601)
+
+    def test_nothing_changes_when_the_terminal_does_not_answer(self):
+        self.terminal.positions_get.return_value = None
+        self.terminal.last_error.return_value = (-10004, "No IPC connection")
+        engine.resync_cycle_state_with_broker()
+        self.assertEqual(engine.cycle_open_position_tickets[SYMBOL], [501, 502])
+        self.assertEqual(engine.active_pending_order_ticket[SYMBOL], 601)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,12 @@
+"""
+Multi-symbol trap cycle bot for MetaTrader 5.
+
+Entry points:
+  python -m trap_cycle_bot            live bot (needs the MT5 terminal)
+  python -m trap_cycle_bot.report     realized P&L report from the deal journal
+  python -m trap_cycle_bot.tools      offline tools (ladder calculator, config validation, journal replay)
+
+Modules: engine (live state, broker access, workers), rules (pure ladder rules), market_stats (ring buffers),
+clock (real and virtual time), live (command prompt). Importing any of them has no side effects; MetaTrader5
+is only imported when the engine first talks to the broker, and logging is configured by the entry points.
+"""
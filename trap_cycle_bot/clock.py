@@ -0,0 +1,38 @@
+import time
+import datetime
+import threading
+
+# --- Clock ---
+# All trading logic reads time and sleeps through the engine's `clock`. RealClock is the wall clock; a VirtualClock
+# jumps ahead instead of sleeping, so the real management code can be driven through a simulated day in seconds.
+class RealClock:
+    def time(self): return time.time()
+    def sleep(self, seconds): time.sleep(seconds)
+    def wait(self, event, timeout=None):
+        """event.wait(timeout): True if the event is set, False on timeout."""
+        return event.wait(timeout)
+    def now(self): return datetime.datetime.now()
+    def utcnow(self): return datetime.datetime.utcnow()
+    def today(self): return datetime.date.today()
+
+class VirtualClock(RealClock):
+    """
+    Simulated time starting at start_ts (epoch seconds). sleep/wait advance it instantly by the requested amount.
+    Meant for a single thread driving the simulation; every sleeping thread would move time forward.
+    """
+    def __init__(self, start_ts):
+        self._now_ts = float(start_ts)
+        self._lock = threading.Lock()
+    def time(self): return self._now_ts
+    def advance(self, seconds):
+        with self._lock:
+            self._now_ts += max(0.0, seconds)
+    def sleep(self, seconds): self.advance(seconds)
+    def wait(self, event, timeout=None):
+        if event.is_set() or timeout is None: return event.is_set() # Nothing else can set it while the simulation is blocked
+        self.advance(timeout)
+        return event.is_set()
+    def now(self): return datetime.datetime.fromtimestamp(self._now_ts)
+    def utcnow(self): return datetime.datetime.fromtimestamp(self._now_ts, datetime.timezone.utc).replace(tzinfo=None)
+    def today(self): return self.now().date()
+# --- End Clock ---
@@ -0,0 +1,3063 @@
+import time
+import datetime
+import logging  # For logging
+import os       # For log file check, directory creation
+import random   # For probability
+import csv      # For CSV writing
+import uuid     # For unique cycle IDs
+import threading # <<<< ADDED FOR THREADING
+import sqlite3  # For the local deal journal
+import sys      # For command-line options (replay tool)
+import collections # For immutable status snapshot records
+import types    # For read-only snapshot mappings
+import json     # For the external symbol config file
+import zoneinfo # For timezone-aware session calendars
+import signal   # For toggling the sampling profiler from outside the REPL
+import gzip     # For compressed event journal files
+import io       # For writing text to the compressed event journal
+try:
+    import tomllib  # Python 3.11+, only needed when the config file is TOML
+except ImportError:
+    tomllib = None
+from .clock import RealClock, VirtualClock
+from .market_stats import SymbolMarketStats
+from .rules import (LADDER_KEY_SEPARATOR, LADDER_MAGIC_STRIDE, MAX_LADDERS_LIMIT, SymbolProfile, build_symbol_profile,
+                    ladder_key, ladder_symbol, ladder_index, ladder_magic_number, round_lot_to_step, calculate_sl_tp_prices,
+                    next_pending_is_buy_stop, pending_entry_price)
+
+# --- Logging Setup ---
+# Handlers are attached by setup_logging() when the bot or a tool starts, so importing the engine has no side effects.
+LOG_FILE = "trap_cycle_bot.log"
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(module)s - %(funcName)s - Line:%(lineno)d - %(message)s')
+logger = logging.getLogger("TrapCycleBot")
+logger.setLevel(logging.DEBUG)
+
+def setup_logging(log_file=LOG_FILE, console_level=logging.INFO):
+    """Attaches the console handler and, unless log_file is None, the DEBUG file handler (append mode). Returns the log file path."""
+    if not logger.handlers:
+        console_handler = logging.StreamHandler() # To also print to console
+        console_handler.setFormatter(log_formatter)
+        console_handler.setLevel(console_level)
+        logger.addHandler(console_handler)
+        if log_file:
+            log_file_handler = logging.FileHandler(log_file, mode='a')
+            log_file_handler.setFormatter(log_formatter)
+            log_file_handler.setLevel(logging.DEBUG)
+            logger.addHandler(log_file_handler)
+    return next((h.baseFilename for h in logger.handlers if isinstance(h, logging.FileHandler)), None)
+# --- End Logging Setup ---
+
+# --- Global Threading Primitives ---
+global_state_lock = threading.Lock() # Use threading.RLock() for re-entrant lock if complex nested calls are needed
+shutdown_event = threading.Event()
+# --- End Global Threading Primitives ---
+
+# --- Clock ---
+# All trading logic reads time and sleeps through `clock` (see clock.py).
+clock = RealClock()
+
+def set_clock(new_clock):
+    """Swaps the clock used by all trading logic (e.g. set_clock(VirtualClock(start_ts)) for a simulation)."""
+    global clock
+    clock = new_clock
+# --- End Clock ---
+
+# --- Trading Time Configuration ---
+# Defaults only; overridden by the "trading_hours" table of SYMBOL_CONFIG_FILE.
+TRADING_START_HOUR = 6
+TRADING_END_HOUR = 17
+# Session calendar defaults; overridden by the "calendar" table of SYMBOL_CONFIG_FILE.
+# "timezone" is an IANA name, "LOCAL" (this machine) or "BROKER" (MT5 server time, derived from tick timestamps).
+DEFAULT_CALENDAR_SETTINGS = {"timezone": "LOCAL", "weekend_days": ["Sat", "Sun"], "holidays": []}
+CALENDAR_SETTINGS = dict(DEFAULT_CALENDAR_SETTINGS)
+SESSION_LOOKAHEAD_DAYS = 14
+BROKER_TIME_OFFSET_REFRESH_SECONDS = 3600
+# --- End Trading Time Configuration ---
+
+# --- External Config File ---
+SYMBOL_CONFIG_FILE = "symbol_config.json" # JSON, or TOML when the name ends in .toml
+CONFIG_RELOAD_CHECK_INTERVAL_SECONDS = 5.0
+# --- End External Config File ---
+
+# --- Global Bot Configuration ---
+AUTO_RESTART_COMPLETED_CYCLES = True
+LAST_L0_WAS_BUY = {}
+user_initial_preference_is_buy = {}
+
+# --- Cycle Data Logging Configuration ---
+CYCLE_DATA_LOG_FOLDER = "forex_cycle_logs"
+CYCLE_DATA_CSV_FILE = os.path.join(CYCLE_DATA_LOG_FOLDER, "trading_cycle_data.csv")
+CYCLE_DATA_HEADERS = ["LoggedAtUTC", "Symbol", "CycleID", "CycleStartTimeUTC", "CycleEndTimeUTC", "DurationSeconds", "TrapsCount", "L0Direction", "Outcome"]
+cycle_tracking_data = {} # Stores {symbol: {"id": uuid, "start_time": dt_utc, "traps": 0, "l0_direction": "BUY"/"SELL"}}
+# --- End Cycle Data Logging Configuration ---
+
+# --- Deal Journal Configuration ---
+DEAL_JOURNAL_DB_FILE = os.path.join(CYCLE_DATA_LOG_FOLDER, "deal_journal.sqlite3")
+DEAL_INGEST_INTERVAL_SECONDS = 30.0
+DEAL_INGEST_OVERLAP_SECONDS = 300 # Re-read this much history each pass; inserts are idempotent by deal ticket
+DEAL_INGEST_INITIAL_LOOKBACK_DAYS = 90
+# --- End Deal Journal Configuration ---
+
+# --- Event Journal Configuration ---
+EVENT_JOURNAL_ENABLED = True
+EVENT_JOURNAL_FOLDER = os.path.join(CYCLE_DATA_LOG_FOLDER, "event_journal") # One JSON-lines file per day
+EVENT_JOURNAL_COMPRESSED = True # events_YYYYMMDD.jsonl.gz instead of .jsonl; replay reads both
+# --- End Event Journal Configuration ---
+
+# --- Sampling Profiler Configuration ---
+PROFILER_TARGET_THREAD_NAME = "CycleManagerThread"
+PROFILER_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILER_MAX_DURATION_SECONDS = 600 # Stops itself if somebody forgets to switch it off
+PROFILER_OUTPUT_FOLDER = os.path.join(CYCLE_DATA_LOG_FOLDER, "profiles")
+PROFILER_SUMMARY_TOP_N = 30
+# --- End Sampling Profiler Configuration ---
+
+# --- Output Folder ---
+def set_output_folder(folder):
+    """Points the cycle CSV, deal journal, event journal and profiles at `folder` (e.g. a separate folder for simulations so they never mix with live records). Closes any open journal first."""
+    global CYCLE_DATA_LOG_FOLDER, CYCLE_DATA_CSV_FILE, DEAL_JOURNAL_DB_FILE, EVENT_JOURNAL_FOLDER, PROFILER_OUTPUT_FOLDER
+    close_event_journal()
+    close_deal_journal()
+    CYCLE_DATA_LOG_FOLDER = folder
+    CYCLE_DATA_CSV_FILE = os.path.join(folder, "trading_cycle_data.csv")
+    DEAL_JOURNAL_DB_FILE = os.path.join(folder, "deal_journal.sqlite3")
+    EVENT_JOURNAL_FOLDER = os.path.join(folder, "event_journal")
+    PROFILER_OUTPUT_FOLDER = os.path.join(folder, "profiles")
+    logger.info(f"OUTPUT: Cycle data, deal and event journals now written under {folder}")
+# --- End Output Folder ---
+
+# --- Watchdog Configuration ---
+WORKER_PASS_INTERVAL_SECONDS = 1.5
+WATCHDOG_CHECK_INTERVAL_SECONDS = 1.0
+PASS_DURATION_BUDGET_SECONDS = 5.0   # A completed pass slower than this is logged
+PASS_LAG_BUDGET_SECONDS = 2.0        # A pass starting this late after its schedule is logged
+WORKER_STALL_TIMEOUT_SECONDS = 30.0  # No worker heartbeat for this long = stalled (usually blocked in an MT5 call)
+TERMINAL_CHECK_INTERVAL_SECONDS = 5.0
+RECONNECT_BACKOFF_INITIAL_SECONDS = 2.0
+RECONNECT_BACKOFF_MAX_SECONDS = 60.0
+# --- End Watchdog Configuration ---
+
+# --- Priority Scheduler Configuration ---
+SCHEDULER_TICK_SECONDS = 0.25 # How often the worker looks for ladders that are due
+# (max distance in points to the nearest TP or pending trigger, manage interval in seconds), nearest tier first.
+PRIORITY_TIERS = ((50, 0.25), (300, WORKER_PASS_INTERVAL_SECONDS), (None, 6.0))
+# (max distance in points, seconds a ladder's last quote is reused for ranking before a fresh tick is read), nearest tier first.
+QUOTE_REFRESH_TIERS = ((50, SCHEDULER_TICK_SECONDS), (300, 0.75), (None, 3.0))
+# --- End Priority Scheduler Configuration ---
+
+# --- Market Statistics Configuration ---
+MARKET_STATS_BAR_SECONDS = 60  # Ticks are folded into bars of this length for the ATR and tick rate
+ATR_PERIOD_BARS = 14
+ATR_MIN_BARS = 5               # Fewer closed bars = still warming up: no distance scaling, no volatility block
+SPREAD_WINDOW_TICKS = 500
+SPREAD_MIN_SAMPLES = 50        # Spread ratio checks need at least this many ticks
+TICK_RATE_WINDOW_BARS = 5
+MARKET_STATS_IDLE_SAMPLE_SECONDS = 2.0 # Symbols using the stats but without an active ladder are sampled this often
+ATR_SCALE_MIN_DEFAULT = 1.0
+ATR_SCALE_MAX_DEFAULT = 3.0
+MARKET_BLOCK_RETRY_SECONDS = 30.0 # An auto-restart blocked by spread/volatility limits is parked and retried this often
+# --- End Market Statistics Configuration ---
+
+
+# --- Symbol-Specific Configurations ---
+# Built-in defaults, used when SYMBOL_CONFIG_FILE does not exist. The live SYMBOL_CONFIGS / SYMBOL_ALIASES
+# are replaced atomically by apply_bot_config() at startup and on every hot reload.
+DEFAULT_SYMBOL_CONFIGS = {
+    "EURUSDc": {
+        "INITIAL_LOT_SIZE": 0.01, "LOT_MULTIPLIER": 2.5, "NOMINAL_TP_PIPS": 9.5,
+        "NOMINAL_SL_PIPS": 20.5, "TRIGGER_DISTANCE_PIPS": 9.5, "MAX_TRADES_IN_CYCLE": 100,
+        "MAGIC_NUMBER": 67893, "PIP_MULTIPLIER": 10,
+        "TRADE_24_7": False
+    },
+    "XAUUSDm": {
+        "INITIAL_LOT_SIZE": 0.01, "LOT_MULTIPLIER": 2.5, "NOMINAL_TP_PIPS": 7.3,
+        "NOMINAL_SL_PIPS": 15.2, "TRIGGER_DISTANCE_PIPS": 7.3, "MAX_TRADES_IN_CYCLE": 8,
+        "MAGIC_NUMBER": 67894, "PIP_MULTIPLIER": 1000,
+        "TRADE_24_7": False
+    },
+    "BTCUSDc": {
+        "INITIAL_LOT_SIZE": 0.01, "LOT_MULTIPLIER": 2.5, "NOMINAL_TP_PIPS": 12,
+        "NOMINAL_SL_PIPS": 26, "TRIGGER_DISTANCE_PIPS": 12, "MAX_TRADES_IN_CYCLE": 100,
+        "MAGIC_NUMBER": 67895, "PIP_MULTIPLIER": 1000,
+        "TRADE_24_7": True
+    }
+}
+# --- User-Friendly Symbol Aliases ---
+DEFAULT_SYMBOL_ALIASES = {
+    "eurusd": "EURUSDc",
+    "gold": "XAUUSDm",
+    "eur": "EURUSDc",
+    "xau": "XAUUSDm",
+    "btc": "BTCUSDc"
+}
+SYMBOL_CONFIGS = dict(DEFAULT_SYMBOL_CONFIGS)
+SYMBOL_ALIASES = dict(DEFAULT_SYMBOL_ALIASES)
+
+# --- Compiled Symbol Profiles ---
+# Each symbol config is compiled once per load into a SymbolProfile (rules.py) with the price offsets precomputed
+# (pips * PIP_MULTIPLIER * point), so order placement never recomputes them.
+symbol_profiles = {} # {symbol: SymbolProfile} for the currently loaded config; replaced as a whole on reload
+cycle_symbol_profile = {} # {symbol: SymbolProfile} pinned at L0 so a reload only affects new cycles
+_last_seen_config_file_mtime = None
+# --- Global State Dictionaries ---
+# Cycle state is keyed by ladder key (rules.ladder_key): the symbol itself for its first ladder, "SYMBOL#n" for ladder n.
+is_cycle_active = {}; current_level = {}; active_position_ticket = {}; active_position_entry_price = {}
+active_position_lot_size = {}; active_position_is_buy = {}; active_pending_order_ticket = {}
+active_pending_order_is_buy_stop = {}; cycle_open_position_tickets = {}
+cycle_L0_entry_price = {}
+cycle_floating_pnl = {} # Last floating P&L (profit + swap) of the tracked positions, refreshed from each pass snapshot
+
+# --- Published Status Snapshot ---
+# The worker publishes an immutable snapshot at the end of every pass. Readers (REPL, loggers, metrics,
+# control API) only ever dereference `_published_status_snapshot`, which is a single atomic reference read,
+# so they never take `global_state_lock` and can never delay the trading logic.
+SymbolStatus = collections.namedtuple("SymbolStatus", ["symbol", "is_active", "level", "open_tickets", "pending_ticket", "l0_entry_price", "cycle_age_seconds", "floating_pnl", "margin_headroom", "max_fundable_level"])
+StatusSnapshot = collections.namedtuple("StatusSnapshot", ["published_at_utc", "pass_number", "symbols"])
+_published_status_snapshot = StatusSnapshot(None, 0, types.MappingProxyType({}))
+
+# --- Cycle Data Logging Functions ---
+def ensure_cycle_data_log_exists():
+    try:
+        if not os.path.exists(CYCLE_DATA_LOG_FOLDER):
+            os.makedirs(CYCLE_DATA_LOG_FOLDER)
+            logger.info(f"Created cycle data log folder: {CYCLE_DATA_LOG_FOLDER}")
+
+        if not os.path.exists(CYCLE_DATA_CSV_FILE):
+            with open(CYCLE_DATA_CSV_FILE, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(CYCLE_DATA_HEADERS)
+            logger.info(f"Created cycle data CSV file with headers: {CYCLE_DATA_CSV_FILE}")
+    except Exception as e:
+        logger.error(f"Error ensuring cycle data log exists: {e}")
+
+def _log_cycle_data_to_csv(log_time_utc, symbol, cycle_id, start_time_utc, end_time_utc, duration_seconds, traps_count, l0_direction, outcome):
+    if _replay_session is not None: return # Replays must not write into the production analytics
+    try:
+        ensure_cycle_data_log_exists()
+        row = [
+            log_time_utc.strftime('%Y-%m-%d %H:%M:%S'),
+            symbol,
+            str(cycle_id),
+            start_time_utc.strftime('%Y-%m-%d %H:%M:%S'),
+            end_time_utc.strftime('%Y-%m-%d %H:%M:%S'),
+            int(duration_seconds),
+            traps_count,
+            l0_direction,
+            outcome
+        ]
+        with open(CYCLE_DATA_CSV_FILE, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(row)
+        logger.info(f"CYCLE_CSV_LOG: Appended cycle data for {symbol}, ID {cycle_id}, Outcome {outcome}, Traps: {traps_count}")
+    except Exception as e:
+        logger.error(f"CYCLE_CSV_LOG: Error writing cycle data to CSV for {symbol}, ID {cycle_id}: {e}")
+
+def _init_cycle_tracking(symbol_name, l0_is_buy_actual):
+    with global_state_lock:
+        cycle_tracking_data[symbol_name] = {
+            "id": journaled_value(f"cycle_id:{symbol_name}", lambda: str(uuid.uuid4())),
+            "start_time_utc": clock.utcnow(),
+            "traps": 1,
+            "l0_direction": "BUY" if l0_is_buy_actual else "SELL"
+        }
+        logger.info(f"CYCLE_TRACK_INIT ({symbol_name}): Started tracking cycle ID {cycle_tracking_data[symbol_name]['id']}, L0: {cycle_tracking_data[symbol_name]['l0_direction']}, Traps: {cycle_tracking_data[symbol_name]['traps']}")
+
+def _increment_trap_count(symbol_name):
+    with global_state_lock:
+        if symbol_name in cycle_tracking_data and cycle_tracking_data[symbol_name] is not None:
+            cycle_tracking_data[symbol_name]["traps"] += 1
+            logger.debug(f"CYCLE_TRACK_TRAP ({symbol_name}): Incremented trap count to {cycle_tracking_data[symbol_name]['traps']} for cycle ID {cycle_tracking_data[symbol_name]['id']}")
+        else:
+            logger.warning(f"CYCLE_TRACK_TRAP ({symbol_name}): Attempted to increment trap count, but no active cycle tracking found.")
+
+def _finalize_and_log_cycle(symbol_name, outcome):
+    tracking_info_snapshot = None
+    with global_state_lock:
+        if symbol_name in cycle_tracking_data and cycle_tracking_data[symbol_name] is not None:
+            tracking_info_snapshot = cycle_tracking_data[symbol_name].copy()
+            cycle_tracking_data[symbol_name] = None
+
+    if tracking_info_snapshot:
+        end_time_utc = clock.utcnow()
+        duration = end_time_utc - tracking_info_snapshot["start_time_utc"]
+
+        _log_cycle_data_to_csv(
+            log_time_utc=clock.utcnow(),
+            symbol=ladder_symbol(symbol_name),
+            cycle_id=tracking_info_snapshot["id"],
+            start_time_utc=tracking_info_snapshot["start_time_utc"],
+            end_time_utc=end_time_utc,
+            duration_seconds=duration.total_seconds(),
+            traps_count=tracking_info_snapshot["traps"],
+            l0_direction=tracking_info_snapshot["l0_direction"],
+            outcome=outcome
+        )
+        record_cycle_summary(symbol_name, tracking_info_snapshot, end_time_utc, outcome)
+        logger.info(f"CYCLE_TRACK_FINALIZE ({symbol_name}): Finalized and logged cycle ID {tracking_info_snapshot['id']} with outcome {outcome}, Traps: {tracking_info_snapshot['traps']}.")
+# --- End Cycle Data Logging Functions ---
+
+
+# --- Deal Journal ---
+# Local SQLite store of broker deals for our magic numbers, plus the mapping of positions to cycles.
+# A background ingester pulls new deals incrementally, so realized P&L per cycle is a single indexed join
+# instead of one history_deals_get round trip per ticket.
+deal_journal_lock = threading.Lock()
+_deal_journal_connection = None
+
+DEAL_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    ticket INTEGER PRIMARY KEY, order_ticket INTEGER, position_id INTEGER, symbol TEXT, magic INTEGER,
+    type INTEGER, entry INTEGER, time_msc INTEGER, volume REAL, price REAL,
+    profit REAL, commission REAL, swap REAL, fee REAL, comment TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_deals_position_id ON deals(position_id);
+CREATE INDEX IF NOT EXISTS idx_deals_time_msc ON deals(time_msc);
+CREATE INDEX IF NOT EXISTS idx_deals_magic_time ON deals(magic, time_msc);
+CREATE TABLE IF NOT EXISTS cycle_positions (
+    position_id INTEGER PRIMARY KEY, cycle_id TEXT NOT NULL, symbol TEXT, level INTEGER, recorded_at_utc TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cycle_positions_cycle_id ON cycle_positions(cycle_id);
+CREATE TABLE IF NOT EXISTS cycles (
+    cycle_id TEXT PRIMARY KEY, symbol TEXT, start_time_utc TEXT, end_time_utc TEXT,
+    duration_seconds INTEGER, traps INTEGER, l0_direction TEXT, outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cycles_start_time ON cycles(start_time_utc);
+CREATE INDEX IF NOT EXISTS idx_cycles_symbol_start_time ON cycles(symbol, start_time_utc);
+CREATE TABLE IF NOT EXISTS ingest_state (key TEXT PRIMARY KEY, value INTEGER);
+"""
+
+CyclePnl = collections.namedtuple("CyclePnl", ["cycle_id", "symbol", "start_time_utc", "outcome", "traps", "deal_count", "profit", "commission", "swap", "fee", "net"])
+
+def _get_deal_journal_connection():
+    # Caller must hold deal_journal_lock.
+    global _deal_journal_connection
+    if _deal_journal_connection is None:
+        os.makedirs(os.path.dirname(DEAL_JOURNAL_DB_FILE) or ".", exist_ok=True)
+        _deal_journal_connection = sqlite3.connect(DEAL_JOURNAL_DB_FILE, check_same_thread=False)
+        _deal_journal_connection.execute("PRAGMA journal_mode=WAL")
+        _deal_journal_connection.executescript(DEAL_JOURNAL_SCHEMA)
+        logger.info(f"DEAL_JOURNAL: Opened {DEAL_JOURNAL_DB_FILE}")
+    return _deal_journal_connection
+
+def close_deal_journal():
+    global _deal_journal_connection
+    with deal_journal_lock:
+        if _deal_journal_connection is not None:
+            _deal_journal_connection.close()
+            _deal_journal_connection = None
+
+def record_cycle_position(symbol_name, position_ticket, level):
+    if _replay_session is not None: return
+    with global_state_lock:
+        tracking_info = cycle_tracking_data.get(symbol_name)
+        cycle_id = str(tracking_info["id"]) if tracking_info else None
+    if cycle_id is None:
+        logger.warning(f"DEAL_JOURNAL ({symbol_name}): No tracked cycle for position {position_ticket}. Not recorded.")
+        return
+    try:
+        with deal_journal_lock:
+            connection = _get_deal_journal_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cycle_positions (position_id, cycle_id, symbol, level, recorded_at_utc) VALUES (?, ?, ?, ?, ?)",
+                    (position_ticket, cycle_id, ladder_symbol(symbol_name), level, clock.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+    except Exception as e:
+        logger.error(f"DEAL_JOURNAL ({symbol_name}): Error recording position {position_ticket} for cycle {cycle_id}: {e}")
+
+def record_cycle_summary(symbol_name, tracking_info, end_time_utc, outcome):
+    if _replay_session is not None: return
+    try:
+        with deal_journal_lock:
+            connection = _get_deal_journal_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cycles (cycle_id, symbol, start_time_utc, end_time_utc, duration_seconds, traps, l0_direction, outcome) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(tracking_info["id"]), ladder_symbol(symbol_name), tracking_info["start_time_utc"].strftime('%Y-%m-%d %H:%M:%S'), end_time_utc.strftime('%Y-%m-%d %H:%M:%S'),
+                     int((end_time_utc - tracking_info["start_time_utc"]).total_seconds()), tracking_info["traps"], tracking_info["l0_direction"], outcome)
+                )
+    except Exception as e:
+        logger.error(f"DEAL_JOURNAL ({symbol_name}): Error recording cycle summary {tracking_info['id']}: {e}")
+
+def _journal_magic_numbers():
+    magic_numbers = {ladder_magic_number(c["MAGIC_NUMBER"], index) for c in SYMBOL_CONFIGS.values() for index in range(c.get("MAX_LADDERS", 1))}
+    with global_state_lock:
+        magic_numbers.update(p.config["MAGIC_NUMBER"] for p in cycle_symbol_profile.values() if p is not None)
+    return magic_numbers
+
+def ingest_new_deals():
+    """Pulls deals since the last ingested one (minus an overlap) and stores those with our magic numbers. Returns the count inserted."""
+    with deal_journal_lock:
+        connection = _get_deal_journal_connection()
+        row = connection.execute("SELECT value FROM ingest_state WHERE key = 'last_deal_time_msc'").fetchone()
+    last_deal_time_msc = row[0] if row else None
+    if last_deal_time_msc is None:
+        date_from = clock.now() - datetime.timedelta(days=DEAL_INGEST_INITIAL_LOOKBACK_DAYS)
+    else:
+        date_from = datetime.datetime.fromtimestamp(last_deal_time_msc / 1000.0 - DEAL_INGEST_OVERLAP_SECONDS)
+    date_to = clock.now() + datetime.timedelta(days=1) # Broker server time may run ahead of local time
+
+    deals = broker.raw.history_deals_get(date_from, date_to) # Bulk history pulls are not trading decisions; keep them out of the event journal
+    if deals is None:
+        logger.warning(f"DEAL_JOURNAL: history_deals_get failed, error code = {broker.raw.last_error()}")
+        return 0
+    magic_numbers = _journal_magic_numbers()
+    rows = [
+        (d.ticket, d.order, d.position_id, d.symbol, d.magic, d.type, d.entry, d.time_msc, d.volume, d.price,
+         d.profit, d.commission, d.swap, d.fee, d.comment)
+        for d in deals if d.magic in magic_numbers
+    ]
+    if not rows: return 0
+    newest_time_msc = max(r[7] for r in rows)
+    with deal_journal_lock:
+        connection = _get_deal_journal_connection()
+        with connection:
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO deals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            inserted = connection.total_changes - before
+            connection.execute(
+                "INSERT INTO ingest_state (key, value) VALUES ('last_deal_time_msc', ?) ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+                (newest_time_msc,)
+            )
+    if inserted: logger.debug(f"DEAL_JOURNAL: Ingested {inserted} new deals.")
+    return inserted
+
+def get_cycle_realized_pnl(cycle_ids=None, since_utc=None, limit=None):
+    """
+    Realized P&L per cycle from the journal in one indexed query. Filter by cycle IDs and/or cycle start time.
+    Returns a list of CyclePnl, newest cycle first.
+    """
+    conditions, params = [], []
+    if cycle_ids is not None:
+        cycle_ids = [str(c) for c in cycle_ids]
+        if not cycle_ids: return []
+        conditions.append(f"c.cycle_id IN ({','.join('?' * len(cycle_ids))})"); params.extend(cycle_ids)
+    if since_utc is not None:
+        conditions.append("c.start_time_utc >= ?"); params.append(since_utc.strftime('%Y-%m-%d %H:%M:%S'))
+    query = f"""
+        SELECT c.cycle_id, c.symbol, c.start_time_utc, c.outcome, c.traps, COUNT(d.ticket),
+               COALESCE(SUM(d.profit), 0), COALESCE(SUM(d.commission), 0), COALESCE(SUM(d.swap), 0), COALESCE(SUM(d.fee), 0)
+        FROM cycles c
+        LEFT JOIN cycle_positions cp ON cp.cycle_id = c.cycle_id
+        LEFT JOIN deals d ON d.position_id = cp.position_id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        GROUP BY c.cycle_id
+        ORDER BY c.start_time_utc DESC
+        {'LIMIT ' + str(int(limit)) if limit else ''}
+    """
+    with deal_journal_lock:
+        rows = _get_deal_journal_connection().execute(query, params).fetchall()
+    return [CyclePnl(*row, net=row[6] + row[7] + row[8] + row[9]) for row in rows]
+
+def get_realized_pnl_by_symbol(since_utc=None):
+    """Totals of get_cycle_realized_pnl grouped by symbol: {symbol: (cycles, wins, net)}."""
+    totals = {}
+    for cycle_pnl in get_cycle_realized_pnl(since_utc=since_utc):
+        cycles_count, wins, net = totals.get(cycle_pnl.symbol, (0, 0, 0.0))
+        totals[cycle_pnl.symbol] = (cycles_count + 1, wins + (cycle_pnl.outcome == "WIN"), net + cycle_pnl.net)
+    return totals
+
+def deal_journal_ingester_worker():
+    logger.info("Deal journal ingester thread started.")
+    while not shutdown_event.is_set():
+        try:
+            ingest_new_deals()
+        except Exception as e:
+            logger.error(f"DEAL_JOURNAL: Error during deal ingestion: {e}", exc_info=True)
+        clock.wait(shutdown_event, timeout=DEAL_INGEST_INTERVAL_SECONDS)
+    logger.info("Deal journal ingester thread stopped.")
+# --- End Deal Journal ---
+
+# --- Event Journal and Replay ---
+# Every broker response and every cycle state transition is appended to a compact JSON-lines journal.
+# Record kinds ("k"): "hdr" (broker constants), "cfg" (applied config), "call" (broker function, args, response;
+# no response when it repeats the previous one for the same call),
+# "val" (nondeterministic input: random rolls, IDs, trading-hours decisions), "pass" (worker pass and its symbols),
+# "cmd" (operator/scheduler command), "ev" (state transition) and "st" (every active ladder's state at day rollover). replay_event_journal() re-drives the real
+# management code from those records with a ReplayBroker and no sleeps, so production sequences can be
+# reproduced and profiled offline at full CPU speed.
+event_journal_lock = threading.Lock()
+_event_journal_file = None
+_event_journal_file_date = None
+_last_journaled_responses = {} # {call signature: encoded response} last written to the open file
+_last_config_journal_record = None
+_replay_session = None # ReplaySession while replaying, None when live
+
+def _journal_encode(value):
+    if value is None or isinstance(value, (bool, int, float, str)): return value
+    if hasattr(value, "_asdict"): return {"_t": type(value).__name__, **{k: _journal_encode(v) for k, v in value._asdict().items()}}
+    if isinstance(value, dict): return {str(k): _journal_encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)): return [_journal_encode(v) for v in value]
+    if isinstance(value, (datetime.datetime, datetime.date)): return value.isoformat()
+    return repr(value)
+
+_journal_record_types = {}
+
+def _journal_decode(value):
+    if isinstance(value, list): return tuple(_journal_decode(v) for v in value)
+    if isinstance(value, dict):
+        if "_t" not in value: return {k: _journal_decode(v) for k, v in value.items()}
+        fields = tuple(k for k in value.keys() if k != "_t")
+        record_type = _journal_record_types.get((value["_t"], fields))
+        if record_type is None:
+            record_type = collections.namedtuple(value["_t"], fields)
+            _journal_record_types[(value["_t"], fields)] = record_type
+        return record_type(*(_journal_decode(value[k]) for k in fields))
+    return value
+
+def _broker_call_signature(function_name, encoded_args, encoded_kwargs):
+    # order_send requests contain prices and random idempotency keys, so they are matched by intent only.
+    if function_name == "order_send":
+        request = encoded_args[0] if encoded_args else encoded_kwargs.get("request", {})
+        return json.dumps([function_name, request.get("action"), request.get("symbol"), request.get("order"), request.get("position")])
+    return json.dumps([function_name, encoded_args, encoded_kwargs], sort_keys=True)
+
+def _open_event_journal_file(state_record=None, symbol_infos=None):
+    # Caller must hold event_journal_lock. Records keep going to the open file until the worker rotates it.
+    global _event_journal_file, _event_journal_file_date
+    if _event_journal_file is not None:
+        return _event_journal_file
+    today = clock.today()
+    os.makedirs(EVENT_JOURNAL_FOLDER, exist_ok=True)
+    journal_path = os.path.join(EVENT_JOURNAL_FOLDER, f"events_{today.strftime('%Y%m%d')}.jsonl{'.gz' if EVENT_JOURNAL_COMPRESSED else ''}")
+    if EVENT_JOURNAL_COMPRESSED:
+        # Appending after a restart adds a gzip member; readers see one continuous stream.
+        # journal_flush() sync-flushes the compressor, so a crash loses at most the records since the last pass.
+        _event_journal_file = io.TextIOWrapper(gzip.GzipFile(journal_path, mode='ab', compresslevel=6), encoding="utf-8")
+    else:
+        _event_journal_file = open(journal_path, mode='a', buffering=1 << 16)
+    _event_journal_file_date = today
+    _last_journaled_responses.clear()
+    # Every file starts self-contained: broker constants, the config in force and, from a rotation, the open ladders.
+    constants = {name: getattr(broker.raw, name) for name in dir(broker.raw) if name.isupper() and isinstance(getattr(broker.raw, name), int)}
+    _event_journal_file.write(json.dumps({"k": "hdr", "t": clock.time(), "v": 2, "constants": constants}, separators=(",", ":")) + "\n")
+    if _last_config_journal_record is not None:
+        _event_journal_file.write(json.dumps(_last_config_journal_record, separators=(",", ":")) + "\n")
+    for symbol_name, info in (symbol_infos or {}).items():
+        # Replaying the carried-over config recompiles its profiles, which reads symbol_info.
+        _event_journal_file.write(json.dumps({"k": "call", "f": "symbol_info", "a": [symbol_name], "kw": {}, "r": _journal_encode(info), "t": clock.time()}, separators=(",", ":")) + "\n")
+    if state_record is not None:
+        _event_journal_file.write(json.dumps(dict(state_record, t=clock.time()), separators=(",", ":")) + "\n")
+    logger.info(f"EVENT_JOURNAL: Writing to {journal_path}")
+    return _event_journal_file
+
+def _cycle_state_record():
+    """Every active ladder's cycle state (caller must hold global_state_lock), so a day file replays from mid-cycle."""
+    ladders = {}
+    for symbol_name, cycle_active in is_cycle_active.items():
+        if not cycle_active: continue
+        profile = cycle_symbol_profile.get(symbol_name)
+        tracking_info = cycle_tracking_data.get(symbol_name)
+        ladders[symbol_name] = {
+            "level": current_level.get(symbol_name, 0),
+            "tickets": list(cycle_open_position_tickets.get(symbol_name, [])),
+            "pos": active_position_ticket.get(symbol_name, 0), "pos_price": active_position_entry_price.get(symbol_name, 0.0),
+            "pos_lot": active_position_lot_size.get(symbol_name, 0.0), "pos_buy": active_position_is_buy.get(symbol_name),
+            "pending": active_pending_order_ticket.get(symbol_name, 0), "pending_buy_stop": active_pending_order_is_buy_stop.get(symbol_name),
+            "l0_price": cycle_L0_entry_price.get(symbol_name, 0.0), "l0_buy": LAST_L0_WAS_BUY.get(symbol_name),
+            "preference": user_initial_preference_is_buy.get(symbol_name),
+            "profile": None if profile is None else dict(profile._asdict(), config=dict(profile.config)),
+            "plan": cycle_ladder_plan.get(symbol_name, ()), "max_fundable": cycle_max_fundable_level.get(symbol_name, -1),
+            "tracking": None if not tracking_info else dict(tracking_info, start_time_utc=tracking_info["start_time_utc"].isoformat())
+        }
+    return {"k": "st", "ladders": _journal_encode(ladders), "broker_offset": broker_time_offset_seconds}
+
+def _restore_cycle_state(state_record):
+    """Seeds a replay with the ladders that were open when its journal file started."""
+    ladders = _journal_decode(state_record["ladders"])
+    if state_record.get("broker_offset"): set_broker_time_offset(state_record["broker_offset"])
+    with global_state_lock:
+        for symbol_name, ladder in ladders.items():
+            if symbol_name not in is_cycle_active: _initialize_symbol_state(symbol_name)
+            profile = ladder["profile"]
+            tracking_info = ladder["tracking"]
+            is_cycle_active[symbol_name] = True
+            current_level[symbol_name] = ladder["level"]
+            cycle_open_position_tickets[symbol_name] = list(ladder["tickets"])
+            active_position_ticket[symbol_name] = ladder["pos"]; active_position_entry_price[symbol_name] = ladder["pos_price"]
+            active_position_lot_size[symbol_name] = ladder["pos_lot"]; active_position_is_buy[symbol_name] = ladder["pos_buy"]
+            active_pending_order_ticket[symbol_name] = ladder["pending"]; active_pending_order_is_buy_stop[symbol_name] = ladder["pending_buy_stop"]
+            cycle_L0_entry_price[symbol_name] = ladder["l0_price"]; LAST_L0_WAS_BUY[symbol_name] = ladder["l0_buy"]
+            user_initial_preference_is_buy[symbol_name] = ladder["preference"]
+            cycle_symbol_profile[symbol_name] = None if profile is None else SymbolProfile(**dict(profile, config=types.MappingProxyType(dict(profile["config"]))))
+            cycle_ladder_plan[symbol_name] = tuple(ladder["plan"]); cycle_max_fundable_level[symbol_name] = ladder["max_fundable"]
+            cycle_tracking_data[symbol_name] = None if tracking_info is None else dict(tracking_info, start_time_utc=datetime.datetime.fromisoformat(tracking_info["start_time_utc"]))
+        logger.info(f"REPLAY: Seeded {len(ladders)} open ladder(s) from the journal's state record: {list(ladders)}")
+
+def rotate_event_journal_if_new_day():
+    """
+    Called by the worker between passes. Closes yesterday's file and starts today's with the broker constants,
+    the config (with the symbol info its profiles compile from) and every active ladder's state. Holds global_state_lock so no transition slips between the two files.
+    """
+    global _event_journal_file
+    if _replay_session is not None or not EVENT_JOURNAL_ENABLED: return
+    if _event_journal_file is None or _event_journal_file_date == clock.today(): return
+    symbol_infos = {symbol_name: broker.raw.symbol_info(symbol_name) for symbol_name in list(SYMBOL_CONFIGS)}
+    with global_state_lock:
+        state_record = _cycle_state_record()
+        with event_journal_lock:
+            if _event_journal_file is None or _event_journal_file_date == clock.today(): return
+            _event_journal_file.close()
+            _event_journal_file = None
+            try:
+                _open_event_journal_file(state_record, symbol_infos)
+            except Exception as e:
+                logger.error(f"EVENT_JOURNAL: Error rotating journal: {e}")
+
+def _write_journal_record(record, call_signature=None):
+    if _replay_session is not None:
+        _replay_session.observe(record); return
+    if not EVENT_JOURNAL_ENABLED: return
+    record["t"] = clock.time()
+    try:
+        with event_journal_lock:
+            journal_file = _open_event_journal_file()
+            if call_signature is not None:
+                # Most per-pass reads (all positions, all orders, account) repeat the previous answer; replay re-serves it.
+                if _last_journaled_responses.get(call_signature) == record["r"]: del record["r"]
+                else: _last_journaled_responses[call_signature] = record["r"]
+            journal_file.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except Exception as e:
+        logger.error(f"EVENT_JOURNAL: Error writing record: {e}")
+
+def journal_flush():
+    with event_journal_lock:
+        if _event_journal_file is not None:
+            try: _event_journal_file.flush()
+            except Exception as e: logger.error(f"EVENT_JOURNAL: Error flushing journal: {e}")
+
+def close_event_journal():
+    global _event_journal_file
+    with event_journal_lock:
+        if _event_journal_file is not None:
+            _event_journal_file.close()
+            _event_journal_file = None
+
+def journal_event(event_name, symbol_name, **details):
+    _write_journal_record({"k": "ev", "e": event_name, "s": symbol_name, "d": _journal_encode(details)})
+
+def journal_command(command_name, symbol_name, **arguments):
+    _write_journal_record({"k": "cmd", "c": command_name, "s": symbol_name, "a": _journal_encode(arguments)})
+
+def journal_pass(symbols_to_manage):
+    _write_journal_record({"k": "pass", "syms": list(symbols_to_manage)})
+
+def journal_config(config_record):
+    global _last_config_journal_record
+    _last_config_journal_record = dict(config_record, k="cfg")
+    if _replay_session is not None or not EVENT_JOURNAL_ENABLED: return
+    with event_journal_lock:
+        journal_already_open = _event_journal_file is not None
+    if journal_already_open: _write_journal_record(dict(_last_config_journal_record))
+    else:
+        with event_journal_lock: _open_event_journal_file() # A fresh file writes the config right after its header
+
+def journaled_value(kind, producer):
+    """Returns producer(), recording it so a replay gets the same value (random rolls, IDs, clock-based decisions)."""
+    if _replay_session is not None:
+        return _replay_session.next_value(kind, producer)
+    value = producer()
+    _write_journal_record({"k": "val", "n": kind, "v": _journal_encode(value)})
+    return value
+
+def bot_sleep(seconds):
+    if _replay_session is None: clock.sleep(seconds)
+
+broker_calls_in_flight = {} # {thread ident: (function name, started_at)} while that thread is inside a terminal call
+
+class TrackedTerminal:
+    """The MetaTrader5 module with every function call registered in broker_calls_in_flight for its duration."""
+    def __init__(self, module):
+        self._module = module
+
+    def __dir__(self):
+        return dir(self._module)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._module, name)
+        if callable(attribute):
+            function = attribute
+            def tracked_call(*args, **kwargs):
+                thread_ident = threading.get_ident()
+                broker_calls_in_flight[thread_ident] = (name, clock.time())
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    broker_calls_in_flight.pop(thread_ident, None)
+            attribute = tracked_call
+        self.__dict__[name] = attribute
+        return attribute
+
+class RecordingBroker:
+    """
+    Proxy over the MetaTrader5 module used by all trading logic. Constants pass straight through;
+    every function call is journaled with its response. `raw` is the unjournaled (but still tracked) module; without one,
+    MetaTrader5 is imported on first use, so the engine imports (and offline tools run) without the terminal.
+    """
+    def __init__(self, module=None):
+        self._module = module
+        self._terminal = None
+
+    @property
+    def raw(self):
+        if self._terminal is None:
+            if self._module is None:
+                import MetaTrader5 # Windows-only terminal bridge
+                self._module = MetaTrader5
+            self._terminal = TrackedTerminal(self._module)
+        return self._terminal
+
+    def __getattr__(self, name):
+        attribute = getattr(self.raw, name)
+        if not callable(attribute):
+            self.__dict__[name] = attribute
+            return attribute
+        def journaled_call(*args, **kwargs):
+            response = attribute(*args, **kwargs)
+            if EVENT_JOURNAL_ENABLED:
+                encoded_args, encoded_kwargs = _journal_encode(args), _journal_encode(kwargs)
+                _write_journal_record(
+                    {"k": "call", "f": name, "a": encoded_args, "kw": encoded_kwargs, "r": _journal_encode(response)},
+                    call_signature=_broker_call_signature(name, encoded_args, encoded_kwargs)
+                )
+            return response
+        self.__dict__[name] = journaled_call
+        return journaled_call
+
+class ReplayBroker:
+    """Serves recorded responses in recorded order per call signature; constants come from the journal header."""
+    def __init__(self, replay_session, constants):
+        self.raw = self
+        self._replay_session = replay_session
+        self.__dict__.update(constants)
+
+    def __getattr__(self, name):
+        if name.isupper(): raise AttributeError(f"Broker constant {name} not recorded in journal header.")
+        def replayed_call(*args, **kwargs):
+            return self._replay_session.serve_call(name, args, kwargs)
+        self.__dict__[name] = replayed_call
+        return replayed_call
+
+class ReplaySession:
+    def __init__(self, records):
+        self.call_queues = collections.defaultdict(collections.deque)
+        self.value_queues = collections.defaultdict(collections.deque)
+        self.recorded_events = []
+        self.replayed_events = []
+        self.driver_records = []
+        self.initial_state = None
+        self.calls_served = 0
+        self.divergences = []
+        self.constants = {}
+        last_responses = {}
+        for record in records:
+            kind = record.get("k")
+            if kind == "hdr": self.constants.update(record["constants"]); last_responses.clear()
+            elif kind == "call":
+                signature = _broker_call_signature(record["f"], record["a"], record["kw"])
+                if "r" in record: last_responses[signature] = record["r"]
+                self.call_queues[signature].append(last_responses[signature])
+            elif kind == "val": self.value_queues[record["n"]].append(record["v"])
+            elif kind == "ev": self.recorded_events.append((record["e"], record["s"]))
+            elif kind in ("cfg", "pass", "cmd"): self.driver_records.append(record)
+            elif kind == "st" and self.initial_state is None: self.initial_state = record
+
+    def serve_call(self, function_name, args, kwargs):
+        signature = _broker_call_signature(function_name, _journal_encode(args), _journal_encode(kwargs))
+        queue = self.call_queues.get(signature)
+        if not queue:
+            self.divergences.append(f"No recorded response for {signature}")
+            return None
+        self.calls_served += 1
+        return _journal_decode(queue.popleft())
+
+    def next_value(self, kind, producer):
+        queue = self.value_queues.get(kind)
+        if not queue:
+            self.divergences.append(f"No recorded value for {kind}; using live value")
+            return producer()
+        return _journal_decode(queue.popleft())
+
+    def observe(self, record):
+        if record.get("k") == "ev": self.replayed_events.append((record["e"], record["s"]))
+
+    def check_all_calls_served(self):
+        """Recorded calls the replay never asked for were made outside any pass/cmd record and shift every later response."""
+        unserved = {signature: len(queue) for signature, queue in self.call_queues.items() if queue}
+        if unserved:
+            self.divergences.append(f"{sum(unserved.values())} recorded broker call(s) never requested by the replay: {dict(list(unserved.items())[:5])}")
+
+def _run_replay_driver(replay_session):
+    passes = 0
+    for record in replay_session.driver_records:
+        kind = record["k"]
+        if kind == "cfg":
+            apply_bot_config(validate_bot_config(record))
+        elif kind == "pass":
+            passes += 1
+            run_strategy_pass(record["syms"])
+        elif kind == "cmd":
+            symbol_name, arguments = record["s"], record["a"]
+            if record["c"] == "set_preference":
+                with global_state_lock: user_initial_preference_is_buy[symbol_name] = arguments["is_buy"]
+            elif record["c"] == "start_l0": start_L0_market_cycle(symbol_name, is_buy_L0=arguments["is_buy"])
+            elif record["c"] == "closeall": close_all_open_positions_and_pending_orders_for_symbol(symbol_name)
+            elif record["c"] == "session_restart": _auto_restart_cycle(symbol_name, arguments["last_l0_was_buy"], arguments["user_preference"])
+            elif record["c"] == "broker_time_offset": set_broker_time_offset(arguments["seconds"])
+            elif record["c"] == "resync": resync_cycle_state_with_broker()
+    return passes
+
+def read_event_journal(journal_path):
+    """Records of a .jsonl or .jsonl.gz journal. A file cut short by a crash yields everything before its last complete record."""
+    records = []
+    opener = gzip.open if journal_path.endswith(".gz") else open
+    with opener(journal_path, mode='rt') as file:
+        try:
+            for line in file:
+                if line.strip(): records.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError) as e:
+            logger.warning(f"EVENT_JOURNAL: {journal_path} ends in an incomplete record ({e}); replaying the {len(records)} records before it.")
+    return records
+
+def replay_event_journal(journal_path, profile_output_path=None):
+    """
+    Re-drives the management logic from a recorded journal. Prints the event comparison and, with
+    profile_output_path, writes cProfile stats of the replay. Returns True when the replay matched the recording.
+    """
+    global broker, _replay_session
+    replay_session = ReplaySession(read_event_journal(journal_path))
+    live_broker = broker
+    broker = ReplayBroker(replay_session, replay_session.constants)
+    _replay_session = replay_session
+    try:
+        initialize_all_symbol_states()
+        if replay_session.initial_state is not None: _restore_cycle_state(replay_session.initial_state)
+        started_at = time.perf_counter()
+        if profile_output_path:
+            import cProfile, pstats
+            profiler = cProfile.Profile()
+            passes = profiler.runcall(_run_replay_driver, replay_session)
+            profiler.dump_stats(profile_output_path)
+            pstats.Stats(profile_output_path).sort_stats("cumulative").print_stats(25)
+        else:
+            passes = _run_replay_driver(replay_session)
+        elapsed = time.perf_counter() - started_at
+        replay_session.check_all_calls_served()
+    finally:
+        broker = live_broker
+        _replay_session = None
+
+    first_mismatch = next((i for i, (a, b) in enumerate(zip(replay_session.recorded_events, replay_session.replayed_events)) if a != b), None)
+    matched = first_mismatch is None and len(replay_session.recorded_events) == len(replay_session.replayed_events)
+    print(f"Replayed {journal_path}: {passes} passes, {replay_session.calls_served} broker calls in {elapsed:.3f}s.")
+    print(f"Events recorded: {len(replay_session.recorded_events)}, replayed: {len(replay_session.replayed_events)}, match: {'YES' if matched else 'NO'}.")
+    if first_mismatch is not None:
+        print(f"First divergence at event #{first_mismatch}: recorded {replay_session.recorded_events[first_mismatch]}, replayed {replay_session.replayed_events[first_mismatch]}")
+    for divergence in replay_session.divergences[:20]:
+        print(f"  - {divergence}")
+    return matched and not replay_session.divergences
+
+broker = RecordingBroker()
+# --- End Event Journal and Replay ---
+
+
+# --- Sampling Profiler ---
+# While off there is no sampler thread at all, so the worker pays nothing. When switched on ('profile start'
+# or SIGUSR1 / SIGBREAK on Windows) a daemon thread reads the worker's stack through sys._current_frames()
+# and, when stopped, writes collapsed stacks (flamegraph.pl / speedscope input) and a per-function summary.
+profiler_lock = threading.Lock()
+profiler_stop_event = threading.Event()
+profiler_thread = None
+last_profile_output_paths = None # (collapsed_stacks_path, summary_path) of the last finished run
+
+def _find_thread_ident(thread_name):
+    for running_thread in threading.enumerate():
+        if running_thread.name == thread_name: return running_thread.ident
+    return None
+
+def _sample_thread_stack(thread_ident):
+    frame = sys._current_frames().get(thread_ident)
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse() # Root first, as collapsed-stack tools expect
+    return tuple(stack)
+
+def write_profile_report(stack_counts, started_at, stopped_at):
+    os.makedirs(PROFILER_OUTPUT_FOLDER, exist_ok=True)
+    file_stamp = datetime.datetime.fromtimestamp(started_at).strftime("%Y%m%d_%H%M%S")
+    collapsed_path = os.path.join(PROFILER_OUTPUT_FOLDER, f"worker_{file_stamp}.folded")
+    summary_path = os.path.join(PROFILER_OUTPUT_FOLDER, f"worker_{file_stamp}_summary.txt")
+    with open(collapsed_path, "w", encoding="utf-8") as collapsed_file:
+        for stack, count in stack_counts.most_common():
+            collapsed_file.write(f"{';'.join(stack)} {count}\n")
+
+    total_samples = sum(stack_counts.values())
+    self_counts = collections.Counter(); inclusive_counts = collections.Counter()
+    for stack, count in stack_counts.items():
+        self_counts[stack[-1]] += count
+        for function_label in set(stack): inclusive_counts[function_label] += count # Recursion counted once
+    duration = max(stopped_at - started_at, 1e-9)
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        summary_file.write(f"Thread: {PROFILER_TARGET_THREAD_NAME}  Samples: {total_samples}  Duration: {duration:.1f}s  "
+                           f"Rate: {total_samples / duration:.0f}/s  Interval: {PROFILER_SAMPLE_INTERVAL_SECONDS * 1000:.1f}ms\n\n")
+        summary_file.write(f"{'Self %':>7} {'Self':>7} {'Total %':>8} {'Total':>7}  Function\n")
+        for function_label, inclusive_count in inclusive_counts.most_common(PROFILER_SUMMARY_TOP_N):
+            self_count = self_counts[function_label]
+            summary_file.write(f"{100.0 * self_count / max(total_samples, 1):>6.1f}% {self_count:>7} "
+                               f"{100.0 * inclusive_count / max(total_samples, 1):>7.1f}% {inclusive_count:>7}  {function_label}\n")
+    return collapsed_path, summary_path
+
+def _sampling_profiler_worker(target_thread_ident):
+    global last_profile_output_paths
+    stack_counts = collections.Counter()
+    started_at = time.time()
+    while not profiler_stop_event.wait(PROFILER_SAMPLE_INTERVAL_SECONDS):
+        if shutdown_event.is_set(): break
+        if time.time() - started_at >= PROFILER_MAX_DURATION_SECONDS:
+            logger.warning(f"PROFILER: Reached {PROFILER_MAX_DURATION_SECONDS}s limit, stopping."); break
+        stack = _sample_thread_stack(target_thread_ident)
+        if not stack:
+            logger.warning(f"PROFILER: {PROFILER_TARGET_THREAD_NAME} is gone, stopping."); break
+        stack_counts[stack] += 1
+    try:
+        last_profile_output_paths = write_profile_report(stack_counts, started_at, time.time())
+        logger.info(f"PROFILER: {sum(stack_counts.values())} samples written to {last_profile_output_paths[0]} and {last_profile_output_paths[1]}")
+    except OSError as e:
+        logger.error(f"PROFILER: Could not write profile output: {e}")
+
+def is_sampling_profiler_running():
+    return profiler_thread is not None and profiler_thread.is_alive()
+
+def start_sampling_profiler():
+    global profiler_thread
+    with profiler_lock:
+        if is_sampling_profiler_running(): return False
+        target_thread_ident = _find_thread_ident(PROFILER_TARGET_THREAD_NAME)
+        if target_thread_ident is None:
+            logger.error(f"PROFILER: No running thread named {PROFILER_TARGET_THREAD_NAME}."); return False
+        profiler_stop_event.clear()
+        profiler_thread = threading.Thread(target=_sampling_profiler_worker, args=(target_thread_ident,), name="SamplingProfilerThread")
+        profiler_thread.daemon = True
+        profiler_thread.start()
+    logger.info(f"PROFILER: Sampling {PROFILER_TARGET_THREAD_NAME} every {PROFILER_SAMPLE_INTERVAL_SECONDS * 1000:.1f}ms.")
+    return True
+
+def stop_sampling_profiler(wait_for_report=True):
+    with profiler_lock:
+        if not is_sampling_profiler_running(): return False
+        profiler_stop_event.set()
+        stopping_thread = profiler_thread
+    if wait_for_report: stopping_thread.join(timeout=10.0)
+    return True
+
+def toggle_sampling_profiler():
+    if not stop_sampling_profiler(): start_sampling_profiler()
+
+def install_profiler_signal_handler():
+    profiler_signal = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+    if profiler_signal is None: return None
+    # Handlers run on the main thread between bytecodes; hand the toggle to a short-lived thread so it
+    # can never block on profiler_lock held by the interrupted REPL command.
+    signal.signal(profiler_signal, lambda signum, frame: threading.Thread(target=toggle_sampling_profiler, daemon=True).start())
+    return profiler_signal.name
+# --- End Sampling Profiler ---
+
+
+# --- Status Snapshot Functions ---
+def publish_status_snapshot(pass_number=0):
+    global _published_status_snapshot
+    now_utc = clock.utcnow()
+    symbols_status = {}
+    with global_state_lock:
+        for symbol_name in is_cycle_active.keys():
+            tracking_info = cycle_tracking_data.get(symbol_name)
+            cycle_age_seconds = (now_utc - tracking_info["start_time_utc"]).total_seconds() if tracking_info else 0.0
+            symbols_status[symbol_name] = SymbolStatus(
+                symbol=symbol_name,
+                is_active=is_cycle_active.get(symbol_name, False),
+                level=current_level.get(symbol_name, 0),
+                open_tickets=tuple(cycle_open_position_tickets.get(symbol_name, [])),
+                pending_ticket=active_pending_order_ticket.get(symbol_name, 0),
+                l0_entry_price=cycle_L0_entry_price.get(symbol_name, 0.0),
+                cycle_age_seconds=cycle_age_seconds,
+                floating_pnl=cycle_floating_pnl.get(symbol_name, 0.0),
+                margin_headroom=cycle_margin_headroom.get(symbol_name),
+                max_fundable_level=cycle_max_fundable_level.get(symbol_name, -1)
+            )
+    # Single reference assignment: readers see either the previous or the new snapshot, never a partial one.
+    _published_status_snapshot = StatusSnapshot(now_utc, pass_number, types.MappingProxyType(symbols_status))
+
+def get_status_snapshot():
+    """
+    Returns the last published StatusSnapshot without taking any lock.
+    The snapshot is immutable; its values may lag the live state by at most one worker pass.
+    """
+    return _published_status_snapshot
+
+def format_symbol_status(symbol_status):
+    if not symbol_status.is_active:
+        return f"{symbol_status.symbol}: INACTIVE"
+    return (f"{symbol_status.symbol}: ACTIVE L{symbol_status.level}, Tickets: {list(symbol_status.open_tickets)}, "
+            f"Pending: {symbol_status.pending_ticket}, L0 Price: {symbol_status.l0_entry_price}, "
+            f"Cycle Age: {int(symbol_status.cycle_age_seconds)}s, Floating P&L: {symbol_status.floating_pnl:.2f}, "
+            f"Margin Headroom: {'n/a' if symbol_status.margin_headroom is None else f'{symbol_status.margin_headroom:.2f}'} "
+            f"(fundable to L{symbol_status.max_fundable_level})")
+# --- End Status Snapshot Functions ---
+
+
+# --- Session Calendar ---
+# Sessions are compiled once per config load. Whether a calendar is open is cached together with the
+# timestamp of its next open/close transition, so a trading-hours check is a single comparison until then.
+WEEKDAY_NAMES = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+SessionWindow = collections.namedtuple("SessionWindow", ["days", "open_minute", "close_minute"])
+SymbolCalendar = collections.namedtuple("SymbolCalendar", ["name", "timezone_name", "always_open", "sessions", "closed_days", "holidays"])
+SessionState = collections.namedtuple("SessionState", ["is_open", "next_transition_ts"])
+
+broker_time_offset_seconds = 0 # Broker server time minus UTC, refreshed from tick timestamps
+symbol_calendars = {} # {symbol: SymbolCalendar}, replaced as a whole on config load
+general_calendar = None # Calendar for the general TRADING_START_HOUR-TRADING_END_HOUR window
+_session_state_cache = {} # {calendar name: SessionState}
+parked_auto_restart_symbols = {} # {symbol: wake-up timestamp} for auto-restarts waiting for their session to open (or for a market block to clear)
+_next_scheduler_wakeup_ts = float("inf")
+_next_broker_offset_refresh_ts = 0.0
+
+def _parse_weekdays(day_specs, context):
+    days = set()
+    for day_spec in day_specs:
+        if isinstance(day_spec, int) and not isinstance(day_spec, bool) and 0 <= day_spec <= 6:
+            days.add(day_spec)
+        elif isinstance(day_spec, str) and day_spec[:3].lower() in WEEKDAY_NAMES:
+            days.add(WEEKDAY_NAMES[day_spec[:3].lower()])
+        else:
+            raise ValueError(f"{context}: invalid weekday {day_spec!r} (use 0-6 or Mon..Sun).")
+    return frozenset(days)
+
+def _parse_session_minute(time_str, context):
+    try:
+        hour_str, minute_str = time_str.split(":")
+        minute_of_day = int(hour_str) * 60 + int(minute_str)
+    except (AttributeError, ValueError):
+        raise ValueError(f"{context}: invalid time {time_str!r} (use HH:MM).")
+    if not 0 <= minute_of_day <= 24 * 60:
+        raise ValueError(f"{context}: time {time_str!r} out of range.")
+    return minute_of_day
+
+def _parse_holidays(holiday_specs, context):
+    try:
+        return frozenset(datetime.date.fromisoformat(h) for h in holiday_specs)
+    except (TypeError, ValueError):
+        raise ValueError(f"{context}: holidays must be a list of YYYY-MM-DD dates.")
+
+def _validate_timezone_name(timezone_name, context):
+    if timezone_name in ("LOCAL", "BROKER"): return
+    try:
+        zoneinfo.ZoneInfo(timezone_name)
+    except Exception:
+        raise ValueError(f"{context}: unknown timezone {timezone_name!r}.")
+
+def compile_calendar_settings(raw_settings):
+    settings = dict(DEFAULT_CALENDAR_SETTINGS)
+    settings.update(raw_settings or {})
+    _validate_timezone_name(settings["timezone"], "calendar")
+    return {
+        "timezone": settings["timezone"],
+        "weekend_days": _parse_weekdays(settings["weekend_days"], "calendar.weekend_days"),
+        "holidays": _parse_holidays(settings["holidays"], "calendar.holidays")
+    }
+
+def compile_symbol_calendar(name, symbol_config, calendar_settings, start_hour, end_hour):
+    """
+    Builds the SymbolCalendar for a symbol config (or the general window when symbol_config is None).
+    Without explicit SESSIONS the symbol trades start_hour-end_hour every non-weekend day; TRADE_24_7 never closes.
+    """
+    symbol_config = symbol_config or {}
+    always_open = bool(symbol_config.get("TRADE_24_7", False))
+    timezone_name = symbol_config.get("TIMEZONE", calendar_settings["timezone"])
+    _validate_timezone_name(timezone_name, name)
+    raw_sessions = symbol_config.get("SESSIONS")
+    if raw_sessions is None:
+        sessions = (SessionWindow(frozenset(range(7)), start_hour * 60, end_hour * 60),)
+    else:
+        if not isinstance(raw_sessions, list) or not raw_sessions:
+            raise ValueError(f"{name}: SESSIONS must be a non-empty list.")
+        sessions = []
+        for index, raw_session in enumerate(raw_sessions):
+            context = f"{name}.SESSIONS[{index}]"
+            if not isinstance(raw_session, dict):
+                raise ValueError(f"{context}: session must be a table with days/open/close.")
+            open_minute = _parse_session_minute(raw_session.get("open"), context)
+            close_minute = _parse_session_minute(raw_session.get("close"), context)
+            if open_minute == close_minute:
+                raise ValueError(f"{context}: open and close must differ.")
+            sessions.append(SessionWindow(_parse_weekdays(raw_session.get("days", list(range(7))), context), open_minute, close_minute))
+        sessions = tuple(sessions)
+    holidays = calendar_settings["holidays"] | _parse_holidays(symbol_config.get("HOLIDAYS", []), name)
+    return SymbolCalendar(
+        name=name,
+        timezone_name=timezone_name,
+        always_open=always_open,
+        sessions=sessions,
+        closed_days=frozenset() if always_open else calendar_settings["weekend_days"],
+        holidays=frozenset() if always_open else holidays
+    )
+
+def _resolve_session_tzinfo(timezone_name):
+    if timezone_name == "LOCAL": return None # naive datetimes are interpreted in the machine's local time
+    if timezone_name == "BROKER": return datetime.timezone(datetime.timedelta(seconds=broker_time_offset_seconds))
+    return zoneinfo.ZoneInfo(timezone_name)
+
+def _session_minute_to_ts(session_date, minute_of_day, tzinfo):
+    session_dt = datetime.datetime.combine(session_date, datetime.time()) + datetime.timedelta(minutes=minute_of_day)
+    if tzinfo is not None: session_dt = session_dt.replace(tzinfo=tzinfo)
+    return session_dt.timestamp()
+
+def compute_session_state(calendar, now_ts):
+    """Returns SessionState(is_open, next_transition_ts) for the calendar at now_ts."""
+    if calendar.always_open:
+        return SessionState(True, now_ts + 86400) # Re-evaluated daily in case the config changes
+    tzinfo = _resolve_session_tzinfo(calendar.timezone_name)
+    local_today = datetime.datetime.fromtimestamp(now_ts, tzinfo).date()
+    intervals = []
+    for day_offset in range(-1, SESSION_LOOKAHEAD_DAYS + 1):
+        session_date = local_today + datetime.timedelta(days=day_offset)
+        if session_date.weekday() in calendar.closed_days or session_date in calendar.holidays: continue
+        for window in calendar.sessions:
+            if session_date.weekday() not in window.days: continue
+            open_ts = _session_minute_to_ts(session_date, window.open_minute, tzinfo)
+            close_minute = window.close_minute if window.close_minute > window.open_minute else window.close_minute + 24 * 60 # Overnight session
+            intervals.append((open_ts, _session_minute_to_ts(session_date, close_minute, tzinfo)))
+
+    merged_intervals = []
+    for open_ts, close_ts in sorted(intervals):
+        if merged_intervals and open_ts <= merged_intervals[-1][1]:
+            merged_intervals[-1][1] = max(merged_intervals[-1][1], close_ts)
+        else:
+            merged_intervals.append([open_ts, close_ts])
+    for open_ts, close_ts in merged_intervals:
+        if open_ts <= now_ts < close_ts: return SessionState(True, close_ts)
+        if open_ts > now_ts: return SessionState(False, open_ts)
+    return SessionState(False, now_ts + 86400) # No session in the lookahead window (long holiday); check again tomorrow
+
+def _get_session_state(calendar):
+    now_ts = clock.time()
+    session_state = _session_state_cache.get(calendar.name)
+    if session_state is None or now_ts >= session_state.next_transition_ts:
+        session_state = compute_session_state(calendar, now_ts)
+        _session_state_cache[calendar.name] = session_state
+    return session_state
+
+def get_symbol_calendar(symbol_name):
+    symbol_name = ladder_symbol(symbol_name) # All ladders of a symbol share its calendar
+    calendar = symbol_calendars.get(symbol_name)
+    if calendar is None:
+        calendar = compile_symbol_calendar(symbol_name, SYMBOL_CONFIGS.get(symbol_name), compile_calendar_settings(CALENDAR_SETTINGS), TRADING_START_HOUR, TRADING_END_HOUR)
+        symbol_calendars[symbol_name] = calendar
+    return calendar
+
+def get_symbol_session_state(symbol_name):
+    return _get_session_state(get_symbol_calendar(symbol_name))
+
+def is_general_trading_hours():
+    global general_calendar
+    if general_calendar is None:
+        general_calendar = compile_symbol_calendar("__GENERAL__", None, compile_calendar_settings(CALENDAR_SETTINGS), TRADING_START_HOUR, TRADING_END_HOUR)
+    return _get_session_state(general_calendar).is_open
+
+def is_trading_hours_for_symbol(symbol_name):
+    return journaled_value(f"hours:{symbol_name}", lambda: get_symbol_session_state(symbol_name).is_open)
+
+def describe_symbol_session(symbol_name):
+    if get_symbol_calendar(symbol_name).always_open: return "OPEN (24/7)"
+    session_state = get_symbol_session_state(symbol_name)
+    transition_str = datetime.datetime.fromtimestamp(session_state.next_transition_ts).strftime('%a %Y-%m-%d %H:%M')
+    return f"{'OPEN' if session_state.is_open else 'CLOSED'} ({'closes' if session_state.is_open else 'opens'} {transition_str} local)"
+
+def refresh_broker_time_offset():
+    """
+    Derives the broker server UTC offset from the newest tick timestamp; stale ticks (e.g. weekends) are ignored.
+    The probe reads broker.raw: it runs outside any pass, so journaling it would misalign the replayed call queues.
+    A changed offset is journaled as a command instead.
+    """
+    for symbol_name in list(SYMBOL_CONFIGS.keys()):
+        tick = broker.raw.symbol_info_tick(symbol_name)
+        if not tick: continue
+        raw_offset_seconds = tick.time - clock.time()
+        rounded_offset_seconds = int(round(raw_offset_seconds / 900.0)) * 900
+        if abs(raw_offset_seconds - rounded_offset_seconds) > 60: continue
+        if rounded_offset_seconds != broker_time_offset_seconds:
+            journal_command("broker_time_offset", None, seconds=rounded_offset_seconds)
+            set_broker_time_offset(rounded_offset_seconds)
+        return True
+    return False
+
+def set_broker_time_offset(offset_seconds):
+    global broker_time_offset_seconds
+    logger.info(f"SESSION_CALENDAR: Broker server time offset is UTC{offset_seconds / 3600:+.2f}h.")
+    broker_time_offset_seconds = offset_seconds
+    _session_state_cache.clear()
+
+def reset_session_schedule():
+    global general_calendar
+    general_calendar = None
+    _session_state_cache.clear()
+    with global_state_lock:
+        for symbol_name in list(parked_auto_restart_symbols.keys()):
+            parked_auto_restart_symbols[symbol_name] = 0.0 # Re-evaluate against the new calendars on the next scheduler run
+    _reschedule_session_wakeup()
+
+def _reschedule_session_wakeup():
+    global _next_scheduler_wakeup_ts
+    with global_state_lock:
+        _next_scheduler_wakeup_ts = min(parked_auto_restart_symbols.values(), default=float("inf"))
+
+def park_symbol_until_session_open(symbol_name):
+    session_state = get_symbol_session_state(symbol_name)
+    wake_ts = clock.time() if session_state.is_open else session_state.next_transition_ts
+    with global_state_lock:
+        parked_auto_restart_symbols[symbol_name] = wake_ts
+    _reschedule_session_wakeup()
+    logger.info(f"SESSION_SCHEDULER ({symbol_name}): Auto-restart parked until session open at {datetime.datetime.fromtimestamp(wake_ts).strftime('%a %Y-%m-%d %H:%M')} local.")
+
+def park_symbol_for_retry(symbol_name, delay_seconds, reason):
+    wake_ts = clock.time() + delay_seconds
+    with global_state_lock:
+        parked_auto_restart_symbols[symbol_name] = wake_ts
+    _reschedule_session_wakeup()
+    logger.info(f"SESSION_SCHEDULER ({symbol_name}): Auto-restart parked, retrying in {delay_seconds:g}s. {reason}")
+
+def unpark_symbol(symbol_name):
+    with global_state_lock:
+        was_parked = parked_auto_restart_symbols.pop(symbol_name, None) is not None
+    if was_parked: _reschedule_session_wakeup()
+
+def run_session_scheduler():
+    """
+    Called by the worker on every loop iteration. Costs a single comparison until the earliest parked
+    symbol's session opens (or the broker offset is due for a refresh), then fires the waiting auto-restarts.
+    """
+    global _next_broker_offset_refresh_ts
+    now_ts = clock.time()
+    if now_ts >= _next_broker_offset_refresh_ts:
+        _next_broker_offset_refresh_ts = now_ts + BROKER_TIME_OFFSET_REFRESH_SECONDS
+        refresh_broker_time_offset()
+    if now_ts < _next_scheduler_wakeup_ts:
+        return
+
+    with global_state_lock:
+        due_symbols = [s for s, wake_ts in parked_auto_restart_symbols.items() if wake_ts <= now_ts]
+    for symbol_name in due_symbols:
+        if shutdown_event.is_set(): break
+        session_state = get_symbol_session_state(symbol_name)
+        if not session_state.is_open:
+            with global_state_lock:
+                parked_auto_restart_symbols[symbol_name] = session_state.next_transition_ts
+            continue
+        unpark_symbol(symbol_name)
+        with global_state_lock:
+            cycle_already_active = is_cycle_active.get(symbol_name, False)
+            last_l0_was_buy = LAST_L0_WAS_BUY.get(symbol_name)
+            user_preference = user_initial_preference_is_buy.get(symbol_name)
+        if cycle_already_active or ladder_symbol(symbol_name) not in SYMBOL_CONFIGS:
+            logger.info(f"SESSION_SCHEDULER ({symbol_name}): Session open but cycle already active or symbol no longer configured. Dropping parked auto-restart.")
+            continue
+        logger.info(f"SESSION_SCHEDULER ({symbol_name}): Session open. Firing parked auto-restart.")
+        journal_command("session_restart", symbol_name, last_l0_was_buy=last_l0_was_buy, user_preference=user_preference)
+        _auto_restart_cycle(symbol_name, last_l0_was_buy, user_preference)
+    _reschedule_session_wakeup()
+# --- End Session Calendar ---
+
+
+# --- Ladders ---
+def symbol_ladder_keys(symbol_name, symbol_config=None):
+    symbol_config = symbol_config if symbol_config is not None else SYMBOL_CONFIGS.get(symbol_name, {})
+    return [ladder_key(symbol_name, index) for index in range(symbol_config.get("MAX_LADDERS", 1))]
+
+def next_free_ladder_key(symbol_name):
+    with global_state_lock:
+        for candidate_key in symbol_ladder_keys(symbol_name):
+            if not is_cycle_active.get(candidate_key, False) and candidate_key not in parked_auto_restart_symbols:
+                return candidate_key
+    return None
+# --- End Ladders ---
+
+def _initialize_symbol_state(symbol_name):
+    # Caller must hold global_state_lock.
+    is_cycle_active[symbol_name] = False; current_level[symbol_name] = 0
+    active_position_ticket[symbol_name] = 0; active_position_entry_price[symbol_name] = 0.0
+    active_position_lot_size[symbol_name] = 0.0; active_position_is_buy[symbol_name] = None
+    active_pending_order_ticket[symbol_name] = 0; active_pending_order_is_buy_stop[symbol_name] = None
+    cycle_open_position_tickets[symbol_name] = []
+    cycle_L0_entry_price[symbol_name] = 0.0
+    cycle_floating_pnl[symbol_name] = 0.0
+    cycle_symbol_profile[symbol_name] = None
+    cycle_ladder_plan[symbol_name] = (); cycle_max_fundable_level[symbol_name] = -1; cycle_margin_headroom[symbol_name] = None
+    LAST_L0_WAS_BUY[symbol_name] = None
+    user_initial_preference_is_buy[symbol_name] = None
+    cycle_tracking_data[symbol_name] = None
+
+def initialize_all_symbol_states():
+    with global_state_lock:
+        for symbol_name, symbol_config in SYMBOL_CONFIGS.items():
+            for symbol_ladder_key in symbol_ladder_keys(symbol_name, symbol_config):
+                _initialize_symbol_state(symbol_ladder_key)
+        logger.debug("STATES: Initialized states for all configured symbols (with lock).")
+
+# --- Config File Loading ---
+REQUIRED_SYMBOL_CONFIG_KEYS = {
+    "INITIAL_LOT_SIZE": (int, float), "LOT_MULTIPLIER": (int, float), "NOMINAL_TP_PIPS": (int, float),
+    "NOMINAL_SL_PIPS": (int, float), "TRIGGER_DISTANCE_PIPS": (int, float), "MAX_TRADES_IN_CYCLE": (int,),
+    "MAGIC_NUMBER": (int,), "PIP_MULTIPLIER": (int, float)
+}
+# Optional, all in pips or ratios and > 0. Any of them makes the symbol's L0 starts consult the market statistics.
+MARKET_STATS_CONFIG_KEYS = ("ATR_REFERENCE_PIPS", "ATR_SCALE_MIN", "ATR_SCALE_MAX", "MAX_SPREAD_PIPS", "MAX_SPREAD_RATIO", "MAX_ATR_PIPS")
+
+def _read_config_file(config_path):
+    if config_path.lower().endswith(".toml"):
+        if tomllib is None:
+            raise ValueError(f"TOML config '{config_path}' requires Python 3.11+ (tomllib).")
+        with open(config_path, mode='rb') as file:
+            return tomllib.load(file)
+    with open(config_path, mode='r') as file:
+        return json.load(file)
+
+BotConfig = collections.namedtuple("BotConfig", ["symbol_configs", "symbol_aliases", "start_hour", "end_hour", "calendar_settings", "symbol_calendars"])
+
+def validate_bot_config(raw_config):
+    """
+    Validates a parsed config file and returns a BotConfig, including the compiled session calendars.
+    Raises ValueError describing every problem found, so a bad file never partially applies.
+    """
+    errors = []
+    raw_symbols = raw_config.get("symbols")
+    if not isinstance(raw_symbols, dict) or not raw_symbols:
+        raise ValueError("Config must contain a non-empty 'symbols' table.")
+
+    symbol_configs = {}
+    seen_magic_numbers = {}
+    for symbol_name, raw_symbol_config in raw_symbols.items():
+        if not isinstance(raw_symbol_config, dict):
+            errors.append(f"{symbol_name}: config must be a table."); continue
+        type_errors = []
+        for key, allowed_types in REQUIRED_SYMBOL_CONFIG_KEYS.items():
+            value = raw_symbol_config.get(key)
+            if isinstance(value, bool) or not isinstance(value, allowed_types):
+                type_errors.append(f"{symbol_name}: '{key}' missing or not {'an integer' if allowed_types == (int,) else 'a number'} (got {value!r}).")
+        if type_errors:
+            errors.extend(type_errors); continue
+        if raw_symbol_config["INITIAL_LOT_SIZE"] <= 0: errors.append(f"{symbol_name}: INITIAL_LOT_SIZE must be > 0.")
+        if raw_symbol_config["LOT_MULTIPLIER"] <= 0: errors.append(f"{symbol_name}: LOT_MULTIPLIER must be > 0.")
+        if raw_symbol_config["NOMINAL_TP_PIPS"] < 0 or raw_symbol_config["NOMINAL_SL_PIPS"] < 0: errors.append(f"{symbol_name}: TP/SL pips must be >= 0.")
+        if raw_symbol_config["TRIGGER_DISTANCE_PIPS"] <= 0: errors.append(f"{symbol_name}: TRIGGER_DISTANCE_PIPS must be > 0.")
+        if raw_symbol_config["MAX_TRADES_IN_CYCLE"] < 1: errors.append(f"{symbol_name}: MAX_TRADES_IN_CYCLE must be >= 1.")
+        if raw_symbol_config["PIP_MULTIPLIER"] <= 0: errors.append(f"{symbol_name}: PIP_MULTIPLIER must be > 0.")
+        if not isinstance(raw_symbol_config.get("TRADE_24_7", False), bool): errors.append(f"{symbol_name}: TRADE_24_7 must be true/false.")
+        max_ladders = raw_symbol_config.get("MAX_LADDERS", 1)
+        if isinstance(max_ladders, bool) or not isinstance(max_ladders, int) or not 1 <= max_ladders <= MAX_LADDERS_LIMIT:
+            errors.append(f"{symbol_name}: MAX_LADDERS must be an integer 1-{MAX_LADDERS_LIMIT} (got {max_ladders!r}).")
+        for key in MARKET_STATS_CONFIG_KEYS:
+            value = raw_symbol_config.get(key)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                errors.append(f"{symbol_name}: {key} must be a number > 0 (got {value!r}).")
+        if raw_symbol_config.get("ATR_SCALE_MIN", ATR_SCALE_MIN_DEFAULT) > raw_symbol_config.get("ATR_SCALE_MAX", ATR_SCALE_MAX_DEFAULT):
+            errors.append(f"{symbol_name}: ATR_SCALE_MIN must not exceed ATR_SCALE_MAX.")
+        if LADDER_KEY_SEPARATOR in symbol_name: errors.append(f"{symbol_name}: symbol names cannot contain '{LADDER_KEY_SEPARATOR}'.")
+        magic_number = raw_symbol_config["MAGIC_NUMBER"]
+        if not 0 < magic_number < LADDER_MAGIC_STRIDE: errors.append(f"{symbol_name}: MAGIC_NUMBER must be between 1 and {LADDER_MAGIC_STRIDE - 1} (ladders add multiples of {LADDER_MAGIC_STRIDE}).")
+        if magic_number in seen_magic_numbers:
+            errors.append(f"{symbol_name}: MAGIC_NUMBER {magic_number} already used by {seen_magic_numbers[magic_number]}.")
+        seen_magic_numbers[magic_number] = symbol_name
+        symbol_config = dict(raw_symbol_config)
+        symbol_config.setdefault("TRADE_24_7", False)
+        symbol_config.setdefault("MAX_LADDERS", 1)
+        symbol_configs[symbol_name] = symbol_config
+
+    raw_aliases = raw_config.get("aliases", {})
+    symbol_aliases = {}
+    if not isinstance(raw_aliases, dict):
+        errors.append("'aliases' must be a table.")
+    else:
+        for alias, target_symbol in raw_aliases.items():
+            if target_symbol not in raw_symbols:
+                errors.append(f"Alias '{alias}' maps to unknown symbol '{target_symbol}'.")
+            symbol_aliases[alias.lower()] = target_symbol
+
+    trading_hours = raw_config.get("trading_hours", {})
+    start_hour = trading_hours.get("start_hour", TRADING_START_HOUR)
+    end_hour = trading_hours.get("end_hour", TRADING_END_HOUR)
+    if not (isinstance(start_hour, int) and isinstance(end_hour, int) and 0 <= start_hour < end_hour <= 24):
+        errors.append(f"trading_hours must satisfy 0 <= start_hour < end_hour <= 24 (got {start_hour}-{end_hour}).")
+
+    raw_calendar_settings = raw_config.get("calendar", {})
+    calendar_settings = None
+    compiled_calendars = {}
+    try:
+        calendar_settings = compile_calendar_settings(raw_calendar_settings)
+    except (ValueError, KeyError, TypeError) as e:
+        errors.append(str(e))
+    if calendar_settings is not None and not errors:
+        for symbol_name, symbol_config in symbol_configs.items():
+            try:
+                compiled_calendars[symbol_name] = compile_symbol_calendar(symbol_name, symbol_config, calendar_settings, start_hour, end_hour)
+            except ValueError as e:
+                errors.append(str(e))
+
+    if errors:
+        raise ValueError("; ".join(errors))
+    return BotConfig(symbol_configs, symbol_aliases, start_hour, end_hour, dict(DEFAULT_CALENDAR_SETTINGS, **raw_calendar_settings), compiled_calendars)
+
+def compile_symbol_profile(symbol_name, symbol_config):
+    info = get_symbol_details(symbol_name)
+    if not info:
+        logger.warning(f"CONFIG_PROFILE ({symbol_name}): No symbol info, profile will be compiled on first use.")
+        return None
+    return build_symbol_profile(symbol_name, types.MappingProxyType(dict(symbol_config)), info.point, info.digits)
+
+def get_symbol_profile(symbol_name):
+    """
+    Profile for the currently loaded config (used for new cycles). Compiles lazily if the load could not.
+    For ladder keys beyond the first, the profile carries that ladder's MAGIC_NUMBER.
+    """
+    profile = symbol_profiles.get(symbol_name)
+    if profile is None:
+        base_symbol, index = ladder_symbol(symbol_name), ladder_index(symbol_name)
+        symbol_config = SYMBOL_CONFIGS.get(base_symbol)
+        if symbol_config is None or index >= symbol_config.get("MAX_LADDERS", 1): return None
+        if index == 0:
+            profile = compile_symbol_profile(symbol_name, symbol_config)
+        else:
+            base_profile = get_symbol_profile(base_symbol)
+            if base_profile is None: return None
+            ladder_config = dict(base_profile.config, MAGIC_NUMBER=ladder_magic_number(symbol_config["MAGIC_NUMBER"], index))
+            profile = base_profile._replace(config=types.MappingProxyType(ladder_config))
+        if profile is not None:
+            symbol_profiles[symbol_name] = profile
+    return profile
+
+def get_cycle_profile(symbol_name):
+    """Profile pinned to the running cycle, so a reload mid-cycle never changes its ladder."""
+    with global_state_lock:
+        pinned_profile = cycle_symbol_profile.get(symbol_name)
+    return pinned_profile if pinned_profile is not None else get_symbol_profile(symbol_name)
+
+def get_cycle_config(symbol_name):
+    """
+    Config of the running cycle. Falls back to the raw symbol config (with this ladder's MAGIC_NUMBER) when no profile
+    can be compiled, because closing and reconciling never need symbol_info. None only for an unknown symbol.
+    """
+    profile = get_cycle_profile(symbol_name)
+    if profile is not None: return profile.config
+    symbol_config = SYMBOL_CONFIGS.get(ladder_symbol(symbol_name))
+    if symbol_config is None: return None
+    return types.MappingProxyType(dict(symbol_config, MAGIC_NUMBER=ladder_magic_number(symbol_config["MAGIC_NUMBER"], ladder_index(symbol_name))))
+
+def apply_bot_config(bot_config):
+    global SYMBOL_CONFIGS, SYMBOL_ALIASES, TRADING_START_HOUR, TRADING_END_HOUR, CALENDAR_SETTINGS, symbol_profiles, symbol_calendars
+    symbol_configs, symbol_aliases, start_hour, end_hour = bot_config.symbol_configs, bot_config.symbol_aliases, bot_config.start_hour, bot_config.end_hour
+    new_profiles = {}
+    for symbol_name, symbol_config in symbol_configs.items():
+        profile = compile_symbol_profile(symbol_name, symbol_config)
+        if profile is not None:
+            new_profiles[symbol_name] = profile
+
+    journal_config({
+        "symbols": symbol_configs, "aliases": symbol_aliases, "calendar": bot_config.calendar_settings,
+        "trading_hours": {"start_hour": start_hour, "end_hour": end_hour}
+    })
+    with global_state_lock:
+        SYMBOL_CONFIGS = symbol_configs
+        SYMBOL_ALIASES = symbol_aliases
+        TRADING_START_HOUR = start_hour
+        TRADING_END_HOUR = end_hour
+        CALENDAR_SETTINGS = bot_config.calendar_settings
+        symbol_profiles = new_profiles
+        symbol_calendars = bot_config.symbol_calendars
+        for symbol_name, symbol_config in symbol_configs.items():
+            for symbol_ladder_key in symbol_ladder_keys(symbol_name, symbol_config):
+                if symbol_ladder_key not in is_cycle_active:
+                    _initialize_symbol_state(symbol_ladder_key)
+        removed_active_symbols = [s for s, active in is_cycle_active.items() if active and s not in symbol_ladder_keys(ladder_symbol(s), symbol_configs.get(ladder_symbol(s), {"MAX_LADDERS": 0}))]
+    reset_session_schedule()
+    if removed_active_symbols:
+        logger.warning(f"CONFIG_APPLY: Symbols removed from config still have active cycles and will be managed to completion: {removed_active_symbols}")
+    logger.info(f"CONFIG_APPLY: Loaded {len(symbol_configs)} symbols ({len(new_profiles)} profiles compiled), {len(symbol_aliases)} aliases, trading hours {start_hour:02d}:00-{end_hour:02d}:00.")
+
+def load_and_apply_bot_config(config_path=None):
+    """
+    Loads, validates and applies the config file. Returns True on success.
+    A missing file keeps the built-in defaults; an invalid file keeps whatever is currently loaded.
+    """
+    global _last_seen_config_file_mtime
+    config_path = config_path or SYMBOL_CONFIG_FILE
+    if not os.path.exists(config_path):
+        logger.warning(f"CONFIG_LOAD: '{config_path}' not found. Using built-in symbol configs.")
+        apply_bot_config(validate_bot_config({
+            "symbols": SYMBOL_CONFIGS, "aliases": SYMBOL_ALIASES, "calendar": CALENDAR_SETTINGS,
+            "trading_hours": {"start_hour": TRADING_START_HOUR, "end_hour": TRADING_END_HOUR}
+        }))
+        return False
+    try:
+        _last_seen_config_file_mtime = os.path.getmtime(config_path) # Recorded even on rejection so a bad file is reported once per edit
+        bot_config = validate_bot_config(_read_config_file(config_path))
+    except Exception as e:
+        logger.error(f"CONFIG_LOAD: Rejected '{config_path}', keeping current config. Reason: {e}")
+        return False
+    apply_bot_config(bot_config)
+    return True
+
+def reload_bot_config_if_changed():
+    try:
+        config_mtime = os.path.getmtime(SYMBOL_CONFIG_FILE)
+    except OSError:
+        return False
+    if config_mtime == _last_seen_config_file_mtime:
+        return False
+    logger.info(f"CONFIG_RELOAD: '{SYMBOL_CONFIG_FILE}' changed, reloading. New settings apply to new cycles only.")
+    return load_and_apply_bot_config(SYMBOL_CONFIG_FILE)
+# --- End Config File Loading ---
+
+def initialize_mt5_connection():
+    # Connection setup is never replayed, so it reads broker.raw and stays out of the event journal.
+    if not broker.raw.initialize():
+        logger.critical(f"MT5 initialize() failed, error code = {broker.raw.last_error()}"); return False
+    terminal_info = broker.raw.terminal_info()
+    if terminal_info is None: logger.critical(f"Failed to get MT5 terminal_info, error code = {broker.raw.last_error()}"); broker.raw.shutdown(); return False
+    logger.info(f"MetaTrader5 terminal connected: {terminal_info.name} (Build {terminal_info.build})")
+    account_info = broker.raw.account_info()
+    if account_info is None: logger.critical(f"Failed to get MT5 account_info, error code = {broker.raw.last_error()}"); broker.raw.shutdown(); return False
+    logger.info(f"Connected to account: {account_info.login}, Name: {account_info.name}, Balance: {account_info.balance} {account_info.currency}")
+    terminal_connected.set()
+    return True
+
+def get_symbol_details(symbol_name):
+    symbol_name = ladder_symbol(symbol_name)
+    info = broker.symbol_info(symbol_name)
+    if info is None: logger.warning(f"Symbol ({symbol_name}) not found in MarketWatch."); return None
+    if not info.visible:
+        logger.info(f"Symbol ({symbol_name}) is not visible, attempting to select.")
+        if not broker.symbol_select(symbol_name, True): logger.error(f"Failed to select symbol ({symbol_name})."); return None
+        bot_sleep(0.1); info = broker.symbol_info(symbol_name)
+        if not info or not info.visible: logger.error(f"Still cannot make symbol ({symbol_name}) visible."); return None
+    return info
+
+# <<<< MODIFIED: Replaced this function to correctly round lot sizes UP >>>>
+def normalize_lot(symbol_name, requested_lot):
+    """
+    Calculates a valid lot size for the given symbol, rounding UP to the nearest volume_step.
+    Also ensures the lot size is within the symbol's min/max volume limits.
+    """
+    info = get_symbol_details(symbol_name)
+    if not info:
+        logger.error(f"NORMALIZE_LOT: Could not get symbol info for {symbol_name}. Cannot calculate lot size.")
+        return None
+    lot = round_lot_to_step(requested_lot, info.volume_step, info.volume_min, info.volume_max)
+    logger.debug(f"NORMALIZE_LOT ({symbol_name}): Requested {requested_lot:.5f}, Step {info.volume_step}, Min {info.volume_min}, Max {info.volume_max} -> Final {lot:.2f}")
+    return lot
+
+# --- Order Execution Engine ---
+# Every order_send goes through execute_order_request, which applies a per-retcode policy instead of giving up
+# on the first failure. Opening requests carry an idempotency key in their comment, so when a reply is lost
+# (timeout / connection) the engine looks for the order on the broker before resending and never double-fills.
+ORDER_MAX_ATTEMPTS = 4
+ORDER_BASE_DEVIATION_POINTS = 20
+ORDER_MAX_DEVIATION_POINTS = 100
+ORDER_RETRY_DELAY_SECONDS = 0.25
+ORDER_VERIFY_POLLS = 8 # Outcome unknown: look the order up this many times, ORDER_RETRY_DELAY_SECONDS apart, before resending
+ORDER_COMMENT_MAX_LENGTH = 31 # MT5 truncates longer comments, which would cut off the idempotency key
+IDEMPOTENCY_KEY_LENGTH = 6
+ORDER_COMMENT_PREFIX = "TC" # Kept short so level, ladder magic and idempotency key all fit in ORDER_COMMENT_MAX_LENGTH
+CLOSE_MAX_PARTIAL_FILLS = 10 # A close filled in parts is resent for the remaining volume at most this many times
+
+ORDER_POLICY_REFRESH_PRICE = "REFRESH_PRICE"       # Re-read the tick, reprice and resend with a wider deviation
+ORDER_POLICY_ADJUST_STOPS = "ADJUST_STOPS"         # Re-apply the stops level to entry/SL/TP and resend
+ORDER_POLICY_VERIFY_THEN_RESEND = "VERIFY_RESEND"  # Outcome unknown: look the order up by idempotency key first
+ORDER_POLICY_BACKOFF_RESEND = "BACKOFF_RESEND"     # Server busy: wait and resend unchanged
+ORDER_POLICY_FAIL_FAST = "FAIL_FAST"               # Retrying cannot help (no money, market closed, bad volume, ...)
+_order_retcode_policies = None
+
+MT5_RES_S_OK = 1 # last_error() code meaning "no error"; None with this code is an empty result
+
+RecoveredOrderResult = collections.namedtuple("RecoveredOrderResult", ["retcode", "order", "deal", "comment"])
+
+def terminal_answered(response):
+    """False when a positions_get/orders_get style read returned None because of an error (timeout, lost connection), not because nothing matched."""
+    return response is not None or broker.last_error()[0] == MT5_RES_S_OK
+
+def _order_retcode_policy(retcode):
+    global _order_retcode_policies
+    if _order_retcode_policies is None:
+        _order_retcode_policies = {
+            broker.TRADE_RETCODE_REQUOTE: ORDER_POLICY_REFRESH_PRICE,
+            broker.TRADE_RETCODE_PRICE_CHANGED: ORDER_POLICY_REFRESH_PRICE,
+            broker.TRADE_RETCODE_PRICE_OFF: ORDER_POLICY_REFRESH_PRICE,
+            broker.TRADE_RETCODE_INVALID_PRICE: ORDER_POLICY_ADJUST_STOPS,
+            broker.TRADE_RETCODE_INVALID_STOPS: ORDER_POLICY_ADJUST_STOPS,
+            broker.TRADE_RETCODE_TIMEOUT: ORDER_POLICY_VERIFY_THEN_RESEND,
+            broker.TRADE_RETCODE_CONNECTION: ORDER_POLICY_VERIFY_THEN_RESEND,
+            broker.TRADE_RETCODE_ERROR: ORDER_POLICY_VERIFY_THEN_RESEND,
+            broker.TRADE_RETCODE_TOO_MANY_REQUESTS: ORDER_POLICY_BACKOFF_RESEND,
+            broker.TRADE_RETCODE_LOCKED: ORDER_POLICY_BACKOFF_RESEND,
+            broker.TRADE_RETCODE_FROZEN: ORDER_POLICY_BACKOFF_RESEND,
+        }
+    if retcode is None: return ORDER_POLICY_VERIFY_THEN_RESEND # No reply at all from order_send
+    return _order_retcode_policies.get(retcode, ORDER_POLICY_FAIL_FAST)
+
+def new_idempotency_key(symbol_name):
+    return journaled_value(f"key:{symbol_name}", lambda: uuid.uuid4().hex[:IDEMPOTENCY_KEY_LENGTH])
+
+def with_idempotency_key(comment, idempotency_key):
+    # An over-long comment loses its human-readable front, never the magic at its end or the key.
+    max_base_length = ORDER_COMMENT_MAX_LENGTH - IDEMPOTENCY_KEY_LENGTH - 1
+    base_comment = comment[-max_base_length:] if len(comment) > max_base_length else comment
+    return f"{base_comment} {idempotency_key}"
+
+def execute_order_request(symbol_name, request, log_label, success_retcodes, refresh_request=None, find_existing_result=None):
+    """
+    Sends `request` and retries according to the retcode policy table.
+    refresh_request(request, policy) returns an updated request (or None to abort) for price/stops policies.
+    find_existing_result() returns a result-like object if the order already reached the broker, False if the
+    terminal confirms it did not, or None if the lookup itself failed. After a lost reply the lookup is polled
+    ORDER_VERIFY_POLLS times so a late-arriving order is found; the request is resent only once the terminal has
+    answered "not there", and never while the outcome is still unknown.
+    Returns the successful result, or None once the policy fails fast or attempts are exhausted.
+    """
+    started_at = clock.time()
+    attempt_request = dict(request)
+    result = None
+    for attempt in range(1, ORDER_MAX_ATTEMPTS + 1):
+        logger.debug(f"ORDER_EXEC ({symbol_name}): {log_label} attempt {attempt}/{ORDER_MAX_ATTEMPTS}: {attempt_request}")
+        result = broker.order_send(attempt_request)
+        if result and result.retcode in success_retcodes:
+            elapsed_ms = (clock.time() - started_at) * 1000
+            if attempt > 1: logger.info(f"ORDER_EXEC ({symbol_name}): {log_label} succeeded on attempt {attempt} after {elapsed_ms:.0f} ms.")
+            else: logger.debug(f"ORDER_EXEC ({symbol_name}): {log_label} succeeded in {elapsed_ms:.0f} ms.")
+            return result
+
+        retcode = result.retcode if result else None
+        policy = _order_retcode_policy(retcode)
+        err_msg = result.comment if result else "System error"; err_code = retcode if result else broker.last_error()
+        logger.warning(f"ORDER_EXEC ({symbol_name}): {log_label} attempt {attempt} failed: {err_msg} (Code: {err_code}). Policy: {policy}.")
+        if policy == ORDER_POLICY_FAIL_FAST: break
+
+        if policy == ORDER_POLICY_VERIFY_THEN_RESEND:
+            existing_result = False
+            for verify_poll in range(ORDER_VERIFY_POLLS if find_existing_result else 1):
+                bot_sleep(ORDER_RETRY_DELAY_SECONDS)
+                existing_result = find_existing_result() if find_existing_result else False
+                if existing_result:
+                    logger.info(f"ORDER_EXEC ({symbol_name}): {log_label} already executed on broker (order {existing_result.order}). Not resending.")
+                    return existing_result
+            if existing_result is None:
+                logger.error(f"ORDER_EXEC ({symbol_name}): {log_label} outcome unknown, terminal lookups keep failing ({broker.last_error()}). Not resending.")
+                break
+        elif policy == ORDER_POLICY_BACKOFF_RESEND:
+            bot_sleep(ORDER_RETRY_DELAY_SECONDS * attempt)
+        if attempt == ORDER_MAX_ATTEMPTS: break
+
+        if policy == ORDER_POLICY_REFRESH_PRICE and "deviation" in attempt_request:
+            attempt_request["deviation"] = min(attempt_request["deviation"] * 2, ORDER_MAX_DEVIATION_POINTS)
+        if refresh_request and policy in (ORDER_POLICY_REFRESH_PRICE, ORDER_POLICY_ADJUST_STOPS, ORDER_POLICY_VERIFY_THEN_RESEND):
+            attempt_request = refresh_request(attempt_request, policy)
+            if attempt_request is None:
+                logger.error(f"ORDER_EXEC ({symbol_name}): {log_label} could not be refreshed for retry. Giving up.")
+                return None
+
+    elapsed_ms = (clock.time() - started_at) * 1000
+    err_msg = result.comment if result else "System error"; err_code = result.retcode if result else broker.last_error()
+    logger.error(f"ORDER_EXEC ({symbol_name}): {log_label} FAILED after {elapsed_ms:.0f} ms: {err_msg} (Code: {err_code})")
+    return None
+
+def _find_open_by_idempotency_key(symbol_name, idempotency_key, include_pending_orders):
+    if include_pending_orders:
+        live_orders = broker.orders_get(symbol=ladder_symbol(symbol_name))
+        if not terminal_answered(live_orders): return None
+        for order in live_orders or []:
+            if idempotency_key in order.comment:
+                return RecoveredOrderResult(broker.TRADE_RETCODE_DONE, order.ticket, 0, order.comment)
+    open_positions = broker.positions_get(symbol=ladder_symbol(symbol_name))
+    if not terminal_answered(open_positions): return None
+    for pos in open_positions or []:
+        if idempotency_key in pos.comment:
+            return RecoveredOrderResult(broker.TRADE_RETCODE_DONE, pos.ticket, 0, pos.comment)
+    return False
+# --- End Order Execution Engine ---
+
+# --- Strategy Engine ---
+# Each worker pass the engine takes one batched MarketSnapshot (all positions, all pending orders, one tick
+# per managed symbol), hands it to every registered strategy, and executes the OrderIntents they return.
+# Intent results go back to the strategy, which may answer with follow-up intents (e.g. cancelling a
+# duplicate pending order). The snapshot covers routine state only: evaluate() still reads the terminal for
+# what it lacks (order history after a fill, confirming a ticket missing from the snapshot), and L0 starts
+# and auto-restarts send their market order directly through place_market_order.
+MarketSnapshot = collections.namedtuple("MarketSnapshot", ["taken_at", "account", "positions", "orders", "ticks"]) # positions/orders/ticks keyed by symbol
+OrderIntent = collections.namedtuple(
+    "OrderIntent", ["action", "symbol", "is_buy", "lot", "price", "comment", "idempotency_key", "ticket", "level", "outcome"],
+    defaults=(None, 0.0, 0.0, "", "", 0, 0, None)
+)
+INTENT_PLACE_PENDING = "PLACE_PENDING"
+INTENT_CANCEL_ORDER = "CANCEL_ORDER"
+INTENT_CLOSE_CYCLE = "CLOSE_CYCLE" # Close everything the symbol's cycle holds, finalizing it with `outcome` if given
+
+class Strategy:
+    """
+    Base class for strategies run by the engine. evaluate() is called once per pass for each symbol the
+    strategy manages and returns a list of OrderIntents; on_intent_result() receives each executed intent
+    with its result (ticket, order result or bool) and returns follow-up intents.
+    """
+    name = "Strategy"
+
+    def active_symbols(self):
+        return []
+
+    def evaluate(self, symbol_name, snapshot):
+        return []
+
+    def on_intent_result(self, intent, result):
+        return []
+
+class TrapCycleStrategy(Strategy):
+    name = "TrapCycle"
+
+    def active_symbols(self):
+        with global_state_lock:
+            return [sym for sym, is_active in is_cycle_active.items() if is_active]
+
+    def evaluate(self, symbol_name, snapshot):
+        return manage_active_cycle(symbol_name, snapshot)
+
+    def on_intent_result(self, intent, result):
+        if intent.action == INTENT_PLACE_PENDING:
+            return _record_placed_pending_order(intent, result)
+        return []
+
+trap_cycle_strategy = TrapCycleStrategy()
+registered_strategies = [trap_cycle_strategy]
+
+def take_market_snapshot(symbols_to_manage):
+    """
+    One snapshot per pass, keyed by broker symbol and shared by all ladders on it. Returns None when the
+    terminal could not answer, so a dropped connection never reads as 'all positions closed'.
+    """
+    symbols_to_manage = list(dict.fromkeys(ladder_symbol(key) for key in symbols_to_manage))
+    symbols_wanted = set(symbols_to_manage)
+    all_positions = broker.positions_get()
+    all_orders = broker.orders_get()
+    if (all_positions is None or all_orders is None) and broker.last_error()[0] != MT5_RES_S_OK:
+        logger.warning(f"STRATEGY_ENGINE: Terminal did not return positions/orders ({broker.last_error()}). Pass skipped.")
+        return None
+    positions_by_symbol = collections.defaultdict(list)
+    for position in all_positions or ():
+        if position.symbol in symbols_wanted: positions_by_symbol[position.symbol].append(position)
+    orders_by_symbol = collections.defaultdict(list)
+    for order in all_orders or ():
+        if order.symbol in symbols_wanted: orders_by_symbol[order.symbol].append(order)
+    ticks_by_symbol = {symbol_name: broker.symbol_info_tick(symbol_name) for symbol_name in symbols_to_manage}
+    for symbol_name, tick in ticks_by_symbol.items():
+        if tick: update_market_stats(symbol_name, tick)
+    return MarketSnapshot(
+        clock.time(),
+        broker.account_info(),
+        {sym: tuple(positions) for sym, positions in positions_by_symbol.items()},
+        {sym: tuple(orders) for sym, orders in orders_by_symbol.items()},
+        ticks_by_symbol
+    )
+
+def snapshot_positions(snapshot, symbol_name, magic_number):
+    return tuple(p for p in snapshot.positions.get(symbol_name, ()) if p.magic == magic_number)
+
+def snapshot_orders(snapshot, symbol_name, magic_number):
+    return tuple(o for o in snapshot.orders.get(symbol_name, ()) if o.magic == magic_number)
+
+def active_strategy_symbols():
+    symbols_to_manage = []
+    for strategy in registered_strategies:
+        for symbol_name in strategy.active_symbols():
+            if symbol_name not in symbols_to_manage: symbols_to_manage.append(symbol_name)
+    return symbols_to_manage
+
+def _execute_order_intent(intent):
+    if intent.action == INTENT_PLACE_PENDING and get_cycle_profile(intent.symbol) is None:
+        logger.error(f"STRATEGY_ENGINE ({intent.symbol}): No symbol profile (symbol info unavailable). {intent.action} L{intent.level} not sent.")
+        return None
+    if intent.action == INTENT_PLACE_PENDING:
+        return place_pending_stop_order(intent.symbol, intent.is_buy, intent.lot, intent.price, get_cycle_profile(intent.symbol), intent.comment, intent.idempotency_key)
+    if intent.action == INTENT_CANCEL_ORDER:
+        return cancel_order(intent.symbol, intent.ticket, intent.comment or "Strategy cancel")
+    if intent.action == INTENT_CLOSE_CYCLE:
+        if intent.outcome: _finalize_and_log_cycle(intent.symbol, outcome=intent.outcome)
+        close_all_open_positions_and_pending_orders_for_symbol(intent.symbol)
+        return True
+    logger.error(f"STRATEGY_ENGINE ({intent.symbol}): Unknown intent action '{intent.action}'. Ignored.")
+    return None
+
+def execute_order_intents(strategy, intents):
+    intents_to_execute = collections.deque(intents or ())
+    while intents_to_execute:
+        intent = intents_to_execute.popleft()
+        logger.debug(f"STRATEGY_ENGINE ({intent.symbol}): {strategy.name} intent {intent.action} L{intent.level} ticket={intent.ticket} price={intent.price}")
+        result = _execute_order_intent(intent)
+        intents_to_execute.extend(strategy.on_intent_result(intent, result) or ())
+
+def run_strategy_pass(symbols_to_manage):
+    snapshot = take_market_snapshot(symbols_to_manage)
+    if snapshot is None: return
+    for strategy in registered_strategies:
+        strategy_symbols = set(strategy.active_symbols())
+        for symbol_name in symbols_to_manage:
+            if shutdown_event.is_set(): return
+            if symbol_name not in strategy_symbols: continue
+            record_worker_heartbeat(clock.time()) # Per ladder, so a long pass over many ladders is not taken for a stall
+            try:
+                symbol_intents = strategy.evaluate(symbol_name, snapshot)
+                record_level_distance(symbol_name, snapshot, acted=bool(symbol_intents))
+                execute_order_intents(strategy, symbol_intents)
+            except Exception as e:
+                logger.error(f"STRATEGY_ENGINE ({symbol_name}): {strategy.name} failed: {e}", exc_info=True)
+                if _replay_session is not None: _replay_session.divergences.append(f"{strategy.name}.evaluate({symbol_name}) raised {e!r}")
+# --- End Strategy Engine ---
+
+# --- Priority Scheduler ---
+# Every worker tick, active ladders are ranked by the distance in points between a recent bid/ask and their nearest
+# TP or pending trigger (the levels come from the last snapshot that managed them). A ladder is due once its tier's
+# interval has passed since it was last managed; due ladders run nearest first. A ladder that just acted, or was
+# never measured, is due at once. Quotes come from the pass snapshots; a fresh tick is only read for a broker symbol
+# once one of its ladders' quotes is older than QUOTE_REFRESH_TIERS allows, so distant ladders cost a read every few seconds.
+ladder_level_targets = {} # {symbol: (point, ((level price, quote field, level is above the quote), ...))}. Worker thread only.
+ladder_level_distance = {} # {symbol: points to the nearest TP/trigger, 0.0 = act again promptly, None = unknown}. Worker thread only.
+ladder_last_managed_at = {} # {symbol: clock.time() of its last pass}. Worker thread only.
+ladder_level_measured_at = {} # {symbol: clock.time() of the quote its distance was measured against}. Worker thread only.
+
+def level_targets_from_snapshot(symbol_name, snapshot):
+    """This ladder's TP and pending trigger prices, each with the quote that reaches it; None if it has none."""
+    profile = get_cycle_profile(symbol_name)
+    if profile is None or not profile.point: return None
+    broker_symbol = ladder_symbol(symbol_name)
+    magic_number = profile.config["MAGIC_NUMBER"]
+    targets = []
+    for position in snapshot_positions(snapshot, broker_symbol, magic_number):
+        if position.tp:
+            targets.append((position.tp, "bid", True) if position.type == broker.POSITION_TYPE_BUY else (position.tp, "ask", False))
+    for order in snapshot_orders(snapshot, broker_symbol, magic_number):
+        if order.type == broker.ORDER_TYPE_BUY_STOP: targets.append((order.price_open, "ask", True))
+        elif order.type == broker.ORDER_TYPE_SELL_STOP: targets.append((order.price_open, "bid", False))
+    return (profile.point, tuple(targets)) if targets else None
+
+def level_distance_points(level_targets, tick):
+    """Points from the tick's bid/ask to the closest target; None if none can be measured."""
+    if level_targets is None or not tick: return None
+    point, targets = level_targets
+    distances = [level_price - getattr(tick, quote) if is_above else getattr(tick, quote) - level_price for level_price, quote, is_above in targets]
+    return max(0.0, min(distances)) / point
+
+def record_level_distance(symbol_name, snapshot, acted=False):
+    # A ladder that just sent or cancelled something is checked again on the next tick, before the snapshot shows the result.
+    ladder_level_targets[symbol_name] = None if acted else level_targets_from_snapshot(symbol_name, snapshot)
+    ladder_level_distance[symbol_name] = 0.0 if acted else level_distance_points(ladder_level_targets[symbol_name], snapshot.ticks.get(ladder_symbol(symbol_name)))
+    ladder_level_measured_at[symbol_name] = snapshot.taken_at
+
+def refresh_level_distances(active_symbols, now_ts):
+    """
+    Re-measures ladders with known levels whose quote has gone stale for their tier, reading one fresh tick per
+    broker symbol and applying it to every ladder on it (unjournaled, like idle sampling).
+    """
+    stale_symbols = set()
+    for symbol_name in active_symbols:
+        if ladder_level_targets.get(symbol_name) is None: continue
+        quote_age = now_ts - ladder_level_measured_at.get(symbol_name, float("-inf"))
+        if quote_age >= interval_for_distance(ladder_level_distance.get(symbol_name), QUOTE_REFRESH_TIERS) - 1e-6:
+            stale_symbols.add(ladder_symbol(symbol_name))
+    for broker_symbol in stale_symbols:
+        tick = broker.raw.symbol_info_tick(broker_symbol)
+        if not tick: continue
+        update_market_stats(broker_symbol, tick)
+        for symbol_name in active_symbols:
+            level_targets = ladder_level_targets.get(symbol_name)
+            if level_targets is None or ladder_symbol(symbol_name) != broker_symbol: continue
+            ladder_level_distance[symbol_name] = level_distance_points(level_targets, tick)
+            ladder_level_measured_at[symbol_name] = now_ts
+
+def interval_for_distance(distance_points, tiers):
+    """The interval of the first tier whose max distance covers distance_points; an unknown distance gets the nearest tier."""
+    if distance_points is None: return tiers[0][1]
+    for max_distance_points, interval_seconds in tiers:
+        if max_distance_points is None or distance_points <= max_distance_points:
+            return interval_seconds
+    return tiers[-1][1]
+
+def manage_interval_for_distance(distance_points):
+    if distance_points is None: return WORKER_PASS_INTERVAL_SECONDS
+    return interval_for_distance(distance_points, PRIORITY_TIERS)
+
+def select_due_symbols(active_symbols, now_ts):
+    """Active ladders whose interval has elapsed, nearest to a level first."""
+    active_set = set(active_symbols)
+    for tracked_symbol in [s for s in ladder_last_managed_at if s not in active_set]:
+        ladder_last_managed_at.pop(tracked_symbol, None)
+        ladder_level_distance.pop(tracked_symbol, None)
+        ladder_level_targets.pop(tracked_symbol, None)
+        ladder_level_measured_at.pop(tracked_symbol, None)
+    due_symbols = []
+    for symbol_name in active_symbols:
+        if symbol_name not in ladder_last_managed_at:
+            due_symbols.append((-1.0, symbol_name)) # New ladder: measure it right away
+            continue
+        distance_points = ladder_level_distance.get(symbol_name)
+        if now_ts - ladder_last_managed_at[symbol_name] >= manage_interval_for_distance(distance_points) - 1e-6:
+            due_symbols.append((distance_points if distance_points is not None else float("inf"), symbol_name))
+    due_symbols.sort(key=lambda entry: entry[0]) # Stable, so equal distances keep strategy order
+    return [symbol_name for _, symbol_name in due_symbols]
+
+def mark_symbols_managed(symbols_managed, now_ts):
+    for symbol_name in symbols_managed:
+        ladder_last_managed_at[symbol_name] = now_ts
+
+def format_scheduler_tiers():
+    tier_counts = collections.Counter(manage_interval_for_distance(ladder_level_distance.get(s)) for s in list(ladder_last_managed_at))
+    return ", ".join(f"every {interval:g}s: {tier_counts.get(interval, 0)}" for interval in sorted({i for _, i in PRIORITY_TIERS} | {WORKER_PASS_INTERVAL_SECONDS}))
+# --- End Priority Scheduler ---
+
+# --- Market Statistics ---
+# Per broker symbol, every new tick the bot sees (pass snapshots, L0 starts, idle sampling) updates the symbol's
+# SymbolMarketStats ring buffers. Values are kept in price units; views convert them to points.
+market_stats_lock = threading.Lock()
+market_stats = {} # {broker symbol: SymbolMarketStats}
+
+def update_market_stats(symbol_name, tick):
+    with market_stats_lock:
+        symbol_stats = market_stats.get(symbol_name)
+        if symbol_stats is None:
+            symbol_stats = market_stats[symbol_name] = SymbolMarketStats(MARKET_STATS_BAR_SECONDS, SPREAD_WINDOW_TICKS, ATR_PERIOD_BARS, TICK_RATE_WINDOW_BARS)
+        symbol_stats.update(tick)
+
+def market_stats_view(symbol_name, point):
+    """Current statistics in points (tick rate in observed ticks/second); None for values still warming up."""
+    with market_stats_lock:
+        symbol_stats = market_stats.get(symbol_name)
+        if symbol_stats is None or not point: return None
+        average_spread = symbol_stats.spreads.mean() if symbol_stats.spreads.count >= SPREAD_MIN_SAMPLES else None
+        atr = symbol_stats.true_ranges.mean() if symbol_stats.true_ranges.count >= ATR_MIN_BARS else None
+        ticks_per_bar = symbol_stats.bar_tick_counts.mean()
+        return {
+            "spread": symbol_stats.last_spread / point,
+            "average_spread": None if average_spread is None else average_spread / point,
+            "atr": None if atr is None else atr / point,
+            "tick_rate": None if ticks_per_bar is None else ticks_per_bar / MARKET_STATS_BAR_SECONDS,
+            "bars": symbol_stats.true_ranges.count
+        }
+
+def uses_market_stats(config):
+    return any(key in config for key in MARKET_STATS_CONFIG_KEYS)
+
+def sample_idle_market_stats(active_symbols):
+    """Keeps statistics warm for symbols that use them but had no ladder in this pass (unjournaled, like the watchdog's probes)."""
+    symbols_polled = {ladder_symbol(key) for key in active_symbols}
+    for symbol_name, symbol_config in list(SYMBOL_CONFIGS.items()):
+        if symbol_name in symbols_polled or not uses_market_stats(symbol_config): continue
+        tick = broker.raw.symbol_info_tick(symbol_name)
+        if tick: update_market_stats(symbol_name, tick)
+
+def check_market_conditions(config, stats_view):
+    """Returns None when an L0 may start, else the reason it may not (abnormal spread or volatility)."""
+    pip_points = config["PIP_MULTIPLIER"]
+    if "MAX_SPREAD_PIPS" in config and stats_view["spread"] > config["MAX_SPREAD_PIPS"] * pip_points:
+        return f"Spread {stats_view['spread'] / pip_points:.1f} pips exceeds MAX_SPREAD_PIPS {config['MAX_SPREAD_PIPS']}."
+    if "MAX_SPREAD_RATIO" in config and stats_view["average_spread"] and stats_view["spread"] > config["MAX_SPREAD_RATIO"] * stats_view["average_spread"]:
+        return f"Spread {stats_view['spread'] / pip_points:.1f} pips is over {config['MAX_SPREAD_RATIO']}x its rolling average ({stats_view['average_spread'] / pip_points:.1f} pips)."
+    if "MAX_ATR_PIPS" in config and stats_view["atr"] is not None and stats_view["atr"] > config["MAX_ATR_PIPS"] * pip_points:
+        return f"ATR {stats_view['atr'] / pip_points:.1f} pips exceeds MAX_ATR_PIPS {config['MAX_ATR_PIPS']}."
+    return None
+
+def market_distance_scale(config, stats_view):
+    """ATR relative to ATR_REFERENCE_PIPS, clamped to [ATR_SCALE_MIN, ATR_SCALE_MAX]; 1.0 without a reference or a warm ATR."""
+    if "ATR_REFERENCE_PIPS" not in config or stats_view is None or stats_view["atr"] is None: return 1.0
+    scale = stats_view["atr"] / (config["ATR_REFERENCE_PIPS"] * config["PIP_MULTIPLIER"])
+    return min(max(scale, config.get("ATR_SCALE_MIN", ATR_SCALE_MIN_DEFAULT)), config.get("ATR_SCALE_MAX", ATR_SCALE_MAX_DEFAULT))
+
+def scale_profile_distances(profile, scale):
+    # SL scales with trigger and TP so the ladder keeps its shape (SL beyond the next trigger).
+    if scale == 1.0: return profile
+    return profile._replace(sl_offset=profile.sl_offset * scale, tp_offset=profile.tp_offset * scale, trigger_offset=profile.trigger_offset * scale)
+
+def format_market_stats(symbol_name):
+    profile = symbol_profiles.get(symbol_name)
+    stats_view = market_stats_view(symbol_name, profile.point) if profile is not None else None
+    if stats_view is None: return f"{symbol_name} market: no ticks observed yet."
+    pip_points = profile.config["PIP_MULTIPLIER"]
+    def in_pips(value): return "warming up" if value is None else f"{value / pip_points:.2f} pips"
+    tick_rate = "n/a" if stats_view["tick_rate"] is None else f"{stats_view['tick_rate']:.2f}/s"
+    return (f"{symbol_name} market: spread {in_pips(stats_view['spread'])} (avg {in_pips(stats_view['average_spread'])}), "
+            f"ATR({ATR_PERIOD_BARS}x{MARKET_STATS_BAR_SECONDS}s) {in_pips(stats_view['atr'])}, tick rate {tick_rate}, "
+            f"distance scale x{market_distance_scale(profile.config, stats_view):.2f}")
+# --- End Market Statistics ---
+
+# --- Margin Feasibility ---
+# Ladder lots grow by LOT_MULTIPLIER per level, so deep levels can exceed the account's free margin. Margin per
+# (symbol, lot) comes from order_calc_margin and is cached; at L0 the whole ladder is planned to find the deepest
+# level the account can fund, and each pending level is checked against current free margin before it is sent.
+MARGIN_SAFETY_BUFFER_RATIO = 0.10 # Share of free margin never committed to new levels
+MARGIN_CACHE_TTL_SECONDS = 300.0  # Margin per lot drifts with price and conversion rates
+
+LadderLevel = collections.namedtuple("LadderLevel", ["level", "lot", "margin", "cumulative_margin"])
+margin_cache_lock = threading.Lock()
+margin_requirement_cache = {} # {(symbol, lot): (margin, computed_at)}
+cycle_ladder_plan = {} # {symbol: (LadderLevel, ...)} planned at L0
+cycle_max_fundable_level = {} # {symbol: deepest level fundable at L0 time}
+cycle_margin_headroom = {} # {symbol: free margin left after funding the next level}, refreshed from each pass snapshot
+
+def get_required_margin(symbol_name, lot, price):
+    symbol_name = ladder_symbol(symbol_name) # Shared by all ladders of the symbol
+    cache_key = (symbol_name, lot)
+    now = clock.time()
+    with margin_cache_lock:
+        cached_entry = margin_requirement_cache.get(cache_key)
+    # Journaled so a replay asks the terminal exactly when the recording did, whatever its own cache holds.
+    cached_margin = journaled_value(f"margin_cached:{symbol_name}", lambda: cached_entry[0] if cached_entry is not None and now - cached_entry[1] < MARGIN_CACHE_TTL_SECONDS else None)
+    if cached_margin is not None:
+        return cached_margin
+    margin = broker.order_calc_margin(broker.ORDER_TYPE_BUY, symbol_name, lot, price)
+    if margin is None:
+        logger.warning(f"MARGIN ({symbol_name}): order_calc_margin failed for {lot} lots. Error: {broker.last_error()}")
+        return None
+    with margin_cache_lock:
+        margin_requirement_cache[cache_key] = (margin, now)
+    return margin
+
+def usable_free_margin(account):
+    return account.margin_free * (1.0 - MARGIN_SAFETY_BUFFER_RATIO)
+
+def plan_ladder_margin(symbol_name, config, initial_lot, price, usable_margin):
+    """
+    Lots and margin for L0 upwards, assuming every level stays open until the cycle closes (hedging discounts
+    ignored). Returns (levels, max_fundable_level); levels ends at the first unfundable level, -1 if L0 is not fundable.
+    """
+    ladder_levels = []
+    max_fundable_level = -1
+    cumulative_margin = 0.0
+    level_lot = initial_lot
+    for level in range(config["MAX_TRADES_IN_CYCLE"]):
+        if level > 0: level_lot = normalize_lot(symbol_name, level_lot * config["LOT_MULTIPLIER"])
+        if level_lot is None or level_lot <= 0: break
+        margin = get_required_margin(symbol_name, level_lot, price)
+        if margin is None: break
+        cumulative_margin += margin
+        ladder_levels.append(LadderLevel(level, level_lot, margin, cumulative_margin))
+        if cumulative_margin > usable_margin: break
+        max_fundable_level = level
+    return tuple(ladder_levels), max_fundable_level
+
+def check_level_funding(symbol_name, level, lot, price):
+    """None when the account can fund `lot` now, otherwise the reason for refusing the level."""
+    account = broker.account_info()
+    if account is None:
+        logger.warning(f"MARGIN ({symbol_name}): No account info; L{level} funding not checked.")
+        return None
+    required_margin = get_required_margin(symbol_name, lot, price)
+    if required_margin is None: return None # Unknown requirement: let the broker decide
+    usable_margin = usable_free_margin(account)
+    if required_margin <= usable_margin: return None
+    return (f"L{level} needs {required_margin:.2f} {account.currency} margin for {lot} lots; usable free margin is "
+            f"{usable_margin:.2f} ({account.margin_free:.2f} free less {MARGIN_SAFETY_BUFFER_RATIO:.0%} buffer).")
+
+def _update_margin_headroom(symbol_name, account):
+    # Caller must hold global_state_lock.
+    if account is None: return
+    next_level = current_level.get(symbol_name, 0) + 1
+    ladder_plan = cycle_ladder_plan.get(symbol_name) or ()
+    if next_level < len(ladder_plan):
+        cycle_margin_headroom[symbol_name] = account.margin_free - ladder_plan[next_level].margin
+    else:
+        cycle_margin_headroom[symbol_name] = None # Beyond the planned ladder
+# --- End Margin Feasibility ---
+
+def _adjust_pending_entry_price(info, tick, is_buy_stop, entry_price_param):
+    min_stop_level_points_abs = info.trade_stops_level * info.point
+    adjusted_entry_price = round(entry_price_param, info.digits)
+    if is_buy_stop:
+        required_price = round(tick.ask + min_stop_level_points_abs, info.digits)
+        if adjusted_entry_price < required_price : adjusted_entry_price = round(required_price + info.point, info.digits)
+    else:
+        required_price = round(tick.bid - min_stop_level_points_abs, info.digits)
+        if adjusted_entry_price > required_price: adjusted_entry_price = round(required_price - info.point, info.digits)
+    return adjusted_entry_price
+
+def place_market_order(symbol_name, is_buy_order_type, lot_size_param, profile, comment_param, idempotency_key):
+    config = profile.config; info = get_symbol_details(symbol_name)
+    if not info: return None
+    order_type = broker.ORDER_TYPE_BUY if is_buy_order_type else broker.ORDER_TYPE_SELL
+    tick_info = broker.symbol_info_tick(profile.symbol)
+    if not tick_info: logger.error(f"Could not get tick for {symbol_name} market order."); return None
+    price = tick_info.ask if is_buy_order_type else tick_info.bid
+    sl_price, tp_price = calculate_sl_tp_prices(profile, price, is_buy_order_type)
+    request = {"action": broker.TRADE_ACTION_DEAL, "symbol": profile.symbol, "volume": lot_size_param, "type": order_type, "price": price, "sl": sl_price, "tp": tp_price, "deviation": ORDER_BASE_DEVIATION_POINTS, "magic": config["MAGIC_NUMBER"], "comment": comment_param, "type_filling": broker.ORDER_FILLING_IOC, "type_time": broker.ORDER_TIME_GTC}
+
+    def refresh_market_request(retry_request, policy):
+        fresh_tick = broker.symbol_info_tick(profile.symbol)
+        if not fresh_tick: return None
+        retry_request["price"] = fresh_tick.ask if is_buy_order_type else fresh_tick.bid
+        retry_request["sl"], retry_request["tp"] = calculate_sl_tp_prices(profile, retry_request["price"], is_buy_order_type)
+        return retry_request
+
+    result = execute_order_request(
+        symbol_name, request, f"MARKET '{comment_param}'", (broker.TRADE_RETCODE_DONE, broker.TRADE_RETCODE_PLACED, broker.TRADE_RETCODE_DONE_PARTIAL),
+        refresh_request=refresh_market_request,
+        find_existing_result=lambda: _find_open_by_idempotency_key(symbol_name, idempotency_key, include_pending_orders=False)
+    )
+    if result:
+        logger.info(f"Market order SUCCESS for '{comment_param}' ({symbol_name}). Order: {result.order}, Deal: {result.deal}"); return result
+    else:
+        logger.error(f"Market order FAILED for '{comment_param}' ({symbol_name})."); return None
+
+def place_pending_stop_order(symbol_name, is_buy_stop, lot_size_param, entry_price_param, profile, comment_param, idempotency_key):
+    config = profile.config; info = get_symbol_details(symbol_name)
+    if not info: return 0
+    order_type = broker.ORDER_TYPE_BUY_STOP if is_buy_stop else broker.ORDER_TYPE_SELL_STOP
+    tick = broker.symbol_info_tick(profile.symbol)
+    if not tick: logger.error(f"Cannot get tick for {symbol_name} pending order price check."); return 0
+    adjusted_entry_price = _adjust_pending_entry_price(info, tick, is_buy_stop, entry_price_param)
+    sl_price, tp_price = calculate_sl_tp_prices(profile, adjusted_entry_price, is_buy_stop)
+    request = {"action": broker.TRADE_ACTION_PENDING, "symbol": profile.symbol, "volume": lot_size_param, "type": order_type, "price": adjusted_entry_price, "sl": sl_price, "tp": tp_price, "magic": config["MAGIC_NUMBER"], "comment": comment_param, "type_filling": broker.ORDER_FILLING_IOC, "type_time": broker.ORDER_TIME_GTC }
+
+    def refresh_pending_request(retry_request, policy):
+        fresh_info = get_symbol_details(symbol_name) # The stops level can change intraday
+        fresh_tick = broker.symbol_info_tick(profile.symbol)
+        if not fresh_info or not fresh_tick: return None
+        retry_request["price"] = _adjust_pending_entry_price(fresh_info, fresh_tick, is_buy_stop, entry_price_param)
+        retry_request["sl"], retry_request["tp"] = calculate_sl_tp_prices(profile, retry_request["price"], is_buy_stop)
+        return retry_request
+
+    result = execute_order_request(
+        symbol_name, request, f"PENDING '{comment_param}'", (broker.TRADE_RETCODE_DONE, broker.TRADE_RETCODE_PLACED),
+        refresh_request=refresh_pending_request,
+        find_existing_result=lambda: _find_open_by_idempotency_key(symbol_name, idempotency_key, include_pending_orders=True)
+    )
+    if result:
+        logger.info(f"Pending order SUCCESS for '{comment_param}' ({symbol_name}). Ticket: {result.order}"); return result.order
+    else:
+        logger.error(f"Pending order FAILED for '{comment_param}' ({symbol_name})."); return 0
+
+def get_position_details_from_order_result(symbol_name, order_send_result, expected_comment, profile):
+    config = profile.config
+    if not order_send_result or order_send_result.order == 0: logger.warning(f"GETPOS ({symbol_name}): No order_send_result or order ID 0."); return None
+    if order_send_result.deal > 0:
+        deals = broker.history_deals_get(ticket=order_send_result.deal)
+        if deals and len(deals) == 1 and deals[0].position_id > 0:
+            positions = broker.positions_get(ticket=deals[0].position_id)
+            if positions and len(positions) == 1: logger.debug(f"GETPOS ({symbol_name}): Pos {positions[0].ticket} confirmed via deal for order {order_send_result.order}."); return positions[0]
+    logger.info(f"GETPOS ({symbol_name}): Could not confirm pos via deal for order {order_send_result.order}. Fallback search by comment.")
+    bot_sleep(0.5); positions = broker.positions_get(symbol=profile.symbol)
+    if positions:
+        for pos in reversed(positions):
+            if pos.magic == config["MAGIC_NUMBER"] and pos.comment == expected_comment: logger.debug(f"GETPOS ({symbol_name}): Pos {pos.ticket} confirmed via comment for order {order_send_result.order}."); return pos
+    logger.warning(f"GETPOS ({symbol_name}): Pos for order {order_send_result.order} / comment '{expected_comment}' not found."); return None
+
+def reset_cycle_state_for_symbol(symbol_name, called_for_new_l0_setup=False):
+    local_last_l0_direction_for_restart = None
+    local_user_initial_preference = None
+    log_finalization_needed = not called_for_new_l0_setup
+
+    if log_finalization_needed:
+        _finalize_and_log_cycle(symbol_name, outcome="CONCLUDED_BY_RESET")
+
+    with global_state_lock:
+        logger.info(f"RESET_CYCLE ({symbol_name}): Resetting state. Called for new L0 setup: {called_for_new_l0_setup}")
+        journal_event("RESET", symbol_name, for_new_l0=called_for_new_l0_setup)
+        local_last_l0_direction_for_restart = LAST_L0_WAS_BUY.get(symbol_name)
+        local_user_initial_preference = user_initial_preference_is_buy.get(symbol_name)
+
+        is_cycle_active[symbol_name] = False
+        current_level[symbol_name] = 0
+        active_position_ticket[symbol_name] = 0
+        active_position_entry_price[symbol_name] = 0.0
+        active_position_lot_size[symbol_name] = 0.0
+        active_position_is_buy[symbol_name] = None
+        active_pending_order_ticket[symbol_name] = 0
+        active_pending_order_is_buy_stop[symbol_name] = None
+        cycle_open_position_tickets[symbol_name] = []
+        cycle_L0_entry_price[symbol_name] = 0.0
+        cycle_floating_pnl[symbol_name] = 0.0
+        cycle_symbol_profile[symbol_name] = None
+        cycle_ladder_plan[symbol_name] = (); cycle_max_fundable_level[symbol_name] = -1; cycle_margin_headroom[symbol_name] = None
+        logger.debug(f"RESET_CYCLE ({symbol_name}): State has been reset (under lock).")
+
+    if called_for_new_l0_setup:
+        unpark_symbol(symbol_name)
+    elif AUTO_RESTART_COMPLETED_CYCLES:
+        is_trading_hours_now = is_trading_hours_for_symbol(symbol_name)
+        if not is_trading_hours_now and local_last_l0_direction_for_restart is not None:
+            last_l0_was_str = 'BUY' if local_last_l0_direction_for_restart else 'SELL'
+            logger.info(f"AUTO-RESTART ({symbol_name}): Outside this symbol's session. Last L0 was {last_l0_was_str}; restart will fire at session open.")
+            park_symbol_until_session_open(symbol_name)
+        else:
+            _auto_restart_cycle(symbol_name, local_last_l0_direction_for_restart, local_user_initial_preference)
+    else:
+        with global_state_lock:
+            LAST_L0_WAS_BUY[symbol_name] = None
+
+def _auto_restart_cycle(symbol_name, local_last_l0_direction_for_restart, local_user_initial_preference):
+    if local_last_l0_direction_for_restart is not None:
+        if local_user_initial_preference is None:
+            logger.warning(f"AUTO-RESTART ({symbol_name}): Skipped. User's initial 75/25 preference not set...")
+            print(f"AUTO-RESTART SKIPPED for {symbol_name}: User preference for 75/25 split not set...")
+            with global_state_lock:
+                LAST_L0_WAS_BUY[symbol_name] = None
+        else:
+            random_val = journaled_value(f"rand:{symbol_name}", random.random)
+            favored_str = "BUY" if local_user_initial_preference else "SELL"
+            next_l0_is_buy = False
+            decision_reason = ""
+            if random_val <= 0.75:
+                next_l0_is_buy = local_user_initial_preference
+                decision_reason = f"Rolled <=0.75 (value: {random_val:.4f}), followed favored {favored_str}"
+            else:
+                next_l0_is_buy = not local_user_initial_preference
+                decision_reason = f"Rolled >0.75 (value: {random_val:.4f}), opposite of favored {favored_str}"
+            next_l0_will_be_str = 'BUY' if next_l0_is_buy else 'SELL'
+            last_l0_was_str = 'BUY' if local_last_l0_direction_for_restart else 'SELL'
+            logger.info(f"AUTO-RESTART ({symbol_name}): Last L0 was {last_l0_was_str}. User's favored is {favored_str}.")
+            logger.info(f"AUTO-RESTART ({symbol_name}): {decision_reason}. Triggering new L0 as {next_l0_will_be_str}.")
+            print(f"\nAUTO-RESTART for {symbol_name}: Last L0 was {last_l0_was_str}. Favored: {favored_str}.")
+            print(f"AUTO-RESTART for {symbol_name}: {decision_reason}. Starting L0 as {next_l0_will_be_str}.")
+            bot_sleep(1.5)
+            start_L0_market_cycle(symbol_name, is_buy_L0=next_l0_is_buy, retry_if_market_blocked=True)
+    else:
+        logger.info(f"AUTO-RESTART ({symbol_name}): Skipped, last L0 direction unknown...")
+        with global_state_lock:
+            LAST_L0_WAS_BUY[symbol_name] = None
+
+def cancel_order(symbol_name, order_ticket, comment_prefix="Cancelling order"):
+    if order_ticket == 0: return True
+    request = {"action": broker.TRADE_ACTION_REMOVE, "order": order_ticket}
+    logger.debug(f"CANCEL_ORDER ({symbol_name}): Attempting to cancel order {order_ticket} (Log: {comment_prefix})")
+
+    def find_already_removed():
+        # Removal is idempotent by ticket: once the order is no longer live, a lost reply still means success.
+        live_orders = broker.orders_get(ticket=order_ticket)
+        if not terminal_answered(live_orders): return None
+        if live_orders: return False
+        return RecoveredOrderResult(broker.TRADE_RETCODE_DONE, order_ticket, 0, "order no longer live")
+
+    result = execute_order_request(symbol_name, request, f"CANCEL #{order_ticket}", (broker.TRADE_RETCODE_DONE,), find_existing_result=find_already_removed)
+    if result:
+        logger.info(f"Order {order_ticket} ({symbol_name}) cancelled successfully."); return True
+    else:
+        logger.error(f"Failed to cancel order {order_ticket} ({symbol_name})."); return False
+
+def close_single_position(symbol_name, pos_ticket, close_comment="Cycle Close"):
+    pos_to_close_list = broker.positions_get(ticket=pos_ticket)
+    if not pos_to_close_list: logger.warning(f"CLOSEPOS ({symbol_name}): Pos {pos_ticket} not found for closing."); return False
+    pos_to_close = pos_to_close_list[0]; info = get_symbol_details(pos_to_close.symbol)
+    if not info: return False
+    close_as_buy = pos_to_close.type == broker.POSITION_TYPE_SELL
+
+    def refresh_close_request(retry_request, policy):
+        fresh_tick = broker.symbol_info_tick(pos_to_close.symbol)
+        if not fresh_tick: return None
+        retry_request["price"] = fresh_tick.ask if close_as_buy else fresh_tick.bid
+        return retry_request
+
+    def find_already_closed():
+        # Closing is idempotent by position ticket: if the position is gone, the close went through.
+        open_positions = broker.positions_get(ticket=pos_ticket)
+        if not terminal_answered(open_positions): return None
+        if open_positions: return False
+        return RecoveredOrderResult(broker.TRADE_RETCODE_DONE, 0, 0, "position no longer open")
+
+    for close_round in range(1, CLOSE_MAX_PARTIAL_FILLS + 1):
+        request = {"action": broker.TRADE_ACTION_DEAL, "symbol": pos_to_close.symbol, "volume": pos_to_close.volume, "position": pos_to_close.ticket, "type": broker.ORDER_TYPE_BUY if close_as_buy else broker.ORDER_TYPE_SELL, "deviation": ORDER_BASE_DEVIATION_POINTS, "magic": pos_to_close.magic, "comment": f"{close_comment} ({symbol_name})", "type_filling": info.filling_mode, "type_time": broker.ORDER_TIME_GTC}
+        logger.debug(f"CLOSEPOS ({symbol_name}): Attempting to close position {pos_ticket}, request: {request}")
+        result = execute_order_request(
+            symbol_name, request, f"CLOSE pos #{pos_ticket}", (broker.TRADE_RETCODE_DONE, broker.TRADE_RETCODE_DONE_PARTIAL),
+            refresh_request=refresh_close_request, find_existing_result=find_already_closed
+        )
+        if not result:
+            logger.error(f"Failed to close pos {pos_ticket} ({symbol_name})."); return False
+        if result.retcode != broker.TRADE_RETCODE_DONE_PARTIAL:
+            logger.info(f"Pos {pos_ticket} ({symbol_name}) closed. Comment: '{close_comment}'."); return True
+        # A partial fill leaves the rest of the position open: resend for whatever volume remains.
+        pos_to_close_list = broker.positions_get(ticket=pos_ticket)
+        if not pos_to_close_list:
+            logger.info(f"Pos {pos_ticket} ({symbol_name}) closed. Comment: '{close_comment}'."); return True
+        pos_to_close = pos_to_close_list[0]
+        logger.warning(f"CLOSEPOS ({symbol_name}): Pos {pos_ticket} partially closed (round {close_round}), {pos_to_close.volume} lots remain. Resending.")
+    logger.error(f"CLOSEPOS ({symbol_name}): Pos {pos_ticket} still open with {pos_to_close.volume} lots after {CLOSE_MAX_PARTIAL_FILLS} partial closes."); return False
+
+def close_all_open_positions_and_pending_orders_for_symbol(symbol_name):
+    _finalize_and_log_cycle(symbol_name, outcome="MANUAL_CLOSEALL")
+
+    logger.info(f"CLOSEALL_CYCLE ({symbol_name}): Attempting to close all cycle activity...")
+    journal_event("CLOSEALL", symbol_name)
+    config = get_cycle_config(symbol_name)
+
+    tracked_pending_ticket_snapshot = 0
+    with global_state_lock:
+        tracked_pending_ticket_snapshot = active_pending_order_ticket.get(symbol_name, 0)
+
+    if tracked_pending_ticket_snapshot != 0:
+        logger.debug(f"CLOSEALL_CYCLE ({symbol_name}): Cancelling tracked pending order: {tracked_pending_ticket_snapshot}")
+        cancel_order(symbol_name, tracked_pending_ticket_snapshot, "Cycle End - Cancel Tracked Pending")
+
+    # positions_get/orders_get cannot filter by magic, and other ladders on this symbol must be left alone.
+    broker_pending_orders = []
+    if config is None: logger.warning(f"CLOSEALL_CYCLE ({symbol_name}): Symbol no longer configured, magic unknown. Skipping the broker pending order sweep.")
+    else: broker_pending_orders = [o for o in broker.orders_get(symbol=ladder_symbol(symbol_name)) or () if o.magic == config["MAGIC_NUMBER"]]
+    if broker_pending_orders:
+        for order in broker_pending_orders:
+            if order.type in [broker.ORDER_TYPE_BUY_STOP, broker.ORDER_TYPE_SELL_STOP]:
+                if order.ticket != tracked_pending_ticket_snapshot or tracked_pending_ticket_snapshot == 0:
+                    logger.debug(f"CLOSEALL_CYCLE ({symbol_name}): Sweeping additional broker pending order {order.ticket}.")
+                    cancel_order(symbol_name, order.ticket, "Cycle End - Sweep Cancel Pending")
+    elif config is not None: logger.debug(f"CLOSEALL_CYCLE ({symbol_name}): No pending orders found on broker with magic {config['MAGIC_NUMBER']} during sweep.")
+
+    tickets_to_close_this_cycle_snapshot = []
+    with global_state_lock:
+        tickets_to_close_this_cycle_snapshot = list(cycle_open_position_tickets.get(symbol_name, []))
+
+    if tickets_to_close_this_cycle_snapshot:
+        logger.debug(f"CLOSEALL_CYCLE ({symbol_name}): Tracked open positions for cycle: {tickets_to_close_this_cycle_snapshot}")
+        for ticket_to_close in tickets_to_close_this_cycle_snapshot:
+            close_single_position(symbol_name, ticket_to_close, "Cycle End - Close Pos")
+    else: logger.debug(f"CLOSEALL_CYCLE ({symbol_name}): No open positions tracked in current cycle state to close.")
+
+    reset_cycle_state_for_symbol(symbol_name)
+
+def place_single_next_pending_order(symbol_name, based_on_position_snapshot):
+    next_pending_intent = build_next_pending_intent(symbol_name, based_on_position_snapshot)
+    if next_pending_intent is not None:
+        execute_order_intents(trap_cycle_strategy, [next_pending_intent])
+
+def build_next_pending_intent(symbol_name, based_on_position_snapshot):
+    if not is_trading_hours_for_symbol(symbol_name):
+        next_level_attempt_snapshot = 0
+        with global_state_lock:
+            next_level_attempt_snapshot = current_level.get(symbol_name, 0) + 1
+        logger.info(f"PSP_TIME_RESTRICT ({symbol_name}): L{next_level_attempt_snapshot} pending order placement skipped. Outside trading hours for this symbol.")
+        print(f"PSP for {symbol_name}: L{next_level_attempt_snapshot} pending order placement skipped. Outside trading hours for this symbol.")
+        return
+
+    profile = get_cycle_profile(symbol_name)
+    if profile is None:
+        logger.error(f"PSP_ERROR ({symbol_name}): No symbol profile (symbol info unavailable). Not placing the next pending order.")
+        return
+    config = profile.config
+    current_pending_snapshot = 0
+    num_open_positions_snapshot = 0
+    current_level_snapshot = 0
+    l0_price_snapshot = 0.0
+    is_l0_buy_actual_snapshot = None
+
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False):
+            logger.warning(f"PSP_SKIP ({symbol_name}): Cycle became inactive. Skipping pending order placement.")
+            return
+        current_pending_snapshot = active_pending_order_ticket.get(symbol_name, 0)
+        num_open_positions_snapshot = len(cycle_open_position_tickets.get(symbol_name, []))
+        current_level_snapshot = current_level.get(symbol_name, 0)
+        l0_price_snapshot = cycle_L0_entry_price.get(symbol_name, 0.0)
+        is_l0_buy_actual_snapshot = LAST_L0_WAS_BUY.get(symbol_name)
+
+    if current_pending_snapshot != 0:
+        logger.error(f"PSP_ERROR ({symbol_name}): Pending order {current_pending_snapshot} already exists. Skipping.")
+        return
+
+    if num_open_positions_snapshot >= config["MAX_TRADES_IN_CYCLE"]:
+        logger.info(f"PSP_MAX_TRADES ({symbol_name}): Max trades ({config['MAX_TRADES_IN_CYCLE']}) would be reached. Not placing L{current_level_snapshot + 1} pending.")
+        return
+
+    info = get_symbol_details(symbol_name)
+    if not info:
+        logger.error(f"PSP_ERROR ({symbol_name}): No symbol info for {symbol_name}.")
+        return
+
+    next_lot = normalize_lot(symbol_name, based_on_position_snapshot.volume * config["LOT_MULTIPLIER"])
+    if next_lot is None or next_lot <= 0:
+        logger.error(f"PSP_ERROR ({symbol_name}): L{current_level_snapshot + 1} Pending: Invalid lot size ({next_lot}) for {symbol_name}.")
+        return
+
+    place_as_buy_stop = next_pending_is_buy_stop(based_on_position_snapshot.type == broker.POSITION_TYPE_BUY)
+    next_level_to_place = current_level_snapshot + 1
+    logger.debug(f"PSP_LOGIC ({symbol_name}): based_on_position (L{current_level_snapshot}) was {'BUY' if based_on_position_snapshot.type == broker.POSITION_TYPE_BUY else 'SELL'}. Next pending (L{next_level_to_place}) will be {'BUY_STOP' if place_as_buy_stop else 'SELL_STOP'}")
+
+    if l0_price_snapshot == 0.0:
+        logger.error(f"PSP_ERROR ({symbol_name}): cycle_L0_entry_price is 0.0. Cannot place L{next_level_to_place} pending order.")
+        return
+
+    if is_l0_buy_actual_snapshot is None:
+        logger.error(f"PSP_ERROR ({symbol_name}): LAST_L0_WAS_BUY is not set. Cannot determine p_alternate for L{next_level_to_place}.")
+        return
+
+    next_pending_price = pending_entry_price(l0_price_snapshot, next_level_to_place, is_l0_buy_actual_snapshot, profile.trigger_offset, profile.digits)
+    logger.debug(f"PSP_LOGIC ({symbol_name}): Placing L{next_level_to_place} ({'odd, at p_alternate' if next_level_to_place % 2 == 1 else 'even, at L0 entry price'}) pending at {next_pending_price}")
+
+    funding_refusal = check_level_funding(symbol_name, next_level_to_place, next_lot, next_pending_price)
+    if funding_refusal:
+        logger.warning(f"PSP_MARGIN_REFUSED ({symbol_name}): L{next_level_to_place} pending not sent. {funding_refusal}")
+        print(f"PSP for {symbol_name}: L{next_level_to_place} pending refused locally. {funding_refusal}")
+        journal_event("LEVEL_REFUSED", symbol_name, level=next_level_to_place, lot=next_lot, reason="margin")
+        return
+
+    pending_idempotency_key = new_idempotency_key(symbol_name)
+    comment_pending = with_idempotency_key(f"{ORDER_COMMENT_PREFIX} L{next_level_to_place} {'PBS' if place_as_buy_stop else 'PSS'} M{config['MAGIC_NUMBER']}", pending_idempotency_key)
+
+    return OrderIntent(INTENT_PLACE_PENDING, symbol_name, is_buy=place_as_buy_stop, lot=next_lot, price=next_pending_price,
+                       comment=comment_pending, idempotency_key=pending_idempotency_key, level=next_level_to_place)
+
+def _record_placed_pending_order(intent, new_pending_ticket):
+    symbol_name = intent.symbol
+    if not new_pending_ticket:
+        logger.error(f"PSP_FAIL ({symbol_name}): Failed to place L{intent.level} pending order.")
+        return []
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False):
+            logger.warning(f"PSP_LATE_SKIP ({symbol_name}): Cycle became inactive after pending order placed. Attempting to cancel {new_pending_ticket}.")
+            return []
+
+        if active_pending_order_ticket.get(symbol_name, 0) == 0:
+            active_pending_order_ticket[symbol_name] = new_pending_ticket
+            active_pending_order_is_buy_stop[symbol_name] = intent.is_buy
+            logger.info(f"PSP_SUCCESS ({symbol_name}): Pending L{intent.level} placed @ {intent.price} (Ticket: {new_pending_ticket})")
+            journal_event("PENDING_PLACED", symbol_name, level=intent.level, ticket=new_pending_ticket, price=intent.price, buy_stop=intent.is_buy)
+            return []
+        logger.warning(f"PSP_CONCURRENCY ({symbol_name}): Another pending order {active_pending_order_ticket[symbol_name]} appeared. Cancelling newly placed {new_pending_ticket}.")
+    return [OrderIntent(INTENT_CANCEL_ORDER, symbol_name, ticket=new_pending_ticket, comment="PSP Auto-Cancel (Concurrency)")]
+
+
+def start_L0_market_cycle(symbol_name, is_buy_L0, retry_if_market_blocked=False):
+    """
+    Opens L0 and places the L1 pending. With retry_if_market_blocked (auto-restarts), an L0 refused by the spread or
+    volatility limits parks the ladder and the session scheduler retries it until conditions normalize.
+    """
+    if not is_trading_hours_for_symbol(symbol_name):
+        logger.warning(f"START_L0 ({symbol_name}): Cannot start cycle. Outside trading hours for this symbol...")
+        print(f"Cannot start L0 for {symbol_name}: Outside trading hours for this symbol...")
+        return
+
+    with global_state_lock:
+        if is_cycle_active.get(symbol_name, False):
+            logger.warning(f"START_L0 ({symbol_name}): Cycle already active on this ladder. Cannot start new L0.")
+            print(f"Cannot start L0 for {symbol_name}: Cycle already active.")
+            return
+
+    profile = get_symbol_profile(symbol_name)
+    if profile is None:
+        logger.error(f"START_L0 ({symbol_name}): No config profile for symbol. Cycle not started.")
+        print(f"Cannot start L0 for {symbol_name}: Symbol not configured or unavailable.")
+        return
+    config = profile.config
+    print(f"Attempting to start L0 {'BUY' if is_buy_L0 else 'SELL'} cycle for {symbol_name}...")
+    logger.info(f"START_L0_INIT ({symbol_name}): Attempting L0 {'BUY' if is_buy_L0 else 'SELL'} ...")
+
+    reset_cycle_state_for_symbol(symbol_name, called_for_new_l0_setup=True)
+
+    comment = ""
+    l0_idempotency_key = new_idempotency_key(symbol_name)
+    with global_state_lock:
+        current_level[symbol_name] = 0
+        comment = with_idempotency_key(f"{ORDER_COMMENT_PREFIX} L{current_level[symbol_name]} M{config['MAGIC_NUMBER']}", l0_idempotency_key)
+
+    lot = normalize_lot(symbol_name, config["INITIAL_LOT_SIZE"])
+    if lot is None or lot <= 0:
+        logger.error(f"START_L0_FAIL ({symbol_name}): Invalid lot size ({lot}). Cycle not started.")
+        print(f"L0 {symbol_name}: Invalid lot size ({lot}). Cycle not started.")
+        return
+
+    ladder_plan, max_fundable_level = (), -1
+    l0_tick = broker.symbol_info_tick(profile.symbol); account = broker.account_info()
+    if l0_tick: update_market_stats(profile.symbol, l0_tick)
+    if uses_market_stats(config):
+        stats_view = journaled_value(f"market:{symbol_name}", lambda: market_stats_view(profile.symbol, profile.point))
+        market_refusal = check_market_conditions(config, stats_view) if stats_view else None
+        if market_refusal:
+            logger.warning(f"START_L0_MARKET ({symbol_name}): {market_refusal} Cycle not started.")
+            print(f"Cannot start L0 for {symbol_name}: {market_refusal}")
+            journal_event("L0_BLOCKED", symbol_name, reason=market_refusal)
+            if retry_if_market_blocked: park_symbol_for_retry(symbol_name, MARKET_BLOCK_RETRY_SECONDS, market_refusal)
+            return
+        distance_scale = market_distance_scale(config, stats_view)
+        if distance_scale != 1.0:
+            profile = scale_profile_distances(profile, distance_scale)
+            logger.info(f"START_L0_MARKET ({symbol_name}): ATR {stats_view['atr'] / config['PIP_MULTIPLIER']:.1f} pips, trigger/TP/SL distances scaled x{distance_scale:.2f} for this cycle.")
+    if l0_tick and account:
+        ladder_plan, max_fundable_level = plan_ladder_margin(symbol_name, config, lot, l0_tick.ask, usable_free_margin(account))
+        if max_fundable_level < 0 and ladder_plan:
+            logger.error(f"START_L0_MARGIN ({symbol_name}): L0 needs {ladder_plan[0].margin:.2f} margin, usable free margin is {usable_free_margin(account):.2f}. Cycle not started.")
+            print(f"Cannot start L0 for {symbol_name}: insufficient free margin for {lot} lots.")
+            return
+        deepest_level = config["MAX_TRADES_IN_CYCLE"] - 1
+        if max_fundable_level < deepest_level:
+            logger.warning(f"START_L0_MARGIN ({symbol_name}): Free margin funds L0-L{max_fundable_level} of L{deepest_level}; deeper levels will be refused.")
+        else:
+            logger.info(f"START_L0_MARGIN ({symbol_name}): Free margin funds the full ladder (L0-L{deepest_level}).")
+    else:
+        logger.warning(f"START_L0_MARGIN ({symbol_name}): No tick or account info; ladder funding not planned.")
+
+    order_result = place_market_order(symbol_name, is_buy_L0, lot, profile, comment, l0_idempotency_key)
+
+    if order_result:
+        pos_details_snapshot = get_position_details_from_order_result(symbol_name, order_result, comment, profile)
+        if pos_details_snapshot:
+            l0_actual_direction_for_tracking = False
+            with global_state_lock:
+                is_cycle_active[symbol_name] = True
+                cycle_symbol_profile[symbol_name] = profile
+                cycle_ladder_plan[symbol_name] = ladder_plan
+                cycle_max_fundable_level[symbol_name] = max_fundable_level
+                _update_margin_headroom(symbol_name, account)
+                active_position_ticket[symbol_name] = pos_details_snapshot.ticket
+                active_position_entry_price[symbol_name] = pos_details_snapshot.price_open
+                active_position_lot_size[symbol_name] = pos_details_snapshot.volume
+                active_position_is_buy[symbol_name] = (pos_details_snapshot.type == broker.POSITION_TYPE_BUY)
+
+                LAST_L0_WAS_BUY[symbol_name] = active_position_is_buy[symbol_name]
+                l0_actual_direction_for_tracking = active_position_is_buy[symbol_name]
+
+                cycle_open_position_tickets[symbol_name] = [pos_details_snapshot.ticket]
+                cycle_L0_entry_price[symbol_name] = pos_details_snapshot.price_open
+                journal_event("L0_START", symbol_name, pos=pos_details_snapshot.ticket, buy=LAST_L0_WAS_BUY[symbol_name], price=pos_details_snapshot.price_open)
+                logger.info(f"START_L0_SUCCESS ({symbol_name}): L0 {'BUY' if LAST_L0_WAS_BUY[symbol_name] else 'SELL'} cycle active. Pos: {pos_details_snapshot.ticket}.")
+                print(f"L0 {'BUY' if LAST_L0_WAS_BUY[symbol_name] else 'SELL'} cycle active for {symbol_name}. Pos: {pos_details_snapshot.ticket}.")
+
+            _init_cycle_tracking(symbol_name, l0_actual_direction_for_tracking)
+            record_cycle_position(symbol_name, pos_details_snapshot.ticket, 0)
+            place_single_next_pending_order(symbol_name, pos_details_snapshot)
+        else:
+            logger.error(f"START_L0_FAIL ({symbol_name}): L0 market order sent (Order #{order_result.order}), but pos details not confirmed. Cycle aborted.")
+            print(f"L0 market order sent for {symbol_name}, but position not confirmed. Cycle aborted.")
+    else:
+        logger.error(f"START_L0_FAIL ({symbol_name}): L0 market order failed. Cycle not started.")
+        print(f"L0 market order failed for {symbol_name}. Cycle not started.")
+
+def manage_active_cycle(symbol_name, snapshot):
+    """Trap Cycle decision step for one symbol: reconciles state against the pass snapshot and returns OrderIntents."""
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False):
+            return []
+
+        log_msg_parts = [
+            f"MANAGE_CYCLE_ENTER ({symbol_name}):",
+            f"L{current_level.get(symbol_name,0)},",
+            f"ActivePos: {active_position_ticket.get(symbol_name,0)},",
+            f"Pending: {active_pending_order_ticket.get(symbol_name,0)},",
+            f"OpenTickets: {list(cycle_open_position_tickets.get(symbol_name, []))}"
+        ]
+        logger.debug(" ".join(log_msg_parts))
+
+    config = get_cycle_config(symbol_name)
+    if config is None:
+        logger.error(f"MANAGE_CYCLE ({symbol_name}): Symbol no longer configured and no profile pinned. Cannot reconcile this pass.")
+        return []
+
+    broker_symbol = ladder_symbol(symbol_name)
+    current_broker_positions = snapshot_positions(snapshot, broker_symbol, config["MAGIC_NUMBER"]) # This ladder's share of the symbol snapshot
+    current_broker_pos_tickets_set = {p.ticket for p in current_broker_positions}
+    # Passes are long enough for the REPL to close and restart this ladder after the snapshot was taken, so a tracked
+    # ticket missing from it is confirmed gone with a direct lookup before it is pruned.
+    with global_state_lock:
+        tickets_missing_from_snapshot = [t for t in cycle_open_position_tickets.get(symbol_name, []) if t not in current_broker_pos_tickets_set]
+    for missing_ticket in tickets_missing_from_snapshot:
+        if broker.positions_get(ticket=missing_ticket):
+            logger.debug(f"MANAGE_RECONCILE ({symbol_name}): Pos {missing_ticket} opened after the pass snapshot. Kept.")
+            current_broker_pos_tickets_set.add(missing_ticket)
+
+    _trigger_reset = False
+    _trigger_closeall_reset = False
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False): return []
+
+        initial_tracked_count = len(cycle_open_position_tickets.get(symbol_name, []))
+        current_tracked_tickets_snapshot = cycle_open_position_tickets.get(symbol_name, [])
+        valid_tracked_open_pos_tickets = [t for t in current_tracked_tickets_snapshot if t in current_broker_pos_tickets_set]
+
+        if len(valid_tracked_open_pos_tickets) != initial_tracked_count:
+            logger.debug(f"MANAGE_RECONCILE ({symbol_name}): Open positions reconciled. Was: {initial_tracked_count}, Now: {len(valid_tracked_open_pos_tickets)}")
+        cycle_open_position_tickets[symbol_name] = valid_tracked_open_pos_tickets
+        if current_broker_positions:
+            cycle_floating_pnl[symbol_name] = sum(p.profit + p.swap for p in current_broker_positions if p.ticket in valid_tracked_open_pos_tickets)
+        else:
+            cycle_floating_pnl[symbol_name] = 0.0
+        _update_margin_headroom(symbol_name, snapshot.account)
+
+        no_open_positions_after_reconcile = not cycle_open_position_tickets.get(symbol_name, [])
+        pending_order_exists_after_reconcile = active_pending_order_ticket.get(symbol_name, 0) != 0
+
+        _trigger_reset = no_open_positions_after_reconcile and not pending_order_exists_after_reconcile
+        _trigger_closeall_reset = no_open_positions_after_reconcile and pending_order_exists_after_reconcile
+
+    if _trigger_reset:
+        logger.info(f"MANAGE_END_CONDITION ({symbol_name}): All positions closed (reconciled) and no pending order. Resetting.")
+        reset_cycle_state_for_symbol(symbol_name); return []
+    if _trigger_closeall_reset:
+        logger.info(f"MANAGE_END_CONDITION ({symbol_name}): All positions closed (reconciled), but pending order exists. Closing all & Resetting.")
+        return [OrderIntent(INTENT_CLOSE_CYCLE, symbol_name)]
+
+    tick = snapshot.ticks.get(broker_symbol)
+    if not tick: logger.error(f"MANAGE_TICK_FAIL ({symbol_name}): Could not get tick for TP check."); return []
+
+    _tp_hit_detected = False
+    tickets_for_tp_check_snapshot = []
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False): return []
+        tickets_for_tp_check_snapshot = list(cycle_open_position_tickets.get(symbol_name, []))
+
+    positions_by_ticket = {p.ticket: p for p in current_broker_positions}
+    for pos_ticket in tickets_for_tp_check_snapshot:
+        pos = positions_by_ticket.get(pos_ticket)
+        if pos is not None:
+            if pos.tp > 0:
+                tp_hit = (pos.type == broker.POSITION_TYPE_BUY and tick.bid >= pos.tp) or \
+                         (pos.type == broker.POSITION_TYPE_SELL and tick.ask <= pos.tp)
+                if tp_hit:
+                    logger.info(f"MANAGE_TP_HIT ({symbol_name}): TP HIT detected for pos #{pos.ticket}! Cycle WIN!")
+                    journal_event("TP_HIT", symbol_name, pos=pos.ticket, tp=pos.tp, bid=tick.bid, ask=tick.ask)
+                    _tp_hit_detected = True; break
+
+    if _tp_hit_detected:
+        return [OrderIntent(INTENT_CLOSE_CYCLE, symbol_name, outcome="WIN")]
+
+    newly_opened_position_from_pending_snapshot = None
+    _pending_ticket_to_clear_state = 0
+
+    pending_ticket_to_check_snapshot = 0
+    with global_state_lock:
+        if not is_cycle_active.get(symbol_name, False): return []
+        pending_ticket_to_check_snapshot = active_pending_order_ticket.get(symbol_name, 0)
+
+    # A pending order still live in the snapshot needs no history lookup this pass.
+    tracked_pending_is_live = any(
+        o.ticket == pending_ticket_to_check_snapshot and o.type in [broker.ORDER_TYPE_BUY_STOP, broker.ORDER_TYPE_SELL_STOP] and o.state == broker.ORDER_STATE_PLACED
+        for o in snapshot_orders(snapshot, broker_symbol, config["MAGIC_NUMBER"])
+    )
+    if pending_ticket_to_check_snapshot != 0 and not tracked_pending_is_live:
+        history_order_info_list = broker.history_orders_get(ticket=pending_ticket_to_check_snapshot)
+        if history_order_info_list and len(history_order_info_list) > 0:
+            history_order_info = history_order_info_list[0]
+            order_type_str = {broker.ORDER_TYPE_BUY_STOP: "BUY_STOP", broker.ORDER_TYPE_SELL_STOP: "SELL_STOP"}.get(history_order_info.type, f"PENDING_TYPE_{history_order_info.type}")
+
+            if history_order_info.state == broker.ORDER_STATE_FILLED:
+                logger.info(f"MANAGE_PENDING_FILLED ({symbol_name}): Tracked Pending Order {pending_ticket_to_check_snapshot} ({order_type_str}) FILLED (Order Ticket: {history_order_info.ticket}). State: {history_order_info.state}, PositionID in Order: {history_order_info.position_id}")
+
+                bot_sleep(1.0) # Increased sleep duration slightly
+
+                current_broker_positions_after_fill = tuple(p for p in broker.positions_get(symbol=broker_symbol) or () if p.magic == config["MAGIC_NUMBER"])
+                open_tickets_snapshot_for_fill_check = []
+                with global_state_lock:
+                    if not is_cycle_active.get(symbol_name, False):
+                        logger.warning(f"MANAGE_PENDING_FILLED ({symbol_name}): Cycle became inactive while processing filled pending order {pending_ticket_to_check_snapshot}. Aborting identification.")
+                        return []
+                    open_tickets_snapshot_for_fill_check = list(cycle_open_position_tickets.get(symbol_name, []))
+
+                # --- Attempt 1: Use position_id directly from the filled order history ---
+                if history_order_info.position_id != 0 and current_broker_positions_after_fill:
+                    for pos_check in current_broker_positions_after_fill:
+                        if pos_check.ticket == history_order_info.position_id:
+                            if pos_check.ticket not in open_tickets_snapshot_for_fill_check:
+                                newly_opened_position_from_pending_snapshot = pos_check
+                                logger.info(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Found position {pos_check.ticket} via history_order_info.position_id ({history_order_info.position_id}).")
+                                break
+                            else:
+                                logger.warning(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Position {pos_check.ticket} (from history_order_info.position_id) already in tracked list: {open_tickets_snapshot_for_fill_check}.")
+
+                # --- Attempt 2: Use deals associated with the filled order ---
+                if not newly_opened_position_from_pending_snapshot:
+                    logger.info(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Position not found via order's position_id. Trying via deals for order {history_order_info.ticket}.")
+                    deals = broker.history_deals_get(order=history_order_info.ticket)
+
+                    if deals:
+                        logger.debug(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Found {len(deals)} deals for order {history_order_info.ticket}.")
+                        for deal in sorted(deals, key=lambda d: d.time_msc, reverse=True): # Process most recent deal first
+                            logger.debug(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Checking deal {deal.ticket}, Deal PositionID: {deal.position_id}, Deal Type: {deal.type}, Deal Entry: {deal.entry}")
+                            if deal.position_id != 0:
+                                if current_broker_positions_after_fill: # Use the already fetched list
+                                    for pos_check in current_broker_positions_after_fill:
+                                        if pos_check.ticket == deal.position_id:
+                                            if pos_check.ticket not in open_tickets_snapshot_for_fill_check:
+                                                newly_opened_position_from_pending_snapshot = pos_check
+                                                logger.info(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Found position {pos_check.ticket} via deal {deal.ticket} (deal.position_id: {deal.position_id}).")
+                                                break
+                                            else:
+                                                logger.warning(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Position {pos_check.ticket} (from deal {deal.ticket}) already in tracked list: {open_tickets_snapshot_for_fill_check}.")
+                                    if newly_opened_position_from_pending_snapshot:
+                                        break
+                    else:
+                        logger.info(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): No deals found for order {history_order_info.ticket}. This is unusual for a filled order.")
+
+                # --- Attempt 3: Broader search for any new untracked position (Last Resort) ---
+                if not newly_opened_position_from_pending_snapshot:
+                    logger.warning(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Position not found via order's position_id or deals. Trying broad search for new untracked positions.")
+                    if current_broker_positions_after_fill:
+                        sorted_positions = sorted(current_broker_positions_after_fill, key=lambda p: p.time_msc, reverse=True)
+                        for pos_check in sorted_positions:
+                            if pos_check.magic == config["MAGIC_NUMBER"] and pos_check.symbol == broker_symbol:
+                                if pos_check.ticket not in open_tickets_snapshot_for_fill_check:
+                                    time_diff_seconds = abs(pos_check.time_msc / 1000 - history_order_info.time_done)
+                                    expected_pos_type = broker.POSITION_TYPE_BUY if history_order_info.type == broker.ORDER_TYPE_BUY_STOP else broker.POSITION_TYPE_SELL
+
+                                    if time_diff_seconds < 5.0 and pos_check.type == expected_pos_type :
+                                        newly_opened_position_from_pending_snapshot = pos_check
+                                        logger.info(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Found position {pos_check.ticket} via broad search (new, untracked, recent, matching type). Time diff: {time_diff_seconds:.2f}s.")
+                                        break
+                                    else:
+                                        logger.debug(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Candidate untracked pos {pos_check.ticket}. Time diff: {time_diff_seconds:.2f}s, OrderType: {history_order_info.type}, PosType: {pos_check.type}. Expected PosType: {expected_pos_type}. Skipping.")
+                        if not newly_opened_position_from_pending_snapshot:
+                             logger.warning(f"MANAGE_PENDING_FILLED_DEBUG ({symbol_name}): Broad search for new untracked positions also failed.")
+
+                if newly_opened_position_from_pending_snapshot:
+                    logger.info(f"MANAGE_PENDING_FILLED_SUCCESS ({symbol_name}): Pos {newly_opened_position_from_pending_snapshot.ticket} (Type: {newly_opened_position_from_pending_snapshot.type}) identified from pending order {pending_ticket_to_check_snapshot} (Type: {history_order_info.type}).")
+                    journal_event("PENDING_FILLED", symbol_name, order=pending_ticket_to_check_snapshot, pos=newly_opened_position_from_pending_snapshot.ticket)
+                else:
+                    journal_event("PENDING_FILL_UNIDENTIFIED", symbol_name, order=pending_ticket_to_check_snapshot, pos_id_in_order=history_order_info.position_id, tracked=open_tickets_snapshot_for_fill_check)
+                    journal_flush() # Make sure the evidence reaches disk even if the process dies next
+                    logger.error(f"MANAGE_PENDING_FILLED_ERROR ({symbol_name}): CRITICAL - Pending {pending_ticket_to_check_snapshot} (Order Ticket: {history_order_info.ticket}, Type: {order_type_str}) filled but UNABLE to identify resulting pos!")
+                    logger.error(f"MANAGE_PENDING_FILLED_ERROR_DETAILS ({symbol_name}): Filled Order Hist: Ticket={history_order_info.ticket}, Type={history_order_info.type}, State={history_order_info.state}, PriceOpen={history_order_info.price_open}, SL={history_order_info.sl}, TP={history_order_info.tp}, VolumeCurr={history_order_info.volume_current}, TimeDone={datetime.datetime.fromtimestamp(history_order_info.time_done)}, PosIDInOrder={history_order_info.position_id}")
+                    if current_broker_positions_after_fill:
+                        logger.error(f"MANAGE_PENDING_FILLED_ERROR_DETAILS ({symbol_name}): Current positions on broker for {symbol_name} (Magic: {config['MAGIC_NUMBER']}) ({len(current_broker_positions_after_fill)}):")
+                        for p_err in sorted(current_broker_positions_after_fill, key=lambda pos_item: pos_item.time_msc, reverse=True): # Log newest first
+                            logger.error(f"  - Pos: {p_err.ticket}, Type: {p_err.type}, Vol: {p_err.volume}, PriceOpen: {p_err.price_open}, TimeOpen: {datetime.datetime.fromtimestamp(p_err.time_msc/1000)}, Comment: '{p_err.comment}'")
+                    else:
+                        logger.error(f"MANAGE_PENDING_FILLED_ERROR_DETAILS ({symbol_name}): No positions found on broker for {symbol_name} with magic {config['MAGIC_NUMBER']} at this time.")
+                    logger.error(f"MANAGE_PENDING_FILLED_ERROR_DETAILS ({symbol_name}): Tracked open positions at time of check: {open_tickets_snapshot_for_fill_check}")
+
+                _pending_ticket_to_clear_state = pending_ticket_to_check_snapshot
+
+            # <<<< CORRECTED: Changed ORDER_STATE_CANCELLED to ORDER_STATE_CANCELED >>>>
+            elif history_order_info.state in [broker.ORDER_STATE_CANCELED, broker.ORDER_STATE_REJECTED, broker.ORDER_STATE_EXPIRED]:
+                logger.info(f"MANAGE_PENDING_INACTIVE ({symbol_name}): Pending {pending_ticket_to_check_snapshot} ({order_type_str}) inactive (State: {history_order_info.state}).")
+                _pending_ticket_to_clear_state = pending_ticket_to_check_snapshot
+        else:
+            # Not in the snapshot and not in history: re-check live orders in case it was placed after the snapshot.
+            active_broker_orders = broker.orders_get(ticket=pending_ticket_to_check_snapshot)
+            if not (active_broker_orders and len(active_broker_orders) == 1 and \
+                    active_broker_orders[0].type in [broker.ORDER_TYPE_BUY_STOP, broker.ORDER_TYPE_SELL_STOP] and \
+                    active_broker_orders[0].state == broker.ORDER_STATE_PLACED) :
+                logger.warning(f"MANAGE_PENDING_GHOST ({symbol_name}): Tracked pending {pending_ticket_to_check_snapshot} not found or not active on broker. Clearing state.")
+                _pending_ticket_to_clear_state = pending_ticket_to_check_snapshot
+
+    if _pending_ticket_to_clear_state != 0:
+        with global_state_lock:
+            if not is_cycle_active.get(symbol_name, False): return []
+            if active_pending_order_ticket.get(symbol_name, 0) == _pending_ticket_to_clear_state:
+                active_pending_order_ticket[symbol_name] = 0
+                active_pending_order_is_buy_stop[symbol_name] = None
+                logger.debug(f"MANAGE_PENDING_STATE_CLEAR ({symbol_name}): Cleared pending ticket {_pending_ticket_to_clear_state} from state.")
+                journal_event("PENDING_CLEARED", symbol_name, ticket=_pending_ticket_to_clear_state)
+
+    if newly_opened_position_from_pending_snapshot:
+        can_place_next_pending_order = False
+        with global_state_lock:
+            if not is_cycle_active.get(symbol_name, False): return []
+            logger.info(f"MANAGE_NEW_LEVEL ({symbol_name}): Processing newly opened position {newly_opened_position_from_pending_snapshot.ticket}")
+            current_level[symbol_name] += 1
+            new_level_snapshot = current_level[symbol_name]
+            journal_event("LEVEL_UP", symbol_name, level=new_level_snapshot, pos=newly_opened_position_from_pending_snapshot.ticket)
+
+            active_position_ticket[symbol_name] = newly_opened_position_from_pending_snapshot.ticket
+            active_position_entry_price[symbol_name] = newly_opened_position_from_pending_snapshot.price_open
+            active_position_lot_size[symbol_name] = newly_opened_position_from_pending_snapshot.volume
+            active_position_is_buy[symbol_name] = (newly_opened_position_from_pending_snapshot.type == broker.POSITION_TYPE_BUY)
+
+            if active_position_ticket[symbol_name] not in cycle_open_position_tickets.get(symbol_name, []):
+                cycle_open_position_tickets[symbol_name].append(active_position_ticket[symbol_name])
+
+            can_place_next_pending_order = len(cycle_open_position_tickets.get(symbol_name,[])) < config["MAX_TRADES_IN_CYCLE"]
+
+        _increment_trap_count(symbol_name)
+        record_cycle_position(symbol_name, newly_opened_position_from_pending_snapshot.ticket, new_level_snapshot)
+
+        if can_place_next_pending_order:
+            next_pending_intent = build_next_pending_intent(symbol_name, newly_opened_position_from_pending_snapshot)
+            if next_pending_intent is not None: return [next_pending_intent]
+        else:
+            logger.info(f"MANAGE_NEW_LEVEL ({symbol_name}): Max trades ({config['MAX_TRADES_IN_CYCLE']}) reached. No new pending order.")
+    return []
+
+def print_cycle_pnl_report(cycles_limit=10):
+    print(f"--- Realized P&L, last {cycles_limit} cycles ---")
+    for cycle_pnl in get_cycle_realized_pnl(limit=cycles_limit):
+        print(f"{cycle_pnl.start_time_utc} {cycle_pnl.symbol:<10} {cycle_pnl.outcome:<20} Traps: {cycle_pnl.traps:<3} Deals: {cycle_pnl.deal_count:<3} "
+              f"Profit: {cycle_pnl.profit:>10.2f} Comm: {cycle_pnl.commission:>8.2f} Swap: {cycle_pnl.swap:>8.2f} Net: {cycle_pnl.net:>10.2f}")
+    for symbol_name, (cycles_count, wins, net) in get_realized_pnl_by_symbol().items():
+        print(f"TOTAL {symbol_name:<10} Cycles: {cycles_count:<5} Wins: {wins:<5} Net: {net:.2f}")
+    print("--- End of P&L ---")
+
+# --- Watchdog ---
+# The worker records a heartbeat every loop and every ladder, and the duration / start lag of every pass. WatchdogThread
+# checks them against the budgets, restarts a dead worker, and probes the terminal (through broker.raw, so the event
+# journal is untouched). On a broken connection, or a stalled worker whose stack shows it blocked inside a terminal
+# call, it pauses management, reinitializes the terminal with exponential backoff, reconciles, and resumes. A worker
+# stalled anywhere else is only reported. Each incident is logged with its recovery time.
+WatchdogIncident = collections.namedtuple("WatchdogIncident", ["kind", "started_at", "recovery_seconds", "detail"])
+terminal_connected = threading.Event() # Cleared while the watchdog reconnects; the worker does not manage cycles meanwhile
+cycle_resync_requested = threading.Event() # Set after a reconnect; the worker re-syncs ladder state before its next pass
+worker_health_lock = threading.Lock()
+worker_health = {"heartbeat": 0.0, "pass_number": 0, "pass_started_at": None, "last_pass_duration": 0.0, "last_pass_lag": 0.0}
+watchdog_lock = threading.Lock()
+open_watchdog_incidents = {} # {kind: (started_at, detail)}
+watchdog_incident_history = collections.deque(maxlen=50)
+cycle_manager_thread = None
+
+def record_worker_heartbeat(now_ts, pass_started_at=None, pass_lag=None):
+    with worker_health_lock:
+        worker_health["heartbeat"] = now_ts
+        if pass_started_at is not None:
+            worker_health["pass_started_at"] = pass_started_at
+            worker_health["last_pass_lag"] = pass_lag
+
+def record_worker_pass_end(pass_number, pass_duration):
+    with worker_health_lock:
+        worker_health["heartbeat"] = clock.time()
+        worker_health["pass_number"] = pass_number
+        worker_health["pass_started_at"] = None
+        worker_health["last_pass_duration"] = pass_duration
+
+def start_cycle_manager_thread():
+    global cycle_manager_thread
+    record_worker_heartbeat(clock.time())
+    cycle_manager_thread = threading.Thread(target=cycle_management_worker, name="CycleManagerThread")
+    cycle_manager_thread.daemon = True
+    cycle_manager_thread.start()
+    return cycle_manager_thread
+
+def _open_incident(kind, detail):
+    with watchdog_lock:
+        if kind in open_watchdog_incidents: return False
+        open_watchdog_incidents[kind] = (clock.time(), detail)
+    logger.error(f"WATCHDOG: Incident {kind}: {detail}")
+    return True
+
+def _close_incident(kind):
+    with watchdog_lock:
+        opened = open_watchdog_incidents.pop(kind, None)
+        if opened is None: return
+        started_at, detail = opened
+        recovery_seconds = clock.time() - started_at
+        watchdog_incident_history.append(WatchdogIncident(kind, started_at, recovery_seconds, detail))
+    logger.warning(f"WATCHDOG: Incident {kind} recovered after {recovery_seconds:.1f}s.")
+
+def _terminal_is_healthy():
+    try:
+        terminal_info = broker.raw.terminal_info()
+        return terminal_info is not None and terminal_info.connected and broker.raw.account_info() is not None
+    except Exception as e:
+        logger.error(f"WATCHDOG: Terminal probe raised: {e}")
+        return False
+
+def reconcile_after_reconnect():
+    with margin_cache_lock:
+        margin_requirement_cache.clear() # Prices may have moved a lot while we were blind
+    cycle_resync_requested.set() # The worker re-syncs ladder state before its next pass
+    logger.info("WATCHDOG_RECONCILE: Ladder state will be re-synced with the broker before management resumes.")
+
+def resync_cycle_state_with_broker():
+    """
+    Run by the worker after a reconnect, before any pass: drops tracked positions the broker closed while we
+    were blind and tracked pending orders that were cancelled, rejected or expired. A pending order that filled
+    is left to the next pass, which identifies the new position and moves the ladder up a level.
+    """
+    with global_state_lock:
+        active_ladders = [sym for sym, is_active in is_cycle_active.items() if is_active]
+    for symbol_name in active_ladders:
+        config = get_cycle_config(symbol_name)
+        if config is None: continue
+        broker_symbol = ladder_symbol(symbol_name)
+        broker_positions = broker.positions_get(symbol=broker_symbol)
+        live_orders = broker.orders_get(symbol=broker_symbol)
+        if not (terminal_answered(broker_positions) and terminal_answered(live_orders)):
+            logger.warning(f"WATCHDOG_RECONCILE ({symbol_name}): Terminal did not return positions/orders ({broker.last_error()}). Left for the next pass.")
+            continue
+        open_tickets = {p.ticket for p in broker_positions or () if p.magic == config["MAGIC_NUMBER"]}
+        live_order_tickets = {o.ticket for o in live_orders or () if o.magic == config["MAGIC_NUMBER"]}
+        with global_state_lock:
+            tracked_pending_ticket = active_pending_order_ticket.get(symbol_name, 0)
+        pending_is_dead = False
+        if tracked_pending_ticket != 0 and tracked_pending_ticket not in live_order_tickets:
+            history_order_info_list = broker.history_orders_get(ticket=tracked_pending_ticket)
+            pending_is_dead = bool(history_order_info_list) and history_order_info_list[0].state in [broker.ORDER_STATE_CANCELED, broker.ORDER_STATE_REJECTED, broker.ORDER_STATE_EXPIRED]
+
+        with global_state_lock:
+            if not is_cycle_active.get(symbol_name, False): continue
+            tracked_tickets = cycle_open_position_tickets.get(symbol_name, [])
+            closed_tickets = [t for t in tracked_tickets if t not in open_tickets]
+            cycle_open_position_tickets[symbol_name] = [t for t in tracked_tickets if t in open_tickets]
+            pending_cleared = pending_is_dead and active_pending_order_ticket.get(symbol_name, 0) == tracked_pending_ticket
+            if pending_cleared:
+                active_pending_order_ticket[symbol_name] = 0
+                active_pending_order_is_buy_stop[symbol_name] = None
+                journal_event("PENDING_CLEARED", symbol_name, ticket=tracked_pending_ticket)
+        logger.info(f"WATCHDOG_RECONCILE ({symbol_name}): {len(tracked_tickets) - len(closed_tickets)} of {len(tracked_tickets)} tracked positions still open"
+                    f"{f', closed while disconnected: {closed_tickets}' if closed_tickets else ''}"
+                    f"{f'; pending {tracked_pending_ticket} no longer live, cleared' if pending_cleared else ''}.")
+
+def reconnect_terminal_with_backoff():
+    terminal_connected.clear()
+    backoff_seconds = RECONNECT_BACKOFF_INITIAL_SECONDS
+    attempt = 0
+    while not shutdown_event.is_set():
+        attempt += 1
+        try:
+            broker.raw.shutdown()
+            initialized = broker.raw.initialize()
+        except Exception as e:
+            logger.error(f"WATCHDOG: Reconnect attempt {attempt} raised: {e}")
+            initialized = False
+        if initialized and _terminal_is_healthy():
+            logger.info(f"WATCHDOG: Terminal reinitialized on attempt {attempt}.")
+            reconcile_after_reconnect()
+            terminal_connected.set()
+            return True
+        logger.warning(f"WATCHDOG: Reconnect attempt {attempt} failed ({broker.raw.last_error()}). Retrying in {backoff_seconds:.0f}s.")
+        if clock.wait(shutdown_event, timeout=backoff_seconds): break
+        backoff_seconds = min(backoff_seconds * 2, RECONNECT_BACKOFF_MAX_SECONDS)
+    return False
+
+def watchdog_worker():
+    logger.info("Watchdog thread started.")
+    last_terminal_check_time = 0.0
+    last_evaluated_pass = 0
+    while not clock.wait(shutdown_event, timeout=WATCHDOG_CHECK_INTERVAL_SECONDS):
+        now = clock.time()
+        with worker_health_lock:
+            health = dict(worker_health)
+
+        if health["pass_number"] != last_evaluated_pass:
+            last_evaluated_pass = health["pass_number"]
+            if health["last_pass_duration"] > PASS_DURATION_BUDGET_SECONDS:
+                logger.warning(f"WATCHDOG: Pass {last_evaluated_pass} took {health['last_pass_duration']:.2f}s (budget {PASS_DURATION_BUDGET_SECONDS:.1f}s).")
+            if health["last_pass_lag"] > PASS_LAG_BUDGET_SECONDS:
+                logger.warning(f"WATCHDOG: Pass {last_evaluated_pass} started {health['last_pass_lag']:.2f}s late (budget {PASS_LAG_BUDGET_SECONDS:.1f}s).")
+
+        if cycle_manager_thread is not None and not cycle_manager_thread.is_alive() and not shutdown_event.is_set():
+            _open_incident("WORKER_DEAD", f"{cycle_manager_thread.name} exited unexpectedly. Restarting it.")
+            start_cycle_manager_thread()
+            continue
+
+        heartbeat_age = now - health["heartbeat"]
+        worker_stalled = heartbeat_age > WORKER_STALL_TIMEOUT_SECONDS
+        if worker_stalled:
+            worker_ident = cycle_manager_thread.ident if cycle_manager_thread is not None else None
+            stalled_at = " > ".join(_sample_thread_stack(worker_ident)[-3:]) if worker_ident else "unknown"
+            pass_age = "no pass running" if health["pass_started_at"] is None else f"pass running for {now - health['pass_started_at']:.0f}s"
+            blocked_call = broker_calls_in_flight.get(worker_ident) if worker_ident is not None else None
+            if blocked_call is not None:
+                blocked_call_name, blocked_call_started_at = blocked_call
+                if _open_incident("WORKER_BLOCKED_IN_TERMINAL", f"No heartbeat for {heartbeat_age:.0f}s ({pass_age}), blocked in {blocked_call_name}() for {now - blocked_call_started_at:.0f}s at {stalled_at}. Reinitializing the terminal."):
+                    # A worker blocked in an MT5 call usually means a dead IPC link; reinitializing releases the call.
+                    reconnect_terminal_with_backoff()
+                    last_terminal_check_time = clock.time()
+            else:
+                _open_incident("WORKER_STALLED", f"No heartbeat for {heartbeat_age:.0f}s ({pass_age}), at {stalled_at}. Not in a terminal call; leaving the terminal alone.")
+        else:
+            _close_incident("WORKER_DEAD")
+            _close_incident("WORKER_STALLED")
+            _close_incident("WORKER_BLOCKED_IN_TERMINAL")
+
+        if now - last_terminal_check_time >= TERMINAL_CHECK_INTERVAL_SECONDS:
+            last_terminal_check_time = now
+            if not _terminal_is_healthy():
+                _open_incident("TERMINAL_DISCONNECTED", f"Terminal not connected or not answering (last error {broker.raw.last_error()}). Pausing management and reconnecting.")
+                if reconnect_terminal_with_backoff(): _close_incident("TERMINAL_DISCONNECTED")
+                last_terminal_check_time = clock.time()
+    logger.info("Watchdog thread stopped.")
+
+def format_worker_health():
+    with worker_health_lock:
+        health = dict(worker_health)
+    with watchdog_lock:
+        open_incidents = dict(open_watchdog_incidents)
+        incident_history = list(watchdog_incident_history)
+    lines = [f"Worker: {'alive' if cycle_manager_thread is not None and cycle_manager_thread.is_alive() else 'NOT RUNNING'}, "
+             f"heartbeat {clock.time() - health['heartbeat']:.1f}s ago, pass {health['pass_number']}, "
+             f"last duration {health['last_pass_duration']:.3f}s, last lag {health['last_pass_lag']:.3f}s. "
+             f"Terminal: {'connected' if terminal_connected.is_set() else 'RECONNECTING'}."]
+    lines.append(f"  Ladders by cadence: {format_scheduler_tiers()}.")
+    for kind, (started_at, detail) in open_incidents.items():
+        lines.append(f"  OPEN {kind} for {clock.time() - started_at:.0f}s: {detail}")
+    for incident in incident_history[-5:]:
+        lines.append(f"  {datetime.datetime.fromtimestamp(incident.started_at).strftime('%Y-%m-%d %H:%M:%S')} {incident.kind}, recovered after {incident.recovery_seconds:.1f}s")
+    return "\n".join(lines)
+# --- End Watchdog ---
+
+# --- Cycle Management Worker ---
+def cycle_management_worker(run_until_ts=None):
+    """Main management loop. run_until_ts (clock time) ends it without a shutdown, e.g. at the end of a simulated day."""
+    logger.info("Cycle management worker thread started.")
+    last_manage_time = clock.time()
+    last_schedule_time = last_manage_time
+    last_idle_sample_time = last_manage_time
+    last_config_check_time = last_manage_time
+    pass_number = worker_health["pass_number"] # Continues the count when the watchdog restarts the worker
+    while not shutdown_event.is_set() and (run_until_ts is None or clock.time() < run_until_ts):
+        current_time_worker = clock.time()
+        record_worker_heartbeat(current_time_worker)
+        if not terminal_connected.is_set():
+            # Watchdog is reconnecting: no management on a blind terminal; resume right after reconciliation.
+            last_schedule_time = current_time_worker - SCHEDULER_TICK_SECONDS
+            last_manage_time = current_time_worker - WORKER_PASS_INTERVAL_SECONDS
+            clock.wait(shutdown_event, timeout=0.2)
+            continue
+        if cycle_resync_requested.is_set():
+            cycle_resync_requested.clear()
+            journal_command("resync", None)
+            try:
+                resync_cycle_state_with_broker()
+            except Exception as e:
+                logger.error(f"WORKER_THREAD: Error re-syncing ladder state after reconnect: {e}", exc_info=True)
+
+        try:
+            rotate_event_journal_if_new_day()
+        except Exception as e:
+            logger.error(f"WORKER_THREAD: Error rotating event journal: {e}", exc_info=True)
+
+        symbols_due_this_tick = None
+        if current_time_worker - last_schedule_time >= SCHEDULER_TICK_SECONDS:
+            schedule_lag = current_time_worker - last_schedule_time - SCHEDULER_TICK_SECONDS
+            last_schedule_time = current_time_worker
+            active_symbols = active_strategy_symbols()
+            try:
+                refresh_level_distances(active_symbols, current_time_worker)
+            except Exception as e:
+                logger.error(f"WORKER_THREAD: Error refreshing level distances: {e}", exc_info=True)
+            symbols_due_this_tick = select_due_symbols(active_symbols, current_time_worker)
+        # A pass runs when some ladder is due, and at least every WORKER_PASS_INTERVAL_SECONDS to keep status and journal fresh.
+        if symbols_due_this_tick is not None and (symbols_due_this_tick or current_time_worker - last_manage_time >= WORKER_PASS_INTERVAL_SECONDS):
+            record_worker_heartbeat(current_time_worker, pass_started_at=current_time_worker, pass_lag=schedule_lag)
+            active_symbols_to_manage_this_run = symbols_due_this_tick
+
+            if active_symbols_to_manage_this_run:
+                journal_pass(active_symbols_to_manage_this_run)
+                try:
+                    run_strategy_pass(active_symbols_to_manage_this_run)
+                except Exception as e:
+                    logger.error(f"WORKER_THREAD: Error during strategy pass: {e}", exc_info=True)
+                mark_symbols_managed(active_symbols_to_manage_this_run, current_time_worker)
+
+            pass_number += 1
+            try:
+                publish_status_snapshot(pass_number)
+            except Exception as e:
+                logger.error(f"WORKER_THREAD: Error publishing status snapshot: {e}", exc_info=True)
+            journal_flush()
+            record_worker_pass_end(pass_number, clock.time() - current_time_worker)
+            last_manage_time = current_time_worker
+
+        if current_time_worker - last_idle_sample_time >= MARKET_STATS_IDLE_SAMPLE_SECONDS:
+            try:
+                sample_idle_market_stats(active_strategy_symbols())
+            except Exception as e:
+                logger.error(f"WORKER_THREAD: Error sampling market statistics: {e}", exc_info=True)
+            last_idle_sample_time = current_time_worker
+
+        if current_time_worker - last_config_check_time >= CONFIG_RELOAD_CHECK_INTERVAL_SECONDS:
+            try:
+                reload_bot_config_if_changed()
+            except Exception as e:
+                logger.error(f"WORKER_THREAD: Error during config reload check: {e}", exc_info=True)
+            last_config_check_time = current_time_worker
+
+        try:
+            run_session_scheduler()
+        except Exception as e:
+            logger.error(f"WORKER_THREAD: Error in session scheduler: {e}", exc_info=True)
+
+        clock.wait(shutdown_event, timeout=max(0.01, min(0.2, last_schedule_time + SCHEDULER_TICK_SECONDS - clock.time())))
+    logger.info("Cycle management worker thread stopped.")
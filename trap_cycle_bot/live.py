@@ -0,0 +1,293 @@
+"""Live bot: connects to the MT5 terminal, starts the worker threads and runs the command prompt."""
+import os
+import random
+import sys
+import threading
+
+from . import engine
+from .engine import logger
+
+def main(argv=None):
+    """Runs the live bot until 'exit' or Ctrl+C. Returns the process exit code."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 2 and argv[0] == "--replay":
+        # Kept for `python forex.py --replay <events_YYYYMMDD.jsonl.gz> [--profile <stats file>]`
+        from . import tools
+        return tools.main(["replay"] + argv[1:])
+
+    log_file_path = engine.setup_logging()
+    if not engine.initialize_mt5_connection(): return 1
+
+    engine.initialize_all_symbol_states()
+    engine.load_and_apply_bot_config()
+    engine.publish_status_snapshot()
+    engine.ensure_cycle_data_log_exists()
+
+    print(f"\nPython Multi-Symbol Trap Cycle Bot (v10.9.3 - Corrected Lot Sizing)");
+    print(f"General trading restricted to local time: {engine.TRADING_START_HOUR:02d}:00 - {engine.TRADING_END_HOUR:02d}:00 (calendar timezone: {engine.CALENDAR_SETTINGS['timezone']}).")
+
+    symbols_24_7 = [s for s, c in engine.SYMBOL_CONFIGS.items() if c.get("TRADE_24_7", False)]
+    if symbols_24_7:
+        print(f"24/7 TRADING ENABLED for: {', '.join(symbols_24_7)}")
+    for sym_session in engine.SYMBOL_CONFIGS.keys():
+        print(f"  Session {sym_session}: {engine.describe_symbol_session(sym_session)}")
+
+    print(f"Symbol config file: {engine.SYMBOL_CONFIG_FILE} (checked for changes every {engine.CONFIG_RELOAD_CHECK_INTERVAL_SECONDS:.0f}s, 'reload' to force)")
+    print(f"Cycle data will be logged to: {engine.CYCLE_DATA_CSV_FILE}")
+    print(f"Deals for realized P&L are journaled to: {engine.DEAL_JOURNAL_DB_FILE} ('pnl [n]' for the last n cycles)")
+    print(f"Managing symbols: {list(engine.SYMBOL_CONFIGS.keys())}")
+    print(f"Symbol Aliases: {list(engine.SYMBOL_ALIASES.keys())}")
+    print(f"AUTO-RESTART: {'ENABLED' if engine.AUTO_RESTART_COMPLETED_CYCLES else 'DISABLED'}.")
+    print(f"Watchdog: pass budget {engine.PASS_DURATION_BUDGET_SECONDS:.1f}s, stall after {engine.WORKER_STALL_TIMEOUT_SECONDS:.0f}s, terminal checked every {engine.TERMINAL_CHECK_INTERVAL_SECONDS:.0f}s ('health' for details)")
+    print(f"Logs are being saved to '{log_file_path}'")
+    profiler_signal_name = engine.install_profiler_signal_handler()
+    print(f"Sampling profiler: 'profile start|stop'{f' or {profiler_signal_name} (pid {os.getpid()})' if profiler_signal_name else ''}; output in {engine.PROFILER_OUTPUT_FOLDER}")
+
+    engine.start_cycle_manager_thread()
+    logger.info("Cycle management worker thread has been started.")
+
+    watchdog_thread = threading.Thread(target=engine.watchdog_worker, name="WatchdogThread")
+    watchdog_thread.daemon = True
+    watchdog_thread.start()
+
+    deal_ingester_thread = threading.Thread(target=engine.deal_journal_ingester_worker, name="DealJournalIngesterThread")
+    deal_ingester_thread.daemon = True
+    deal_ingester_thread.start()
+
+    try:
+        while True:
+            # (The rest of your main loop remains unchanged)
+            status_snapshot = engine.get_status_snapshot()
+            active_symbols_list_prompt = [sym for sym, sym_status in status_snapshot.symbols.items() if sym_status.is_active]
+            any_cycle_running_now = bool(active_symbols_list_prompt)
+            
+            trading_hours_status_str = "OPEN" if engine.is_general_trading_hours() else "CLOSED"
+            prompt_parts = [f"\nGeneral Trading Hours ({engine.TRADING_START_HOUR:02d}:00-{engine.TRADING_END_HOUR:02d}:00 Local): {trading_hours_status_str}."]
+            if any_cycle_running_now:
+                prompt_parts.append(f"Active: {', '.join(active_symbols_list_prompt)}.")
+            else:
+                prompt_parts.append("All cycles inactive.")
+            prompt_parts.append("Cmd (buy/sell [s|s#n]/status [s]/statusall/closeall [s|s#n|all]/pnl [n]/health/reload/profile start|stop/exit):")
+            prompt_message = " ".join(prompt_parts) + " "
+
+            cmd_full = ""
+            try:
+                cmd_full = input(prompt_message).strip()
+            except EOFError: print("EOF received, exiting."); logger.info("EOF received, shutting down."); break
+            except KeyboardInterrupt:
+                print("\nCommand input cancelled. Type 'exit' to quit or another command.")
+                logger.warning("User interrupted command input (Ctrl+C at prompt).")
+                continue 
+
+            if cmd_full: 
+                logger.info(f"USER_CMD_RAW: '{cmd_full}'")
+                parts = cmd_full.split(); command_action = parts[0].lower()
+                user_typed_symbol_or_alias = parts[1] if len(parts) > 1 else ""
+                actual_broker_symbol = None
+                
+                if command_action == 'exit': logger.info("USER_CMD: 'exit'"); break
+
+                if command_action == 'pnl':
+                    logger.info(f"USER_CMD: 'pnl {user_typed_symbol_or_alias}'")
+                    cycles_limit = int(user_typed_symbol_or_alias) if user_typed_symbol_or_alias.isdigit() else 10
+                    try:
+                        engine.ingest_new_deals()
+                        engine.print_cycle_pnl_report(cycles_limit)
+                    except Exception as e:
+                        logger.error(f"USER_CMD: Error building P&L report: {e}", exc_info=True); print(f"P&L report failed: {e}")
+                    continue
+
+                if command_action == 'health':
+                    logger.info("USER_CMD: 'health'")
+                    print(engine.format_worker_health())
+                    continue
+
+                if command_action == 'profile':
+                    profile_action = user_typed_symbol_or_alias.lower() or ("stop" if engine.is_sampling_profiler_running() else "start")
+                    logger.info(f"USER_CMD: 'profile {profile_action}'")
+                    if profile_action == 'start':
+                        print("Sampling profiler started." if engine.start_sampling_profiler() else "Profiler already running or worker thread not found.")
+                    elif profile_action == 'stop':
+                        if engine.stop_sampling_profiler() and engine.last_profile_output_paths:
+                            print(f"Profile written: {engine.last_profile_output_paths[0]} (collapsed stacks), {engine.last_profile_output_paths[1]} (summary)")
+                        else: print("Sampling profiler is not running.")
+                    else: print("Usage: profile [start|stop]")
+                    continue
+
+                if command_action == 'reload':
+                    logger.info("USER_CMD: 'reload'")
+                    if engine.load_and_apply_bot_config():
+                        print(f"Config reloaded from {engine.SYMBOL_CONFIG_FILE}. Applies to new cycles only.")
+                    else:
+                        print("Config not reloaded. Check the log for details.")
+                    continue
+
+                requested_ladder_key = None # Set when the user names one ladder, e.g. 'eur#2'
+                if user_typed_symbol_or_alias:
+                    typed_symbol_part, _, typed_ladder_part = user_typed_symbol_or_alias.partition(engine.LADDER_KEY_SEPARATOR)
+                    resolved_alias = engine.SYMBOL_ALIASES.get(typed_symbol_part.lower())
+                    if resolved_alias: actual_broker_symbol = resolved_alias
+                    elif typed_symbol_part.upper() in engine.SYMBOL_CONFIGS: actual_broker_symbol = typed_symbol_part.upper()
+                    if actual_broker_symbol and typed_ladder_part:
+                        requested_ladder_key = engine.ladder_key(actual_broker_symbol, int(typed_ladder_part)) if typed_ladder_part.isdigit() else None
+                        if requested_ladder_key not in engine.symbol_ladder_keys(actual_broker_symbol):
+                            print(f"Unknown ladder '{user_typed_symbol_or_alias}'. {actual_broker_symbol} has ladders: {engine.symbol_ladder_keys(actual_broker_symbol)}")
+                            continue
+                    
+                    if not actual_broker_symbol and not (command_action in ['statusall', 'closeall'] and user_typed_symbol_or_alias.lower() == 'all'):
+                        print(f"Unknown symbol or alias: '{user_typed_symbol_or_alias}'. Valid: {list(engine.SYMBOL_CONFIGS.keys())} & {list(engine.SYMBOL_ALIASES.keys())}"); 
+                        logger.warning(f"Unknown symbol command: {user_typed_symbol_or_alias}"); continue
+                    elif actual_broker_symbol and actual_broker_symbol not in engine.SYMBOL_CONFIGS: 
+                        print(f"Alias maps to '{actual_broker_symbol}', which is not in SYMBOL_CONFIGS."); 
+                        logger.warning(f"Bad alias mapping or config: {user_typed_symbol_or_alias} -> {actual_broker_symbol}"); continue
+                elif command_action in ['buy', 'sell', 'status', 'closeall'] and not (command_action == 'closeall' and user_typed_symbol_or_alias.lower() == 'all'):
+                     print(f"Specify symbol/alias for '{command_action}' or use 'all' for closeall/statusall."); 
+                     logger.warning(f"Command '{command_action}' missing symbol."); continue
+                
+                if command_action == 'buy' or command_action == 'sell': 
+                    if actual_broker_symbol:
+                        symbol_for_ladder = actual_broker_symbol
+                        actual_broker_symbol = requested_ladder_key or engine.next_free_ladder_key(symbol_for_ladder)
+                        if actual_broker_symbol is None:
+                            print(f"All {len(engine.symbol_ladder_keys(symbol_for_ladder))} ladder(s) for {symbol_for_ladder} are busy (MAX_LADDERS). Close one or raise MAX_LADDERS.")
+                            continue
+                        user_chose_buy_for_preference = (command_action == 'buy')
+                        favored_direction_str = "BUY" if user_chose_buy_for_preference else "SELL"
+                        current_set_preference_snapshot = None
+                        with engine.global_state_lock:
+                            current_set_preference_snapshot = engine.user_initial_preference_is_buy.get(actual_broker_symbol)
+
+                        print(f"\nCommand: Start cycle for {actual_broker_symbol} with {favored_direction_str} as user-preferred.")
+                        if current_set_preference_snapshot is not None:
+                            current_pref_str = "BUY" if current_set_preference_snapshot else "SELL"
+                            if current_set_preference_snapshot == user_chose_buy_for_preference:
+                                print(f"(Matches current favored: {current_pref_str})")
+                            else: 
+                                print(f"NOTE: Will change favored for {actual_broker_symbol} from {current_pref_str} to {favored_direction_str}.")
+                        print(f"  - This L0: 75% for {favored_direction_str}, 25% for opposite.")
+                        print(f"  - {favored_direction_str} becomes favored for auto-restarts.")
+
+                        while True:
+                            confirmation = input(f"Proceed with {actual_broker_symbol}? (y/n): ").strip().lower()
+                            if confirmation == 'y':
+                                with engine.global_state_lock:
+                                    engine.user_initial_preference_is_buy[actual_broker_symbol] = user_chose_buy_for_preference
+                                engine.journal_command("set_preference", actual_broker_symbol, is_buy=user_chose_buy_for_preference)
+                                logger.info(f"USER_CMD ({actual_broker_symbol}): User confirmed {favored_direction_str} as initial favored.")
+                                
+                                random_val = random.random()
+                                actual_l0_is_buy_for_this_instance = False
+                                reason = ""
+                                if random_val <= 0.75:
+                                    actual_l0_is_buy_for_this_instance = user_chose_buy_for_preference
+                                    reason = f"Rolled <=0.75 (val: {random_val:.4f})"
+                                else:
+                                    actual_l0_is_buy_for_this_instance = not user_chose_buy_for_preference
+                                    reason = f"Rolled >0.75 (val: {random_val:.4f})"
+                                
+                                actual_dir_str_instance = 'BUY' if actual_l0_is_buy_for_this_instance else 'SELL'
+                                logger.info(f"USER_CMD ({actual_broker_symbol}): Preferred {favored_direction_str}. {reason}. Actual L0: {actual_dir_str_instance}.")
+                                print(f"--> Probability ({reason}): Attempting L0 as {actual_dir_str_instance} for {actual_broker_symbol}.")
+                                
+                                engine.journal_command("start_l0", actual_broker_symbol, is_buy=actual_l0_is_buy_for_this_instance)
+                                engine.start_L0_market_cycle(actual_broker_symbol, is_buy_L0=actual_l0_is_buy_for_this_instance)
+                                break
+                            elif confirmation == 'n':
+                                print(f"L0 start for {actual_broker_symbol} cancelled."); logger.info(f"USER_CMD ({actual_broker_symbol}): User cancelled."); break
+                            else: print("Invalid input. 'y' or 'n'.")
+                
+                elif command_action == 'status' or command_action == 'statusall':
+                    symbols_to_process_status = []
+                    status_snapshot = engine.get_status_snapshot()
+                    if command_action == 'statusall':
+                        print("--- Status for All Configured Symbols ---")
+                        symbols_to_process_status = [key for sym in engine.SYMBOL_CONFIGS.keys() for key in engine.symbol_ladder_keys(sym)
+                                                     if engine.ladder_index(key) == 0 or (key in status_snapshot.symbols and status_snapshot.symbols[key].is_active)]
+                    elif requested_ladder_key:
+                        symbols_to_process_status = [requested_ladder_key]
+                    elif actual_broker_symbol:
+                        symbols_to_process_status = [key for key in engine.symbol_ladder_keys(actual_broker_symbol)
+                                                     if engine.ladder_index(key) == 0 or (key in status_snapshot.symbols and status_snapshot.symbols[key].is_active)]
+                    else:
+                        print("Use 'status [symbol/alias]' or 'statusall'.")
+
+                    if symbols_to_process_status and status_snapshot.published_at_utc:
+                        print(f"(Snapshot from pass #{status_snapshot.pass_number} at {status_snapshot.published_at_utc.strftime('%H:%M:%S')} UTC)")
+                    for sym_stat in symbols_to_process_status:
+                        print(f"\n--- Status for {sym_stat} ---")
+                        sym_status = status_snapshot.symbols.get(sym_stat)
+                        if sym_status is None:
+                            print(f"{sym_stat}: No status published yet.")
+                        else:
+                            print(engine.format_symbol_status(sym_status))
+                        if engine.ladder_index(sym_stat) == 0 and sym_stat in engine.market_stats:
+                            print(engine.format_market_stats(sym_stat))
+                    if command_action == 'statusall':
+                        print("--- End of Status for All ---")
+
+                elif command_action == 'closeall':
+                    symbols_to_close_list = []
+                    if user_typed_symbol_or_alias.lower() == 'all':
+                        logger.info("USER_COMMAND: closeall all"); print("Closing all cycles for all configured symbols...")
+                        with engine.global_state_lock:
+                            for sym_check in list(engine.is_cycle_active.keys()): 
+                                if engine.is_cycle_active.get(sym_check, False) or \
+                                   engine.active_pending_order_ticket.get(sym_check,0) != 0 or \
+                                   (engine.cycle_tracking_data.get(sym_check) is not None):
+                                    symbols_to_close_list.append(sym_check)
+                        for sym_to_close in symbols_to_close_list: 
+                            print(f"--- Closing for {sym_to_close} ---")
+                            engine.journal_command("closeall", sym_to_close)
+                            engine.close_all_open_positions_and_pending_orders_for_symbol(sym_to_close) 
+                    elif actual_broker_symbol:
+                        if requested_ladder_key:
+                            symbols_to_close_list = [requested_ladder_key]
+                        else:
+                            with engine.global_state_lock:
+                                symbols_to_close_list = [key for key in engine.is_cycle_active.keys() if engine.ladder_symbol(key) == actual_broker_symbol and
+                                                         (engine.ladder_index(key) == 0 or engine.is_cycle_active.get(key, False) or engine.cycle_tracking_data.get(key) is not None)]
+                        for sym_to_close in symbols_to_close_list:
+                            logger.info(f"USER_COMMAND: closeall {sym_to_close}"); 
+                            print(f"--- Closing for {sym_to_close} ---")
+                            engine.journal_command("closeall", sym_to_close)
+                            engine.close_all_open_positions_and_pending_orders_for_symbol(sym_to_close) 
+                    else: 
+                        print("Specify symbol/alias for closeall or use 'closeall all'.")
+                else:
+                    if command_action: 
+                        print(f"Unknown command action: {command_action}")
+            
+    except KeyboardInterrupt: print("\nBot stopped by user (Ctrl+C). Performing cleanup..."); logger.info("Ctrl+C detected. Signalling threads.")
+    except Exception as e: logger.exception(f"Unexpected error in main loop: {e}"); print(f"Unexpected error: {e}. Check log.")
+    finally:
+        print("\nInitiating shutdown sequence...")
+        logger.info("Shutdown sequence initiated.")
+        
+        engine.shutdown_event.set()
+        logger.info("Shutdown event set for worker thread.")
+        engine.stop_sampling_profiler()
+        if engine.cycle_manager_thread.is_alive():
+            logger.info("Waiting for cycle management worker thread to join...")
+            engine.cycle_manager_thread.join(timeout=5.0) 
+            if engine.cycle_manager_thread.is_alive(): logger.warning("Cycle management worker thread did not join in time.")
+            else: logger.info("Cycle management worker thread joined successfully.")
+        else: logger.info("Cycle management worker thread was not alive or already joined.")
+
+        logger.info("Finalizing and logging any active cycles before MT5 shutdown...")
+        symbols_to_finalize_snapshot = []
+        with engine.global_state_lock: 
+             for sym_final_check in list(engine.is_cycle_active.keys()):
+                if engine.is_cycle_active.get(sym_final_check, False) or (engine.cycle_tracking_data.get(sym_final_check) is not None):
+                    symbols_to_finalize_snapshot.append(sym_final_check)
+        
+        for sym_final in symbols_to_finalize_snapshot:
+            engine._finalize_and_log_cycle(sym_final, outcome="SHUTDOWN_INTERRUPT")
+            warning_msg = f"WARNING: Bot shutting down WITH ACTIVE CYCLE for {sym_final}. Attempted final log."
+            logger.warning(warning_msg); print(warning_msg)
+        
+        engine.close_deal_journal()
+        engine.close_event_journal()
+        shutdown_msg = "Shutting down MT5 connection..."; logger.info(shutdown_msg); print(shutdown_msg)
+        engine.broker.shutdown()
+        final_msg = "Bot has been shut down."; logger.info(final_msg); print(final_msg)
+    return 0
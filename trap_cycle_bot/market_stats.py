@@ -0,0 +1,67 @@
+# --- Market Statistics ---
+# Fixed-size ring buffers with running sums: spread per tick, true range per closed bar (ATR) and ticks per bar.
+# Updates are O(1) and memory is bounded by the window sizes. Ticks only need bid, ask and time_msc.
+class RollingWindow:
+    """Fixed-capacity ring buffer with a running sum, so append and mean are O(1)."""
+    __slots__ = ("values", "capacity", "next_index", "count", "total")
+
+    def __init__(self, capacity):
+        self.values = [0.0] * capacity
+        self.capacity = capacity
+        self.next_index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def append(self, value):
+        if self.count == self.capacity: self.total -= self.values[self.next_index]
+        else: self.count += 1
+        self.values[self.next_index] = value
+        self.total += value
+        self.next_index = (self.next_index + 1) % self.capacity
+        if self.next_index == 0: self.total = sum(self.values[:self.count]) # Once per lap, drops accumulated float drift
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+class SymbolMarketStats:
+    """Rolling spread, true range per closed bar and ticks per bar for one symbol, in price units."""
+    __slots__ = ("bar_msc", "spreads", "true_ranges", "bar_tick_counts", "last_tick_msc", "last_spread",
+                 "bar_start_msc", "bar_high", "bar_low", "bar_close", "bar_ticks", "previous_close")
+
+    def __init__(self, bar_seconds, spread_window_ticks, atr_period_bars, tick_rate_window_bars):
+        self.bar_msc = int(bar_seconds * 1000)
+        self.spreads = RollingWindow(spread_window_ticks)
+        self.true_ranges = RollingWindow(atr_period_bars)
+        self.bar_tick_counts = RollingWindow(tick_rate_window_bars)
+        self.last_tick_msc = None
+        self.last_spread = None
+        self.bar_start_msc = None
+        self.bar_high = self.bar_low = self.bar_close = None
+        self.bar_ticks = 0
+        self.previous_close = None
+
+    def update(self, tick):
+        if tick.time_msc == self.last_tick_msc: return # Same quote polled again
+        self.last_tick_msc = tick.time_msc
+        self.last_spread = tick.ask - tick.bid
+        self.spreads.append(self.last_spread)
+        mid_price = (tick.bid + tick.ask) / 2.0
+        bar_start_msc = tick.time_msc - tick.time_msc % self.bar_msc # Broker time, so replays bar identically
+        if bar_start_msc != self.bar_start_msc:
+            if self.bar_start_msc is not None: self._close_bar()
+            self.bar_start_msc = bar_start_msc
+            self.bar_high = self.bar_low = mid_price
+            self.bar_ticks = 0
+        self.bar_high = max(self.bar_high, mid_price)
+        self.bar_low = min(self.bar_low, mid_price)
+        self.bar_close = mid_price
+        self.bar_ticks += 1
+
+    def _close_bar(self):
+        true_range = self.bar_high - self.bar_low
+        if self.previous_close is not None:
+            true_range = max(true_range, abs(self.bar_high - self.previous_close), abs(self.bar_low - self.previous_close))
+        self.true_ranges.append(true_range)
+        self.bar_tick_counts.append(self.bar_ticks)
+        self.previous_close = self.bar_close
+# --- End Market Statistics ---
@@ -0,0 +1,28 @@
+"""
+Realized P&L report from the local deal journal: python -m trap_cycle_bot.report [--cycles N] [--ingest]
+Reads the SQLite journal only, so it runs on any machine; --ingest first pulls new deals from the MT5 terminal.
+"""
+import argparse
+import logging
+import sys
+
+from . import engine
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m trap_cycle_bot.report", description="Realized P&L per cycle and per symbol.")
+    parser.add_argument("--cycles", type=int, default=10, help="number of most recent cycles to list (default 10)")
+    parser.add_argument("--ingest", action="store_true", help="pull new deals from the MT5 terminal before reporting")
+    args = parser.parse_args(argv)
+
+    engine.setup_logging(log_file=None, console_level=logging.WARNING)
+    if args.ingest:
+        if not engine.initialize_mt5_connection(): return 1
+        engine.load_and_apply_bot_config() # Magic numbers decide which deals are ours
+        print(f"Ingested {engine.ingest_new_deals()} new deals into {engine.DEAL_JOURNAL_DB_FILE}.")
+        engine.broker.shutdown()
+    engine.print_cycle_pnl_report(args.cycles)
+    engine.close_deal_journal()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
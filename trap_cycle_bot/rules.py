@@ -0,0 +1,70 @@
+import collections
+import math
+
+# --- Ladder Rules ---
+# The trap-cycle ladder as plain functions over plain values: no broker, no logging, no shared state. The live
+# engine builds on them, and analytics, backtests and the offline tools can use them on any machine.
+
+# Cycle state is keyed by ladder key: the symbol itself for its first ladder, "SYMBOL#n" for ladder n when the
+# symbol's MAX_LADDERS allows several concurrent ladders. Ladder n trades with MAGIC_NUMBER + n * LADDER_MAGIC_STRIDE.
+LADDER_KEY_SEPARATOR = "#"
+LADDER_MAGIC_STRIDE = 1000000
+MAX_LADDERS_LIMIT = 9
+
+# A symbol config compiled with the price offsets precomputed (pips * PIP_MULTIPLIER * point).
+SymbolProfile = collections.namedtuple("SymbolProfile", ["symbol", "config", "point", "digits", "sl_offset", "tp_offset", "trigger_offset"])
+
+def build_symbol_profile(symbol_name, symbol_config, point, digits):
+    pip_size = symbol_config["PIP_MULTIPLIER"] * point
+    return SymbolProfile(
+        symbol=symbol_name,
+        config=symbol_config,
+        point=point,
+        digits=digits,
+        sl_offset=symbol_config["NOMINAL_SL_PIPS"] * pip_size,
+        tp_offset=symbol_config["NOMINAL_TP_PIPS"] * pip_size,
+        trigger_offset=symbol_config["TRIGGER_DISTANCE_PIPS"] * pip_size
+    )
+
+def ladder_key(symbol_name, ladder_index):
+    return symbol_name if ladder_index == 0 else f"{symbol_name}{LADDER_KEY_SEPARATOR}{ladder_index}"
+
+def ladder_symbol(ladder_key_name):
+    return ladder_key_name.split(LADDER_KEY_SEPARATOR, 1)[0]
+
+def ladder_index(ladder_key_name):
+    _, separator, index_str = ladder_key_name.partition(LADDER_KEY_SEPARATOR)
+    return int(index_str) if separator else 0
+
+def ladder_magic_number(base_magic_number, index):
+    return base_magic_number + index * LADDER_MAGIC_STRIDE
+
+def round_lot_to_step(requested_lot, volume_step, volume_min, volume_max):
+    """Rounds UP to the nearest volume_step (0.025 at step 0.01 -> 0.03), then clamps to the broker's min/max volume."""
+    if volume_step <= 0:
+        # Fallback for symbols without a defined volume step (very rare)
+        lot = round(requested_lot, 8)
+    else:
+        lot = math.ceil(requested_lot / volume_step) * volume_step
+    lot = round(lot, 8)  # Round to 8 decimal places to avoid floating point dust
+    lot = max(lot, volume_min)
+    lot = min(lot, volume_max)
+    return lot
+
+def calculate_sl_tp_prices(profile, entry_price_param, is_buy_param):
+    sl_price = 0.0
+    if profile.sl_offset > 0: sl_price = round(entry_price_param - profile.sl_offset if is_buy_param else entry_price_param + profile.sl_offset, profile.digits)
+    tp_price = 0.0
+    if profile.tp_offset > 0: tp_price = round(entry_price_param + profile.tp_offset if is_buy_param else entry_price_param - profile.tp_offset, profile.digits)
+    return sl_price, tp_price
+
+def next_pending_is_buy_stop(based_on_position_is_buy):
+    """Each level traps the opposite direction of the position it is based on."""
+    return not based_on_position_is_buy
+
+def pending_entry_price(l0_entry_price, level, is_l0_buy, trigger_offset, digits):
+    """Odd levels sit one trigger distance against the L0 direction; even levels sit at the L0 entry price."""
+    if level % 2 == 1:
+        return round(l0_entry_price - trigger_offset if is_l0_buy else l0_entry_price + trigger_offset, digits)
+    return l0_entry_price
+# --- End Ladder Rules ---
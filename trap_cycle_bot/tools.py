@@ -0,0 +1,102 @@
+"""
+Offline tools: python -m trap_cycle_bot.tools <command>
+  ladder SYMBOL --entry PRICE --point P --digits D [...]   Lots, entries, SL and TP of every level of a ladder
+  validate-config [FILE]                                    Validates a symbol config file without trading
+  replay JOURNAL [--profile STATS]                          Replays an event journal against the real engine
+None of them needs the MT5 terminal. `ladder` only imports the pure ladder rules, so it starts in milliseconds.
+"""
+import argparse
+import json
+import sys
+
+from .rules import build_symbol_profile, calculate_sl_tp_prices, next_pending_is_buy_stop, pending_entry_price, round_lot_to_step
+
+DEFAULT_CONFIG_FILE = "symbol_config.json"
+
+def _read_raw_config(config_path):
+    if config_path.lower().endswith(".toml"):
+        import tomllib # Python 3.11+
+        with open(config_path, mode='rb') as file:
+            return tomllib.load(file)
+    with open(config_path, mode='r') as file:
+        return json.load(file)
+
+def ladder_table(profile, entry_price, is_l0_buy, volume_step, volume_min, volume_max, levels):
+    """Rows (level, is_buy, lot, entry, sl, tp) of a ladder whose every level fills, following the live engine's rules."""
+    config = profile.config
+    rows = []
+    lot = round_lot_to_step(config["INITIAL_LOT_SIZE"], volume_step, volume_min, volume_max)
+    is_buy = is_l0_buy
+    level_entry = entry_price
+    for level in range(min(levels, config["MAX_TRADES_IN_CYCLE"])):
+        if level > 0:
+            lot = round_lot_to_step(lot * config["LOT_MULTIPLIER"], volume_step, volume_min, volume_max)
+            is_buy = next_pending_is_buy_stop(is_buy)
+            level_entry = pending_entry_price(entry_price, level, is_l0_buy, profile.trigger_offset, profile.digits)
+        sl_price, tp_price = calculate_sl_tp_prices(profile, level_entry, is_buy)
+        rows.append((level, is_buy, lot, level_entry, sl_price, tp_price))
+    return rows
+
+def _ladder_command(args):
+    raw_config = _read_raw_config(args.config)
+    symbol_name = raw_config.get("aliases", {}).get(args.symbol.lower(), args.symbol)
+    symbol_config = raw_config.get("symbols", {}).get(symbol_name)
+    if symbol_config is None:
+        print(f"Symbol '{args.symbol}' not found in {args.config}.")
+        return 1
+    profile = build_symbol_profile(symbol_name, symbol_config, args.point, args.digits)
+    rows = ladder_table(profile, args.entry, not args.sell, args.volume_step, args.volume_min, args.volume_max, args.levels)
+    print(f"{symbol_name} ladder from {'SELL' if args.sell else 'BUY'} L0 @ {args.entry} (trigger {profile.trigger_offset:g}, TP {profile.tp_offset:g}, SL {profile.sl_offset:g}):")
+    total_lots = 0.0
+    for level, is_buy, lot, level_entry, sl_price, tp_price in rows:
+        total_lots += lot
+        print(f"  L{level:<3} {'BUY ' if is_buy else 'SELL'} {lot:>10.2f} lots @ {level_entry:<12} SL {sl_price:<12} TP {tp_price:<12} (cumulative {total_lots:.2f} lots)")
+    return 0
+
+def _validate_config_command(args):
+    from . import engine # Calendars and validation live in the engine; it imports without the terminal
+    try:
+        bot_config = engine.validate_bot_config(engine._read_config_file(args.config))
+    except Exception as e:
+        print(f"{args.config}: INVALID. {e}")
+        return 1
+    print(f"{args.config}: OK. {len(bot_config.symbol_configs)} symbols, {len(bot_config.symbol_aliases)} aliases, "
+          f"trading hours {bot_config.start_hour:02d}:00-{bot_config.end_hour:02d}:00.")
+    return 0
+
+def _replay_command(args):
+    from . import engine
+    engine.setup_logging()
+    return 0 if engine.replay_event_journal(args.journal, args.profile) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m trap_cycle_bot.tools", description="Offline tools for the trap cycle bot.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ladder_parser = commands.add_parser("ladder", help="print every level of a ladder for a symbol config")
+    ladder_parser.add_argument("symbol", help="symbol or alias from the config file")
+    ladder_parser.add_argument("--entry", type=float, required=True, help="L0 entry price")
+    ladder_parser.add_argument("--point", type=float, required=True, help="symbol point size, e.g. 0.00001")
+    ladder_parser.add_argument("--digits", type=int, required=True, help="symbol price digits, e.g. 5")
+    ladder_parser.add_argument("--sell", action="store_true", help="L0 is a SELL (default BUY)")
+    ladder_parser.add_argument("--levels", type=int, default=10, help="levels to show (default 10, capped at MAX_TRADES_IN_CYCLE)")
+    ladder_parser.add_argument("--volume-step", type=float, default=0.01)
+    ladder_parser.add_argument("--volume-min", type=float, default=0.01)
+    ladder_parser.add_argument("--volume-max", type=float, default=100.0)
+    ladder_parser.add_argument("--config", default=DEFAULT_CONFIG_FILE)
+    ladder_parser.set_defaults(handler=_ladder_command)
+
+    validate_parser = commands.add_parser("validate-config", help="validate a symbol config file")
+    validate_parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG_FILE)
+    validate_parser.set_defaults(handler=_validate_config_command)
+
+    replay_parser = commands.add_parser("replay", help="replay an event journal and compare the state transitions")
+    replay_parser.add_argument("journal")
+    replay_parser.add_argument("--profile", default=None, help="write cProfile stats of the replay to this file")
+    replay_parser.set_defaults(handler=_replay_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())